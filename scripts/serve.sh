@@ -0,0 +1 @@
+python -m utils.evaluation_service "$@"
@@ -1 +1 @@
-python -m utils.cmc_utils
\ No newline at end of file
+python -m utils.cmc_utils "$@"
\ No newline at end of file
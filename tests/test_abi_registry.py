@@ -0,0 +1,44 @@
+import unittest
+
+from web3_utils.abi_registry import AbiRegistry
+
+USDC = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
+
+
+class TestAbiRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = AbiRegistry()
+
+    def test_shared_abi(self):
+        abi = self.registry.get("erc20")
+        self.assertIn("transfer", {item.get("name") for item in abi})
+        self.assertIs(self.registry.get("erc20"), abi)
+        self.assertIn("protocols/yearn_vault", self.registry.names())
+
+    def test_deduplicated_case_abis(self):
+        usdc = self.registry.get("USDC", case="ethereum_zircuit-ethena-usdt")
+        self.assertIs(
+            self.registry.get("USDC", case="ethereum_zircuit-ethena-usdc"), usdc
+        )
+        stats = self.registry.stats()
+        self.assertLess(stats["unique"], stats["files"])
+        self.assertEqual(stats["parsed"], 1)
+
+    def test_ambiguous_name(self):
+        # WETH differs between chains
+        with self.assertRaises(ValueError):
+            self.registry.get("WETH")
+        with self.assertRaises(KeyError):
+            self.registry.get("NotAnAbi")
+        self.assertIn("WETH", self.registry.names("base_aerodrome-degen-liquidity"))
+
+    def test_contract_cache(self):
+        contract = self.registry.get_contract(1, USDC, "erc20")
+        self.assertIs(self.registry.get_contract(1, USDC.lower(), "erc20"), contract)
+        self.assertIsNot(self.registry.get_contract(10, USDC, "erc20"), contract)
+        self.assertEqual(contract.address, USDC)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from collections import Counter
+from unittest import mock
+
+from utils.action_utils import (
+    ActionResolver,
+    BatchPlanner,
+    CachingActionResolver,
+    evaluate_action,
+)
+from utils.async_action_utils import AsyncActionResolver, aevaluate_response
+
+USDC = {
+    "id": 3408,
+    "name": "USDC",
+    "symbol": "USDC",
+    "decimals": 6,
+    "network": "ethereum",
+    "contract_address": "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48",
+}
+VITALIK = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"
+
+
+class StubResolver(ActionResolver):
+    """
+    Resolves ENS names, protocols and tokens without network calls
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls = Counter()
+
+    def resolve_ens(self, name):
+        self.calls["ens"] += 1
+        if name == "slow.eth":
+            time.sleep(0.5)
+        if name == "broken.eth":
+            raise ValueError("ENS lookup failed")
+        return VITALIK if name == "vitalik.eth" else None
+
+    def resolve_protocol(self, action, token, chain):
+        self.calls["protocol"] += 1
+        return None
+
+    def search_token(self, token, chain):
+        self.calls["token"] += 1
+        suggested = USDC if token == "USDC" else None
+        return {"suggested": suggested, "other_options": []}
+
+
+class CachingStubResolver(CachingActionResolver, StubResolver):
+    pass
+
+
+class AsyncStubResolver(AsyncActionResolver, StubResolver):
+    pass
+
+
+ACTIONS = [
+    {
+        "action": "approve",
+        "chain": "Ethereum",
+        "amount": "10",
+        "token": "USDC",
+        "spender": "vitalik.eth",
+    },
+    {
+        "action": "transfer",
+        "chain": "Ethereum",
+        "amount": "10",
+        "token": "USDC",
+        "receiver": "vitalik.eth",
+    },
+    {
+        "action": "transfer",
+        "chain": "Ethereum",
+        "amount": "1",
+        "token": "ETH",
+        "receiver": VITALIK,
+    },
+    {
+        "action": "transfer",
+        "chain": "Gnosis",
+        "amount": "1",
+        "token": "USDC",
+        "receiver": "vitalik.eth",
+    },
+    {
+        "action": "transfer",
+        "chain": "Ethereum",
+        "amount": "1",
+        "token": "USDC",
+        "receiver": "broken.eth",
+    },
+    {"action": "transfer", "chain": "Ethereum", "amount": "1"},
+    {"action": "swap", "chain": "Ethereum"},
+    {"action": "stake"},
+]
+
+
+class TestBatchPlanner(unittest.TestCase):
+
+    def test_same_results_as_per_action(self):
+        expected = [evaluate_action(item, StubResolver()) for item in ACTIONS]
+        planner = BatchPlanner(ACTIONS, CachingStubResolver())
+        self.assertEqual(planner.evaluate(), expected)
+        self.assertEqual(json.loads(expected[1])["to"], USDC["contract_address"])
+        self.assertEqual(json.loads(expected[4])["error"], "ENS lookup failed")
+
+    def test_shared_lookups_are_resolved_once(self):
+        resolver = CachingStubResolver()
+        BatchPlanner(ACTIONS, resolver).evaluate()
+        self.assertEqual(resolver.calls["ens"], 2)
+        self.assertEqual(resolver.calls["token"], 2)
+
+
+async def no_protocol(action, token, chain):
+    return None
+
+
+@mock.patch("utils.async_action_utils._aresolve_protocol", no_protocol)
+class TestAsyncEvaluation(unittest.TestCase):
+
+    def test_same_results_as_per_action(self):
+        expected = [evaluate_action(item, StubResolver()) for item in ACTIONS]
+        resolver = AsyncStubResolver()
+        results = asyncio.run(aevaluate_response(json.dumps(ACTIONS), resolver))
+        self.assertEqual(results, expected)
+        self.assertEqual(resolver.calls["ens"], 2)
+
+    def test_stage_timeout(self):
+        item = dict(ACTIONS[1], receiver="slow.eth")
+        resolver = AsyncStubResolver(timeouts={"receiver": 0.05})
+        results = asyncio.run(aevaluate_response(json.dumps([item, item]), resolver))
+        self.assertEqual(
+            json.loads(results[0]),
+            {
+                "type": "InvalidArgumentError",
+                "error": "Timed out resolving the receiver",
+            },
+        )
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(resolver.calls["ens"], 1)
+
+    def test_response_is_assembled_off_the_loop(self):
+        threads = []
+
+        class Resolver(AsyncStubResolver):
+            def get_supported_actions(self):
+                threads.append(threading.get_ident())
+                return super().get_supported_actions()
+
+        asyncio.run(aevaluate_response(json.dumps(ACTIONS[:1]), Resolver()))
+        self.assertTrue(threads)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
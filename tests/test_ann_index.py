@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.ann_index import IVFIndex, benchmark, load_or_build_index
+from utils.embeddings_utils import EmbeddingSearchEngine, normalize_embeddings
+
+
+class TestIVFIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        centers = rng.normal(size=(20, 32))
+        labels = rng.integers(20, size=1000)
+        self.vectors = normalize_embeddings(
+            centers[labels] + 0.3 * rng.normal(size=(1000, 32))
+        )
+        self.queries = normalize_embeddings(rng.normal(size=(20, 32)))
+        self.index = IVFIndex.build(self.vectors, n_lists=16, n_probe=4)
+        self.engine = EmbeddingSearchEngine(self.vectors)
+
+    def test_lists(self):
+        self.assertEqual(self.index.n_lists, 16)
+        self.assertEqual(sorted(self.index.list_rows.tolist()), list(range(1000)))
+        self.assertEqual(self.index.list_offsets[-1], 1000)
+
+    def test_probing_all_lists_is_exact(self):
+        for query in self.queries:
+            self.assertEqual(
+                [row for row, _ in self.index.search(query, 5, n_probe=16)],
+                [row for row, _ in self.engine.search(query, 5)],
+            )
+
+    def test_recall(self):
+        results = benchmark(self.vectors, self.queries, self.index, n_probes=(4, 16))
+        self.assertEqual([r["n_probe"] for r in results], ["exact", 4, 16])
+        self.assertGreaterEqual(results[1]["recall"], 0.8)
+        self.assertEqual(results[2]["recall"], 1.0)
+
+    def test_allowed_rows(self):
+        allowed = np.zeros(1000, dtype=bool)
+        allowed[[3, 500, 999]] = True
+        results = self.index.search(self.queries[0], 5, n_probe=1, allowed=allowed)
+        self.assertEqual(sorted(row for row, _ in results), [3, 500, 999])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tokens.ivf.npz")
+            self.index.save(path, "digest")
+            index = load_or_build_index(path, self.vectors, digest="digest")
+            self.assertEqual(index.n_probe, 4)
+            np.testing.assert_array_equal(index.list_rows, self.index.list_rows)
+            self.assertEqual(
+                index.search(self.queries[0]), self.index.search(self.queries[0])
+            )
+
+            # A stale index is rebuilt
+            index = load_or_build_index(path, self.vectors[:500])
+            self.assertEqual(len(index), 500)
+            # Even when the store has as many rows as before
+            with self.assertRaises(ValueError):
+                IVFIndex.load(path, self.vectors, "changed")
+            index = load_or_build_index(path, self.vectors[::-1], n_probe=2)
+            self.assertEqual(index.n_probe, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import unittest
+
+from utils.benchmarks import (
+    build_cases,
+    compare,
+    load_results,
+    measure,
+    run_benchmarks,
+    save_results,
+    stub_services,
+)
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_measure(self):
+        calls = []
+        stats = measure(lambda: calls.append(1), min_time=0.01, warmup=3)
+        self.assertEqual(stats["iterations"], len(calls) - 3)
+        self.assertGreater(stats["ops_per_sec"], 0)
+        self.assertLessEqual(stats["p50_us"], stats["p95_us"])
+        self.assertLessEqual(stats["p95_us"], stats["p99_us"])
+
+    def test_cases_run_against_stubs(self):
+        with stub_services(dim=256):
+            cases = build_cases(dim=256)
+            for name, fn in cases.items():
+                with self.subTest(name):
+                    for _ in range(8):
+                        fn()
+            # Every sample action is evaluated without an error
+            results = [json.loads(cases["evaluate_action"]()) for _ in range(3)]
+            tokens = cases["erc20_token_info"]()
+        self.assertEqual(
+            sorted(result.get("action") for result in results),
+            ["approve", "transfer", "transfer"],
+        )
+        self.assertEqual([token.symbol for token in tokens], ["USDC", "DAI"])
+
+    def test_run_and_compare(self):
+        results = run_benchmarks(["erc20_encode"], min_time=0.01)
+        self.assertEqual(list(results["cases"]), ["erc20_encode"])
+        with self.assertRaises(ValueError):
+            run_benchmarks(["unknown"])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = save_results(results, os.path.join(tmp_dir, "b", "baseline.json"))
+            self.assertEqual(load_results(path), results)
+            self.assertIsNone(load_results(os.path.join(tmp_dir, "missing.json")))
+
+        ops = results["cases"]["erc20_encode"]["ops_per_sec"]
+        faster = {"cases": {"erc20_encode": {"ops_per_sec": ops * 2}}}
+        slower = {"cases": {"erc20_encode": {"ops_per_sec": ops / 2}}}
+        self.assertTrue(compare(results, faster)[0]["regression"])
+        self.assertFalse(compare(results, slower)[0]["regression"])
+        self.assertEqual(compare(results, {"cases": {}}), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
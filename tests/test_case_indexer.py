@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from utils.case_indexer import CASE_STORE, chunk_text, index_cases, scan_cases
+from utils.embedding_store import load_embedding_store
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def fake_embed(texts):
+    return [[float(len(text)), 1.0] for text in texts]
+
+
+class TestCaseIndexer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.case_dir = os.path.join(self.tmp_dir.name, "case")
+        self.store_dir = os.path.join(self.tmp_dir.name, "embeddings")
+        self._write("ethereum_aave-usdc", "index.ts", "deposit usdc\nto aave")
+        self._write("ethereum_aave-usdc", "index.details.ts", "aave details")
+        self._write("base_aerodrome-degen", "index.ts", "a b c d e f g h i j k l")
+        # Shared code which is not a case
+        self._write("___prebuilt-tx", "index.ts", "shared")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, case, file_name, content):
+        directory = os.path.join(self.case_dir, case)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, file_name), "w") as file:
+            file.write(content)
+
+    def _index(self, embed=fake_embed):
+        return index_cases(
+            self.case_dir,
+            directory=self.store_dir,
+            max_tokens=5,
+            count_tokens=count_words,
+            embed=embed,
+        )
+
+    def test_scan_cases(self):
+        cases = scan_cases(self.case_dir)
+        self.assertEqual(
+            [(c["case"], c["network"]) for c in cases],
+            [("aerodrome_degen", "base"), ("aave_usdc", "ethereum")],
+        )
+        self.assertEqual(cases[1]["content"], "deposit usdc\nto aave\naave details")
+
+    def test_chunk_text(self):
+        self.assertEqual(
+            chunk_text("a b\nc d\ne f g h\n\ni", count_words, max_tokens=5),
+            ["a b\nc d", "e f g h", "i"],
+        )
+        # A line longer than a chunk is split
+        chunks = chunk_text("a b c d e f g h i j k l", count_words, max_tokens=5)
+        self.assertTrue(all(count_words(chunk) <= 5 for chunk in chunks))
+        self.assertEqual(" ".join(chunks).split(), list("abcdefghijkl"))
+
+    def test_incremental(self):
+        summary = self._index()
+        self.assertEqual(summary["cases"], 2)
+        self.assertEqual(summary["chunked"], 2)
+        self.assertEqual(summary["recomputed"], summary["chunks"])
+
+        store = load_embedding_store(CASE_STORE, self.store_dir)
+        self.assertEqual(len(store), summary["chunks"])
+        self.assertEqual(store.records[0]["id"], "base_aerodrome-degen#0")
+        self.assertTrue(store.records[-1]["text"].startswith("aave_usdc. ethereum. "))
+        self.assertEqual(sorted(store.partitions), ["base", "ethereum"])
+
+        # Nothing changed: no case is split or embedded again
+        embed = mock.Mock(side_effect=fake_embed)
+        summary = self._index(embed)
+        self.assertEqual((summary["chunked"], summary["recomputed"]), (0, 0))
+        embed.assert_not_called()
+
+        # A new case only embeds its own chunks
+        self._write("arbitrum_pendle-usde", "index.ts", "buy pt usde")
+        summary = self._index(embed)
+        self.assertEqual(summary["cases"], 3)
+        self.assertEqual((summary["chunked"], summary["recomputed"]), (1, 1))
+        self.assertEqual(embed.call_args[0][0], ["pendle_usde. arbitrum. buy pt usde"])
+        store = load_embedding_store(CASE_STORE, self.store_dir)
+        self.assertEqual(len(store), summary["chunks"])
+
+
+if __name__ == "__main__":
+    unittest.main()
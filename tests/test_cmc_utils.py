@@ -0,0 +1,226 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from utils import cmc_utils
+
+CHAINS = {"ethereum", "base"}
+
+
+def map_entry(id, name, symbol, chain, address):
+    return {
+        "id": id,
+        "name": name,
+        "symbol": symbol,
+        "platform": {"name": chain.title(), "token_address": address},
+    }
+
+
+MAP = [
+    map_entry(
+        1,
+        "Tether USDt",
+        "USDT",
+        "ethereum",
+        "0xdAC17F958D2ee523a2206206994597C13D831ec7",
+    ),
+    map_entry(
+        2, "USDC", "USDC", "ethereum", "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
+    ),
+    map_entry(
+        3, "Degen", "DEGEN", "base", "0x4ed4E862860beD51a9570b96d89aF5E1B0Efefed"
+    ),
+    map_entry(
+        3, "Degen", "DEGEN", "ethereum", "0x0000000000000000000000000000000000000003"
+    ),
+    map_entry(4, "Bitcoin", "BTC", "bitcoin", ""),
+]
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"data": self.data}
+
+
+class FakeCMC:
+    """
+    Answers the map and info endpoints; fail_after makes the info endpoint fail
+    after the given number of requests
+    """
+
+    def __init__(self, fail_after: int | None = None):
+        self.fail_after = fail_after
+        self.map_requests = 0
+        self.info_ids = []
+
+    def get(self, url, headers=None, params=None):
+        if url.endswith("/map"):
+            self.map_requests += 1
+            return FakeResponse(MAP)
+        if self.fail_after is not None and len(self.info_ids) >= self.fail_after:
+            raise ConnectionError("CMC is down")
+        ids = [int(id) for id in params["id"].split(",")]
+        self.info_ids.extend(ids)
+        return FakeResponse(
+            {
+                str(id): {
+                    "description": f"Token {id}",
+                    "contract_address": [
+                        {
+                            "platform": {"name": item["platform"]["name"]},
+                            "contract_address": item["platform"]["token_address"],
+                        }
+                        for item in MAP
+                        if item["id"] == id
+                    ],
+                }
+                for id in ids
+            }
+        )
+
+
+def fake_decimals(tokens):
+    return [18] * len(tokens)
+
+
+class TestCmcRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.map_path = os.path.join(self.tmp_dir.name, "map.csv")
+        self.checkpoint_path = os.path.join(self.tmp_dir.name, "checkpoint.json")
+        pd.DataFrame(
+            [
+                {
+                    "id": 1,
+                    "name": "Tether USDt",
+                    "symbol": "USDT",
+                    "decimals": 6,
+                    "network_to_contract": {
+                        "ethereum": "0xdac17f958d2ee523a2206206994597c13d831ec7"
+                    },
+                    "description": "Stored description",
+                },
+                {
+                    "id": 2,
+                    "name": "USD Coin",
+                    "symbol": "USDC",
+                    "decimals": 6,
+                    "network_to_contract": {
+                        "ethereum": "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
+                    },
+                    "description": "Stored description",
+                },
+                {
+                    "id": 5,
+                    "name": "Delisted",
+                    "symbol": "OLD",
+                    "decimals": 18,
+                    "network_to_contract": {},
+                    "description": "Stored description",
+                },
+            ]
+        ).to_csv(self.map_path, index=False)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def refresh(self, cmc: FakeCMC, top_n: int = 5000):
+        with mock.patch.dict(os.environ, {"CMC_API_KEY": "test"}), mock.patch.object(
+            cmc_utils.requests, "get", cmc.get
+        ), mock.patch.object(
+            cmc_utils, "_get_token_decimals_many", side_effect=fake_decimals
+        ):
+            return cmc_utils.refresh_cmc_tokens(
+                CHAINS,
+                top_n=top_n,
+                chunk_size=1,
+                token_map_path=self.map_path,
+                checkpoint_path=self.checkpoint_path,
+            )
+
+    def test_diff_token_map(self):
+        tokens = cmc_utils._select_supported_tokens(MAP, CHAINS)
+        added, changed, removed = cmc_utils.diff_token_map(
+            tokens, pd.read_csv(self.map_path)
+        )
+        self.assertEqual((added, changed, removed), ([3], [2], [5]))
+
+    def test_diff_keeps_na_like_symbols(self):
+        address = "0x0000000000000000000000000000000000000007"
+        pd.DataFrame(
+            [
+                {
+                    "id": 7,
+                    "name": "NULL",
+                    "symbol": "NAN",
+                    "decimals": 18,
+                    "network_to_contract": {"ethereum": address},
+                    "description": "Stored description",
+                }
+            ]
+        ).to_csv(self.map_path, index=False)
+        tokens = [map_entry(7, "NULL", "NAN", "ethereum", address)]
+        catalog = cmc_utils.read_token_map(self.map_path)
+        self.assertEqual(cmc_utils.diff_token_map(tokens, catalog), ([], [], []))
+
+    def test_refresh(self):
+        cmc = FakeCMC()
+        summary = self.refresh(cmc)
+        self.assertEqual(
+            summary, {"added": 1, "changed": 1, "removed": 1, "unchanged": 1}
+        )
+        # Only the new and changed tokens are fetched
+        self.assertEqual(cmc.info_ids, [2, 3])
+
+        tokens = pd.read_csv(self.map_path)
+        self.assertEqual(tokens["id"].tolist(), [1, 2, 3])
+        self.assertEqual(tokens["name"].tolist(), ["Tether USDt", "USDC", "Degen"])
+        self.assertEqual(tokens["decimals"].tolist(), [6, 18, 18])
+        self.assertEqual(
+            tokens["description"].tolist(), ["Stored description", "Token 2", "Token 3"]
+        )
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+        # Nothing changed since
+        cmc = FakeCMC()
+        summary = self.refresh(cmc)
+        self.assertEqual(summary["unchanged"], 3)
+        self.assertEqual(cmc.info_ids, [])
+
+    def test_resume(self):
+        cmc = FakeCMC(fail_after=1)
+        with self.assertRaises(ConnectionError):
+            self.refresh(cmc)
+        self.assertTrue(os.path.exists(self.checkpoint_path))
+
+        cmc = FakeCMC()
+        self.refresh(cmc)
+        # The map is not fetched again and only the remaining token info is
+        self.assertEqual(cmc.map_requests, 0)
+        self.assertEqual(cmc.info_ids, [3])
+        self.assertEqual(pd.read_csv(self.map_path)["id"].tolist(), [1, 2, 3])
+
+    def test_stale_checkpoint_is_discarded(self):
+        with self.assertRaises(ConnectionError):
+            self.refresh(FakeCMC(fail_after=1))
+
+        # A refresh with other arguments starts over
+        cmc = FakeCMC()
+        self.refresh(cmc, top_n=100)
+        self.assertEqual(cmc.map_requests, 1)
+        self.assertEqual(cmc.info_ids, [2, 3])
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
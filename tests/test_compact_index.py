@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.compact_index import (
+    CompactSearchEngine,
+    CompactVectors,
+    compare_modes,
+    load_or_build_compact,
+)
+from utils.embeddings_utils import EmbeddingSearchEngine, normalize_embeddings
+
+
+class TestCompactIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        centers = rng.normal(size=(20, 64))
+        labels = rng.integers(20, size=1000)
+        # Not normalized, like the stored embeddings may be
+        self.embeddings = (centers[labels] + 0.3 * rng.normal(size=(1000, 64))).astype(
+            np.float32
+        )
+        # Queries near catalog entries, like the searched names are
+        self.queries = self.embeddings[:20] + 0.3 * rng.normal(size=(20, 64))
+        self.engine = EmbeddingSearchEngine(self.embeddings)
+
+    def test_encode(self):
+        vectors = normalize_embeddings(self.embeddings)
+        for dtype, tolerance in (("float16", 1e-3), ("int8", 2e-2)):
+            compact = CompactVectors.encode(self.embeddings, dtype, chunk_size=300)
+            self.assertEqual(compact.dtype, dtype)
+            np.testing.assert_allclose(
+                compact.scores(vectors[0]), vectors @ vectors[0], atol=tolerance
+            )
+        self.assertEqual(CompactVectors.encode(self.embeddings, "int8").nbytes, 68000)
+
+        truncated = CompactVectors.encode(self.embeddings, "float16", dims=16)
+        self.assertEqual(truncated.dims, 16)
+        np.testing.assert_allclose(
+            np.linalg.norm(truncated.codes.astype(np.float32), axis=1), 1, atol=1e-3
+        )
+        with self.assertRaises(ValueError):
+            CompactVectors.encode(self.embeddings, "int4")
+
+    def test_search_matches_exact(self):
+        # Truncated vectors need more candidates to be re-ranked
+        for dtype, dims, factor in (
+            ("float16", None, 4),
+            ("int8", None, 4),
+            ("int8", 32, 20),
+        ):
+            compact = CompactVectors.encode(self.embeddings, dtype, dims)
+            engine = CompactSearchEngine(self.embeddings, compact, factor)
+            for query in self.queries:
+                expected = self.engine.search(query, 5)
+                found = engine.search(query, 5)
+                self.assertEqual([r for r, _ in found], [r for r, _ in expected])
+                # The re-ranked scores are the full-precision ones
+                np.testing.assert_allclose(
+                    [s for _, s in found], [s for _, s in expected], rtol=1e-5
+                )
+
+    def test_rows_and_partitions(self):
+        engine = CompactSearchEngine(
+            self.embeddings, CompactVectors.encode(self.embeddings, "int8")
+        )
+        rows = np.arange(0, 1000, 7)
+        engine.add_partition("odd", rows)
+        self.engine.add_partition("odd", rows)
+        expected = [r for r, _ in self.engine.search(self.queries[0], 5, rows=rows)]
+        self.assertEqual(
+            [r for r, _ in engine.search(self.queries[0], 5, rows=rows)], expected
+        )
+        self.assertEqual(
+            [r for r, _ in engine.search(self.queries[0], 5, partition="odd")], expected
+        )
+        self.assertGreater(engine.nbytes, engine.compact.nbytes)
+
+    def test_search_many(self):
+        engine = CompactSearchEngine(
+            self.embeddings, CompactVectors.encode(self.embeddings, "int8")
+        )
+        rows = np.arange(0, 1000, 7)
+        engine.add_partition("sevens", rows)
+        for kwargs in ({}, {"rows": rows}, {"partition": "sevens"}):
+            results = engine.search_many(self.queries, 5, **kwargs)
+            self.assertEqual(
+                results, [engine.search(query, 5, **kwargs) for query in self.queries]
+            )
+
+    def test_save_and_load(self):
+        compact = CompactVectors.encode(self.embeddings, "int8", dims=32)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tokens.int8-32.npz")
+            compact.save(path, "digest")
+            loaded = load_or_build_compact(
+                path, self.embeddings, "int8", 32, digest="digest"
+            )
+            self.assertEqual(loaded.digest, "digest")
+            np.testing.assert_array_equal(loaded.codes, compact.codes)
+            np.testing.assert_array_equal(loaded.scales, compact.scales)
+
+            # Stale vectors are encoded again
+            loaded = load_or_build_compact(path, self.embeddings[:500], "int8", 32)
+            self.assertEqual(len(loaded), 500)
+            # Even when the store has as many rows as before
+            loaded = load_or_build_compact(
+                path, self.embeddings, "int8", 32, digest="changed"
+            )
+            self.assertIsNone(loaded.digest)
+
+    def test_compare_modes(self):
+        results = compare_modes(
+            self.embeddings, self.queries, [("float16", None), ("int8", 16)]
+        )
+        self.assertEqual(
+            [(r["dtype"], r["dims"]) for r in results],
+            [("float32", 64), ("float16", 64), ("int8", 16)],
+        )
+        self.assertEqual(results[0]["bytes"], 256000)
+        self.assertEqual(results[1]["bytes"], 128000)
+        self.assertEqual(results[2]["bytes"], 20000)
+        self.assertEqual(results[1]["agreement"], 1.0)
+        self.assertGreaterEqual(results[2]["agreement"], 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
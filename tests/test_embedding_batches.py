@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+
+from openai import AsyncOpenAI
+from tenacity import wait_none
+
+from utils.embeddings_stub import EmbeddingsStub
+from utils.embedding_batches import aembed_batches, pack_batches
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+class TestEmbeddingBatches(unittest.TestCase):
+
+    def embed(self, stub: EmbeddingsStub, texts: list[str], **kwargs):
+        async def run():
+            client = AsyncOpenAI(base_url=stub.url, api_key="test", max_retries=0)
+            try:
+                return await aembed_batches(
+                    texts,
+                    "m",
+                    client=client,
+                    count_tokens=count_words,
+                    wait=wait_none(),
+                    **kwargs,
+                )
+            finally:
+                await client.close()
+
+        stub.start()
+        try:
+            return asyncio.run(run())
+        finally:
+            stub.stop()
+
+    def test_pack_batches(self):
+        texts = ["a b", "c", "d e f", "g", "h", "i j k l"]
+        self.assertEqual(
+            pack_batches(texts, count_words, max_tokens=4, max_inputs=2),
+            [[0, 1], [2, 3], [4], [5]],
+        )
+        with self.assertRaises(ValueError):
+            pack_batches(["a " * 9000], count_words)
+
+    def test_order_and_concurrency(self):
+        stub = EmbeddingsStub(delay=0.05)
+        texts = [f"text {i}" + "x" * i for i in range(20)]
+        embeddings = self.embed(stub, texts, max_inputs=2, max_in_flight=3)
+
+        self.assertEqual([e[0] for e in embeddings], [len(text) for text in texts])
+        self.assertEqual(len(stub.requests), 10)
+        self.assertLessEqual(stub.max_in_flight, 3)
+        self.assertGreater(stub.max_in_flight, 1)
+
+    def test_retry_failed_batch(self):
+        stub = EmbeddingsStub(fail_once={"c"})
+        texts = ["a", "b", "c", "d", "e\nf"]
+        embeddings = self.embed(stub, texts, max_inputs=2, max_in_flight=1)
+
+        self.assertEqual([e[0] for e in embeddings], [1, 1, 1, 1, 3])
+        # Only the batch with the failure is sent again
+        self.assertEqual(stub.requests, [["a", "b"], ["c", "d"], ["c", "d"], ["e f"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from utils import embeddings_utils
+from utils.embedding_cache import EmbeddingCache, get_fine_tuning_queries
+
+
+def fake_embedding(text, model):
+    return [float(len(text)), float(len(model)), 0.5]
+
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "cache.sqlite")
+        self.cache = EmbeddingCache(self.path, max_memory_entries=2, max_disk_entries=3)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_hit_and_miss(self):
+        embed = mock.Mock(side_effect=fake_embedding)
+        first = self.cache.get_embedding("USDC,  ethereum\n", "m", embed)
+        second = self.cache.get_embedding("USDC, ethereum", "m", embed)
+        self.assertEqual(first, second)
+        embed.assert_called_once_with(text="USDC, ethereum", model="m")
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["memory_hits"], 1)
+
+    def test_persistent_tier(self):
+        self.cache.put("USDC", "m", [1.0, 2.0])
+        self.cache.close()
+
+        cache = EmbeddingCache(self.path)
+        self.assertEqual(cache.get("USDC", "m"), [1.0, 2.0])
+        self.assertIsNone(cache.get("USDC", "other-model"))
+        self.assertEqual(cache.stats()["disk_hits"], 1)
+        cache.close()
+
+    def test_eviction(self):
+        for i in range(5):
+            self.cache.put(f"token {i}", "m", [float(i)])
+        stats = self.cache.stats()
+        self.assertEqual(stats["memory_entries"], 2)
+        self.assertEqual(stats["disk_entries"], 3)
+        self.assertIsNone(self.cache.get("token 0", "m"))
+        self.assertEqual(self.cache.get("token 4", "m"), [4.0])
+
+    def test_prewarm(self):
+        def fake_embeddings(list_of_text, model):
+            return [fake_embedding(text, model) for text in list_of_text]
+
+        with mock.patch.object(
+            embeddings_utils, "get_embeddings", side_effect=fake_embeddings
+        ) as get_embeddings:
+            self.assertEqual(self.cache.prewarm(["USDC", "USDT", "USDC"], "m"), 2)
+            self.assertEqual(self.cache.prewarm(["USDC"], "m"), 0)
+        get_embeddings.assert_called_once()
+
+    def test_get_embeddings(self):
+        self.cache.put("USDC", "m", [1.0])
+        embed_many = mock.Mock(
+            side_effect=lambda texts, model: [fake_embedding(t, model) for t in texts]
+        )
+        embeddings = self.cache.get_embeddings(
+            ["USDC", "USDT", " USDT", "DAI"], "m", embed_many
+        )
+        self.assertEqual(
+            embeddings, [[1.0], [4.0, 1.0, 0.5], [4.0, 1.0, 0.5], [3.0, 1.0, 0.5]]
+        )
+        # One call for the distinct missing texts, which are cached afterwards
+        embed_many.assert_called_once_with(["USDT", "DAI"], model="m")
+        self.assertEqual(
+            self.cache.get_embeddings(["DAI"], "m", embed_many), [[3.0, 1.0, 0.5]]
+        )
+        self.assertEqual(embed_many.call_count, 1)
+
+    def test_get_fine_tuning_queries(self):
+        queries = get_fine_tuning_queries()
+        self.assertIn("USDC", queries["token"])
+        self.assertTrue(all(q.count(", ") == 2 for q in queries["protocol"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.embeddings_utils import EmbeddingSearchEngine, normalize_embeddings
+from utils.embedding_store import (
+    build_chain_partitions,
+    build_embeddings,
+    content_hash,
+    convert_legacy_csv,
+    load_embedding_store,
+    get_index_paths,
+    save_embedding_store,
+    store_digest,
+    store_exists,
+)
+
+
+class TestEmbeddingStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_save_and_load(self):
+        records = [
+            {"id": 1, "symbol": "USDC", "network_to_contract": {"base": "0x01"}},
+            {"id": 2, "symbol": "USDT", "network_to_contract": {}},
+        ]
+        embeddings = [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]
+        save_embedding_store("tokens", embeddings, records, "m", self.directory)
+        self.assertTrue(store_exists("tokens", self.directory))
+
+        store = load_embedding_store("tokens", self.directory)
+        self.assertIsInstance(store.matrix, np.memmap)
+        self.assertEqual(store.matrix.dtype, np.float32)
+        self.assertEqual(store.dim, 3)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.model, "m")
+        self.assertEqual(store.records, records)
+        # The rows are saved normalized and searched without a copy
+        self.assertTrue(store.normalized)
+        np.testing.assert_allclose(
+            store.matrix, normalize_embeddings(embeddings), rtol=1e-6
+        )
+        engine = EmbeddingSearchEngine(store.matrix, store.normalized)
+        self.assertTrue(np.shares_memory(engine.vectors, store.matrix))
+
+    def test_partitions(self):
+        records = [
+            {"id": 1, "network_to_contract": {"base": "0x01", "ethereum": "0x02"}},
+            {"id": 2, "network_to_contract": {"ethereum": "0x03"}},
+        ]
+        partitions = build_chain_partitions(records)
+        self.assertEqual(partitions, {"base": [0], "ethereum": [0, 1]})
+
+        save_embedding_store(
+            "tokens",
+            [[1.0], [2.0]],
+            records,
+            directory=self.directory,
+            partitions=partitions,
+        )
+        store = load_embedding_store("tokens", self.directory)
+        self.assertEqual(store.partitions["ethereum"].tolist(), [0, 1])
+
+    def test_digest(self):
+        matrix = np.ones((2, 3), dtype=np.float32)
+        self.assertEqual(store_digest(matrix), store_digest(matrix.copy()))
+        self.assertNotEqual(store_digest(matrix), store_digest(matrix * 2))
+        self.assertNotEqual(
+            store_digest(matrix, ["a", "b"]), store_digest(matrix, ["a", "c"])
+        )
+
+        save_embedding_store(
+            "tokens", matrix, [{}, {}], directory=self.directory, hashes=["a", "b"]
+        )
+        store = load_embedding_store("tokens", self.directory)
+        self.assertEqual(store.digest, store_digest(matrix, ["a", "b"]))
+
+    def test_save_removes_stale_indexes(self):
+        save_embedding_store("tokens", [[1.0]], [{}], directory=self.directory)
+        paths = [
+            os.path.join(self.directory, name)
+            for name in ("tokens.ivf.npz", "tokens.int8.npz", "tokens_v2.ivf.npz")
+        ]
+        for path in paths:
+            np.savez(path, codes=np.zeros(1))
+        self.assertEqual(
+            sorted(get_index_paths("tokens", self.directory)), sorted(paths[:2])
+        )
+
+        save_embedding_store("tokens", [[2.0]], [{}], directory=self.directory)
+        self.assertEqual(get_index_paths("tokens", self.directory), [])
+        # The indexes of other stores are kept
+        self.assertTrue(os.path.exists(paths[2]))
+
+    def test_row_count_mismatch(self):
+        with self.assertRaises(ValueError):
+            save_embedding_store("bad", [[0.1, 0.2]], [], directory=self.directory)
+
+    def test_missing_store(self):
+        self.assertFalse(store_exists("missing", self.directory))
+        with self.assertRaises(FileNotFoundError):
+            load_embedding_store("missing", self.directory)
+
+    def test_convert_legacy_csv(self):
+        csv_path = os.path.join(self.directory, "legacy.csv")
+        with open(csv_path, "w") as file:
+            file.write("id,symbol,network_to_contract,embedding\n")
+            file.write("1,USDC,\"{'base': '0x01'}\",\"[0.5, 0.25]\"\n")
+        index_path = os.path.join(self.directory, "legacy.ivf.npz")
+        np.savez(index_path, list_rows=np.zeros(1))
+        convert_legacy_csv(csv_path, "legacy", directory=self.directory)
+        # The index of the replaced store is stale
+        self.assertFalse(os.path.exists(index_path))
+
+        store = load_embedding_store("legacy", self.directory)
+        self.assertEqual(store.records[0]["network_to_contract"], {"base": "0x01"})
+        np.testing.assert_allclose(store.matrix[0], [0.8944272, 0.4472136])
+
+    def test_convert_csv_without_embeddings(self):
+        csv_path = os.path.join(self.directory, "protocol.csv")
+        with open(csv_path, "w") as file:
+            file.write("id,text\n")
+            file.write("aave,Aave\n")
+        with self.assertRaises(ValueError):
+            convert_legacy_csv(csv_path, "protocol", directory=self.directory)
+        self.assertFalse(store_exists("protocol", self.directory))
+
+
+class TestBuildEmbeddings(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.tmp_dir.name
+        self.embedded = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def test_content_hash(self):
+        self.assertEqual(
+            content_hash("USD  Coin\n", "m"), content_hash("USD Coin", "m")
+        )
+        self.assertNotEqual(
+            content_hash("USD Coin", "m"), content_hash("USD Coin", "n")
+        )
+
+    def test_missing_text(self):
+        # pandas reads an empty description as NaN
+        texts = ["Dai", float("nan")]
+        matrix, hashes, stats = build_embeddings(texts, "m", self.embed)
+        self.assertEqual(stats, {"reused": 0, "recomputed": 2})
+        self.assertEqual(self.embedded, ["Dai", "nan"])
+        self.assertEqual(hashes[1], content_hash("nan", "m"))
+        self.assertEqual(matrix.shape, (2, 2))
+
+    def test_reuse(self):
+        texts = ["USDC", "Tether", "Dai"]
+        matrix, hashes, stats = build_embeddings(texts, "m", self.embed, batch_size=2)
+        self.assertEqual(stats, {"reused": 0, "recomputed": 3})
+        save_embedding_store(
+            "tokens", matrix, [{}] * 3, "m", self.directory, hashes=hashes
+        )
+
+        previous = load_embedding_store("tokens", self.directory)
+        self.assertEqual(previous.hashes, hashes)
+        self.embedded.clear()
+        texts = ["Dai", "USDC", "Wrapped  Ether", "Wrapped Ether"]
+        matrix, hashes, stats = build_embeddings(texts, "m", self.embed, previous)
+        self.assertEqual(stats, {"reused": 2, "recomputed": 2})
+        # Each new text is embedded once, normalized
+        self.assertEqual(self.embedded, ["Wrapped Ether"])
+        np.testing.assert_array_equal(matrix[:2], previous.matrix[[2, 0]])
+        np.testing.assert_array_equal(matrix[2:], [[13.0, 1.0], [13.0, 1.0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+
+from utils.embeddings_utils import (
+    EmbeddingSearchEngine,
+    cosine_similarity,
+    normalize_embeddings,
+    top_k_indices,
+)
+
+
+class TestEmbeddingsUtils(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.standard_normal((200, 16))
+        self.query = rng.standard_normal(16)
+        self.engine = EmbeddingSearchEngine(self.embeddings)
+
+    def _brute_force(self, rows):
+        scores = [(cosine_similarity(self.query, self.embeddings[i]), i) for i in rows]
+        scores.sort(key=lambda x: x[0], reverse=True)
+        return scores
+
+    def test_search_matches_brute_force(self):
+        expected = self._brute_force(range(len(self.embeddings)))[:5]
+        result = self.engine.search(self.query, top_k=5)
+        self.assertEqual([i for i, _ in result], [i for _, i in expected])
+        for (_, score), (expected_score, _) in zip(result, expected):
+            self.assertAlmostEqual(score, expected_score, places=5)
+
+    def test_search_rows(self):
+        rows = np.arange(0, 200, 3)
+        expected = self._brute_force(rows)[:3]
+        result = self.engine.search(self.query, top_k=3, rows=rows)
+        self.assertEqual([i for i, _ in result], [i for _, i in expected])
+
+    def test_search_partition(self):
+        rows = np.arange(1, 200, 2)
+        self.engine.add_partition("odd", rows)
+        # Only the row indexes are kept, not a copy of their vectors
+        np.testing.assert_array_equal(self.engine.partitions["odd"], rows)
+        self.assertEqual(
+            self.engine.search(self.query, top_k=4, partition="odd"),
+            self.engine.search(self.query, top_k=4, rows=rows),
+        )
+
+    def test_search_many(self):
+        rng = np.random.default_rng(1)
+        queries = rng.standard_normal((4, 16))
+        rows = np.arange(0, 200, 3)
+        self.engine.add_partition("thirds", rows)
+        for kwargs in ({}, {"rows": rows}, {"partition": "thirds"}):
+            results = self.engine.search_many(queries, 5, **kwargs)
+            for query, result in zip(queries, results):
+                expected = self.engine.search(query, 5, **kwargs)
+                self.assertEqual([i for i, _ in result], [i for i, _ in expected])
+                np.testing.assert_allclose(
+                    [s for _, s in result], [s for _, s in expected], rtol=1e-5
+                )
+        self.assertEqual(self.engine.search_many([], 5), [])
+
+    def test_normalized_embeddings_are_not_copied(self):
+        vectors = normalize_embeddings(self.embeddings)
+        engine = EmbeddingSearchEngine(vectors, normalized=True)
+        self.assertTrue(np.shares_memory(engine.vectors, vectors))
+        self.assertEqual(
+            engine.search(self.query, 5), self.engine.search(self.query, 5)
+        )
+
+    def test_top_k_indices(self):
+        scores = np.array([0.5, 0.9, 0.5, 0.1, 0.5])
+        self.assertEqual(top_k_indices(scores, 3).tolist(), [1, 0, 2])
+        self.assertEqual(top_k_indices(scores, 10).tolist(), [1, 0, 2, 4, 3])
+        self.assertEqual(top_k_indices(scores, 0).tolist(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+from utils.json_rpc_stub import JsonRpcStub, add_ens_names
+from web3_utils.ens_utils import EnsResolver
+
+VITALIK = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"
+NICK = "0xb8c2C29ee19D8307cb7255e1Cd9CbDE883A267d5"
+
+
+class TestEnsResolver(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = JsonRpcStub().start()
+        add_ens_names(cls.stub, {"vitalik.eth": VITALIK, "nick.eth": NICK})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "ens.sqlite")
+        self.resolver = EnsResolver(self.stub.url, cache_path=self.path)
+        self.stub.calls.clear()
+
+    def tearDown(self):
+        self.resolver.close()
+        self.tmp_dir.cleanup()
+
+    def test_resolve(self):
+        self.assertEqual(self.resolver.resolve("vitalik.eth"), VITALIK)
+        calls = self.stub.calls["eth_call"]
+        self.assertEqual(self.resolver.resolve(" Vitalik.ETH "), VITALIK)
+        self.assertEqual(self.stub.calls["eth_call"], calls)
+        self.assertEqual(self.resolver.hits, 1)
+
+    def test_negative_cache(self):
+        self.assertIsNone(self.resolver.resolve("nobody.eth"))
+        calls = self.stub.calls["eth_call"]
+        self.assertIsNone(self.resolver.resolve("nobody.eth"))
+        self.assertEqual(self.stub.calls["eth_call"], calls)
+
+    def test_ttl(self):
+        resolver = EnsResolver(self.stub.url, cache_path=None, ttl=0)
+        resolver.resolve("vitalik.eth")
+        calls = self.stub.calls["eth_call"]
+        self.assertEqual(resolver.resolve("vitalik.eth"), VITALIK)
+        self.assertEqual(self.stub.calls["eth_call"], 2 * calls)
+
+    def test_persistent_cache(self):
+        self.resolver.resolve("vitalik.eth")
+        self.resolver.close()
+        self.stub.calls.clear()
+
+        resolver = EnsResolver(self.stub.url, cache_path=self.path)
+        self.assertEqual(resolver.resolve("vitalik.eth"), VITALIK)
+        self.assertEqual(self.stub.calls["eth_call"], 0)
+        resolver.close()
+
+    def test_resolve_many(self):
+        self.resolver.resolve("nick.eth")
+        result = self.resolver.resolve_many(
+            ["vitalik.eth", "nick.eth", "nobody.eth", "VITALIK.eth"]
+        )
+        self.assertEqual(
+            result,
+            {
+                "vitalik.eth": VITALIK,
+                "nick.eth": NICK,
+                "nobody.eth": None,
+                "VITALIK.eth": VITALIK,
+            },
+        )
+        self.assertEqual(self.resolver.hits, 1)
+        self.assertEqual(self.resolver.resolve("nobody.eth"), None)
+        self.assertEqual(self.resolver.hits, 2)
+
+    def test_resolve_many_with_failing_name(self):
+        result = self.resolver.resolve_many(["vitalik.eth", "bad..eth"])
+        self.assertEqual(result["vitalik.eth"], VITALIK)
+        self.assertIsInstance(result["bad..eth"], ValueError)
+        with self.assertRaises(ValueError):
+            self.resolver.resolve("bad..eth")
+        # The name which resolved was cached
+        calls = self.stub.calls["eth_call"]
+        self.assertEqual(self.resolver.resolve("vitalik.eth"), VITALIK)
+        self.assertEqual(self.stub.calls["eth_call"], calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from utils.embedding_cache import set_default_cache
+from utils.evaluation_service import (
+    EvaluationService,
+    MicroBatcher,
+    StandInEnsResolver,
+    create_standin_searchers,
+    load_sample_responses,
+    request_json,
+    run_load_test,
+    standin_embedding,
+    start_server,
+)
+
+TRANSFER = {
+    "action": "transfer",
+    "chain": "Ethereum",
+    "amount": "5",
+    "token": "USDC",
+    "receiver": "biden.eth",
+}
+APPROVE = {
+    "action": "approve",
+    "chain": "Polygon",
+    "amount": "5",
+    "token": "DAI",
+    "spender": "yearn v3",
+}
+
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_merges_concurrent_items(self):
+        calls = []
+
+        def process(items):
+            calls.append(items)
+            return [item * 2 for item in items]
+
+        async def run():
+            batcher = MicroBatcher(process, max_wait=0.01, max_size=10)
+            results = await asyncio.gather(*(batcher.submit(i % 3) for i in range(6)))
+            return batcher, results
+
+        batcher, results = asyncio.run(run())
+        self.assertEqual(results, [0, 2, 4, 0, 2, 4])
+        # Equal items are processed once
+        self.assertEqual(calls, [[0, 1, 2]])
+        self.assertEqual((batcher.batches, batcher.items), (1, 3))
+
+    def test_max_size_and_errors(self):
+        def process(items):
+            return [ValueError(item) if item == 1 else item for item in items]
+
+        async def run():
+            batcher = MicroBatcher(process, max_wait=10, max_size=2)
+            return batcher, await asyncio.gather(
+                *(batcher.submit(i) for i in range(4)), return_exceptions=True
+            )
+
+        # A full batch doesn't wait for the window to end
+        batcher, results = asyncio.run(asyncio.wait_for(run(), 5))
+        self.assertEqual(batcher.batches, 2)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual([results[0], results[2], results[3]], [0, 2, 3])
+
+    def test_failed_batch(self):
+        def process(items):
+            raise RuntimeError("unavailable")
+
+        async def run():
+            batcher = MicroBatcher(process, max_wait=0.001)
+            return await asyncio.gather(
+                batcher.submit("a"), batcher.submit("b"), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    def test_missing_results(self):
+        def process(items):
+            return items[:1]
+
+        async def run():
+            batcher = MicroBatcher(process, max_wait=0.001)
+            return await asyncio.gather(
+                batcher.submit("a"), batcher.submit("b"), return_exceptions=True
+            )
+
+        # Every request fails instead of waiting forever
+        results = asyncio.run(asyncio.wait_for(run(), 5))
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+
+class TestEvaluationService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.service = EvaluationService.create(offline=True, max_wait=0.01)
+
+    @classmethod
+    def tearDownClass(cls):
+        # The offline service replaced the process-wide embedding cache
+        set_default_cache(None)
+
+    def test_standins(self):
+        embedding = standin_embedding("Wrapped Bitcoin")
+        self.assertAlmostEqual(sum(v * v for v in embedding), 1.0, places=5)
+        self.assertEqual(embedding, standin_embedding("wrapped  bitcoin"))
+        resolver = StandInEnsResolver()
+        self.assertEqual(
+            resolver.resolve("Vitalik.eth"), resolver.resolve("vitalik.eth")
+        )
+
+    def test_standin_searchers_keep_na_like_symbols(self):
+        with tempfile.TemporaryDirectory() as directory:
+            map_path = os.path.join(directory, "map.csv")
+            pd.DataFrame(
+                [
+                    {
+                        "id": 7,
+                        "name": "NULL",
+                        "symbol": "NAN",
+                        "decimals": 18,
+                        "network_to_contract": {"ethereum": "0x07"},
+                        "description": "",
+                    }
+                ]
+            ).to_csv(map_path, index=False)
+            token_searcher, _ = create_standin_searchers(
+                dim=16, token_map_path=map_path
+            )
+        record = token_searcher._load_store().records[0]
+        self.assertEqual((record["symbol"], record["name"]), ("NAN", "NULL"))
+
+    def test_evaluate(self):
+        response = json.dumps([TRANSFER, APPROVE])
+        results = [json.loads(r) for r in asyncio.run(self.service.evaluate(response))]
+        self.assertEqual(results[0]["chain"]["name"], "ethereum")
+        self.assertEqual(results[0]["to"], "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48")
+        # The spender is resolved to the yearn DAI vault on Polygon
+        self.assertIn("0x90b2f5...0F773B", results[1]["description"])
+
+    def test_concurrent_requests_are_batched(self):
+        service = EvaluationService(
+            self.service.token_searcher,
+            self.service.protocol_searcher,
+            StandInEnsResolver(),
+            max_wait=0.05,
+        )
+        responses = [
+            json.dumps([{**TRANSFER, "receiver": f"user{i}.eth"}]) for i in range(8)
+        ]
+
+        async def run():
+            return await asyncio.gather(*(service.evaluate(r) for r in responses))
+
+        results = asyncio.run(run())
+        self.assertEqual(len(results), 8)
+        stats = service.stats()
+        self.assertEqual(stats["requests"], 8)
+        self.assertEqual((stats["ens"]["batches"], stats["ens"]["items"]), (1, 8))
+        self.assertEqual(stats["tokens"]["items"], 1)
+        self.assertEqual(service.ens_resolver.calls, 1)
+
+    def test_ens_batch_failure(self):
+        class Resolver(StandInEnsResolver):
+            def resolve_many(self, names):
+                raise ValueError("bad name")
+
+            def resolve(self, name):
+                if name == "bad.eth":
+                    raise ValueError("bad name")
+                return super().resolve_many([name])[name]
+
+        service = EvaluationService(
+            self.service.token_searcher, self.service.protocol_searcher, Resolver()
+        )
+        results = service._resolve_ens(["good.eth", "bad.eth"])
+        self.assertTrue(results[0].startswith("0x"))
+        self.assertIsInstance(results[1], ValueError)
+
+    def test_http(self):
+        async def run():
+            server = await start_server(self.service, port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                responses = [
+                    await request_json("127.0.0.1", port, "GET", "/health"),
+                    await request_json(
+                        "127.0.0.1",
+                        port,
+                        "POST",
+                        "/evaluate",
+                        {"response": json.dumps([TRANSFER])},
+                    ),
+                    await request_json(
+                        "127.0.0.1", port, "POST", "/evaluate", {"response": "["}
+                    ),
+                    await request_json("127.0.0.1", port, "GET", "/evaluate"),
+                    await request_json("127.0.0.1", port, "GET", "/unknown"),
+                ]
+                report = await run_load_test(
+                    "127.0.0.1", port, load_sample_responses(), 20, concurrency=5
+                )
+            return responses, report
+
+        responses, report = asyncio.run(run())
+        statuses = [status for status, _ in responses]
+        self.assertEqual(statuses, [200, 200, 400, 405, 404])
+        self.assertEqual(responses[1][1]["results"][0]["action"], "transfer")
+        self.assertEqual((report["requests"], report["errors"]), (20, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
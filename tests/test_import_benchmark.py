@@ -0,0 +1,21 @@
+import unittest
+
+from utils.import_benchmark import benchmark, measure_import
+
+
+class TestImportBenchmark(unittest.TestCase):
+
+    def test_evaluation_path_is_light(self):
+        # Imported without API keys and without the analysis dependencies
+        for module in ("utils.action_utils", "utils.async_action_utils"):
+            self.assertEqual(measure_import(module)["heavy"], [], module)
+
+    def test_benchmark(self):
+        report = benchmark("utils.data_utils", runs=2)
+        self.assertEqual(report["runs"], 2)
+        self.assertLessEqual(report["min_seconds"], report["median_seconds"])
+        self.assertGreater(report["min_seconds"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from utils.embedding_store import EmbeddingStore
+from utils.lexical_index import TOKEN_FIELDS, BM25Index, fuse_scores, tokenize
+from utils.protocol_searcher import ProtocolSearcher
+
+TOKENS = [
+    {"symbol": "USDT", "name": "Tether USDt", "description": "A USD stablecoin."},
+    {"symbol": "USDe", "name": "Ethena USDe", "description": "A synthetic dollar."},
+    {"symbol": "sUSDe", "name": "Ethena Staked USDe", "description": "Staked USDe."},
+    {
+        "symbol": "WBTC",
+        "name": "Wrapped Bitcoin",
+        "description": "Bitcoin on Ethereum.",
+    },
+]
+
+PROTOCOLS = [
+    {
+        "id": f"yearn_polygon_{asset}_vault",
+        "protocol": "yearn v3",
+        "chain": "polygon",
+        "description": f"{asset.upper()} yVault-A on Polygon earns yield on {asset.upper()}.",
+        "address": f"0x{i}",
+    }
+    for i, asset in enumerate(["dai", "usdt", "usdc", "weth"])
+]
+
+
+class TestBM25Index(unittest.TestCase):
+
+    def setUp(self):
+        self.index = BM25Index(TOKENS, TOKEN_FIELDS)
+
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize("yearn_polygon_DAI_vault v3"),
+            ["yearn", "polygon", "dai", "vault", "v3"],
+        )
+        self.assertEqual(tokenize(None), [])
+
+    def test_search(self):
+        matches = self.index.search("usde")
+        self.assertEqual([row for row, _ in matches], [1, 2])
+        self.assertEqual(self.index.search("wrapped bitcoin")[0][0], 3)
+        self.assertEqual(self.index.search("unknown"), [])
+
+        allowed = np.array([True, False, True, True])
+        self.assertEqual([row for row, _ in self.index.search("usde", 5, allowed)], [2])
+
+    def test_confidence(self):
+        query = "wrapped bitcoin"
+        self.assertTrue(self.index.is_confident(query, self.index.search(query)))
+        # USDe and sUSDe match about as well
+        self.assertFalse(self.index.is_confident("usde", self.index.search("usde")))
+        # The best match lacks a query term
+        query = "wrapped dollar"
+        self.assertFalse(self.index.is_confident(query, self.index.search(query)))
+        self.assertFalse(self.index.is_confident("unknown", []))
+
+    def test_fuse_scores(self):
+        fused = fuse_scores([(0, 0.5), (1, 0.6)], [(0, 4.0), (2, 2.0)], weight=0.5)
+        self.assertEqual([row for row, _ in fused], [0, 1])
+        self.assertAlmostEqual(fused[0][1], 0.75)
+        self.assertAlmostEqual(fused[1][1], 0.3)
+
+
+class TestProtocolSearcherLexical(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        matrix = rng.normal(size=(len(PROTOCOLS), 8)).astype(np.float32)
+        self.matrix = matrix
+        self.searcher = ProtocolSearcher()
+        self.searcher._store = EmbeddingStore(matrix, PROTOCOLS)
+
+    def embed_near(self, row: int, similarity: float, other: int | None = None):
+        """
+        A query embedding with the given cosine similarity to a row of an
+        orthonormal store, and optionally 0.3 to another row
+        """
+        query = np.zeros(8, dtype=np.float32)
+        query[row] = similarity
+        if other is not None:
+            query[other] = 0.3
+        query[-1] = np.sqrt(1 - np.sum(query**2))
+        return query
+
+    def test_confident_match_skips_embedding(self):
+        with mock.patch("utils.protocol_searcher.get_cached_embedding") as embed:
+            result = self.searcher.search_protocol("yearn v3 dai")
+        embed.assert_not_called()
+        self.assertEqual(result["suggested"]["id"], "yearn_polygon_dai_vault")
+        self.assertEqual(result["suggested"]["score"], 1.0)
+        self.assertEqual(len(result["other_options"]), 3)
+
+    def test_async_confident_match_skips_embedding(self):
+        with mock.patch("utils.protocol_searcher.aget_cached_embedding") as embed:
+            result = asyncio.run(self.searcher.asearch_protocol("yearn v3 dai"))
+        embed.assert_not_called()
+        self.assertEqual(result["suggested"]["id"], "yearn_polygon_dai_vault")
+
+    def test_threshold_uses_cosine(self):
+        self.searcher._store = EmbeddingStore(
+            np.eye(8, dtype=np.float32)[:4], PROTOCOLS
+        )
+        disabled = ProtocolSearcher(lexical=False, store=self.searcher._store)
+        # 0.6 to the DAI vault and 0.3 to the USDC vault, which matches lexically
+        query = self.embed_near(0, 0.6, other=2)
+        with mock.patch(
+            "utils.protocol_searcher.get_cached_embedding", return_value=query
+        ):
+            result = self.searcher.search_protocol("usdc stablecoin")
+            expected = disabled.search_protocol("usdc stablecoin")
+        self.assertEqual(expected["suggested"]["id"], "yearn_polygon_dai_vault")
+        self.assertEqual(result["suggested"]["id"], "yearn_polygon_dai_vault")
+        self.assertAlmostEqual(result["suggested"]["score"], 0.6, places=5)
+
+    def test_ambiguous_match_falls_back(self):
+        with mock.patch(
+            "utils.protocol_searcher.get_cached_embedding",
+            return_value=self.matrix[2],
+        ) as embed:
+            result = self.searcher.search_protocol("yearn vault")
+        embed.assert_called_once()
+        self.assertEqual(result["suggested"]["id"], "yearn_polygon_usdc_vault")
+
+    def test_search_protocols(self):
+        queries = ["yearn v3 dai", "yearn vault", "wrapped ether"]
+        embeddings = {
+            "yearn v3 dai": self.matrix[0],
+            "yearn vault": self.matrix[2],
+            "wrapped ether": self.matrix[3],
+        }
+        with mock.patch(
+            "utils.protocol_searcher.get_cached_embedding",
+            side_effect=lambda query, model: embeddings[query],
+        ), mock.patch(
+            "utils.protocol_searcher.get_cached_embeddings",
+            side_effect=lambda queries, model: [embeddings[q] for q in queries],
+        ) as embed_many:
+            results = self.searcher.search_protocols(queries)
+            expected = [self.searcher.search_protocol(query) for query in queries]
+        # The confident lexical match is not embedded
+        embed_many.assert_called_once_with(
+            ["yearn vault", "wrapped ether"], "text-embedding-3-small"
+        )
+        self.assertEqual(len(results), 3)
+        for result, single in zip(results, expected):
+            self.assertEqual(result["suggested"]["id"], single["suggested"]["id"])
+            self.assertEqual(
+                [option["id"] for option in result["other_options"]],
+                [option["id"] for option in single["other_options"]],
+            )
+            self.assertAlmostEqual(
+                result["suggested"]["score"], single["suggested"]["score"], places=5
+            )
+
+    def test_lexical_disabled(self):
+        searcher = ProtocolSearcher(lexical=False)
+        searcher._store = self.searcher._store
+        with mock.patch(
+            "utils.protocol_searcher.get_cached_embedding",
+            return_value=self.matrix[1],
+        ) as embed:
+            result = searcher.search_protocol("yearn v3 dai")
+        embed.assert_called_once()
+        self.assertEqual(result["suggested"]["id"], "yearn_polygon_usdt_vault")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from unittest import mock
+
+from utils.json_rpc_stub import JsonRpcStub, add_erc20_token, add_multicall
+from web3_utils import erc20_utils, provider_pool
+from web3_utils.multicall import ContractCall, Multicall, get_multicall_address
+from web3_utils.provider_pool import ProviderPool
+
+USDC = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
+WETH = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
+NO_DECIMALS = "0x1111111111111111111111111111111111111111"
+
+
+class TestMulticall(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = JsonRpcStub().start()
+        add_multicall(cls.stub)
+        add_erc20_token(cls.stub, USDC, "USD Coin", "USDC", 6)
+        add_erc20_token(cls.stub, WETH, "Wrapped Ether", "WETH", 18)
+        add_erc20_token(cls.stub, NO_DECIMALS, "No Decimals", "NODEC")
+        cls.pool = ProviderPool(rpc_urls={1: cls.stub.url})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        cls.stub.stop()
+
+    def setUp(self):
+        self.stub.calls.clear()
+
+    def test_aggregate(self):
+        calls = [
+            ContractCall(token, "decimals()", output_types=["uint8"])
+            for token in (USDC, WETH, NO_DECIMALS, USDC)
+        ]
+        multicall = Multicall(self.pool.get_web3(1), chain_id=1, chunk_size=3)
+        self.assertEqual(multicall.aggregate(calls), [6, 18, None, 6])
+        # One eth_call per chunk
+        self.assertEqual(self.stub.calls["eth_call"], 2)
+
+    def test_calldata(self):
+        call = ContractCall(USDC, "balanceOf(address)", [WETH], ["uint256"])
+        self.assertEqual(
+            call.calldata.hex(),
+            "70a08231000000000000000000000000c02aaa39b223fe8d0a0e5c4f27ead9083c756cc2",
+        )
+
+    def test_address(self):
+        self.assertEqual(get_multicall_address(1), get_multicall_address(8453))
+        self.assertNotEqual(get_multicall_address(1), get_multicall_address(324))
+
+    def test_get_token_info_many(self):
+        with mock.patch.object(provider_pool, "_default_pool", self.pool):
+            tokens = erc20_utils.ERC20Utils().get_token_info_many(
+                [USDC, WETH, NO_DECIMALS]
+            )
+
+        self.assertEqual(
+            [(token.name, token.symbol, token.decimals) for token in tokens],
+            [
+                ("USD Coin", "USDC", 6),
+                ("Wrapped Ether", "WETH", 18),
+                ("No Decimals", "NODEC", None),
+            ],
+        )
+        self.assertEqual(self.stub.calls["eth_call"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
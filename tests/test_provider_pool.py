@@ -0,0 +1,53 @@
+import threading
+import unittest
+
+from utils.json_rpc_stub import JsonRpcStub
+from web3_utils.provider_pool import ProviderPool
+
+
+class TestProviderPool(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = JsonRpcStub(chain_id=10).start()
+        self.pool = ProviderPool(rpc_urls={10: self.stub.url}, pool_size=2)
+
+    def tearDown(self):
+        self.pool.close()
+        self.stub.stop()
+
+    def test_shared_web3(self):
+        w3 = self.pool.get_web3(10)
+        self.assertIs(self.pool.get_web3(10), w3)
+        self.assertIs(self.pool.get_web3_for_url(self.stub.url), w3)
+        self.assertIsNot(self.pool.get_web3(1), w3)
+        self.assertEqual(w3.eth.chain_id, 10)
+
+    def test_unsupported_chain(self):
+        with self.assertRaises(ValueError):
+            self.pool.get_web3(-1)
+
+    def test_keep_alive(self):
+        w3 = self.pool.get_web3(10)
+        for _ in range(5):
+            w3.eth.block_number
+        self.assertEqual(self.stub.calls["eth_blockNumber"], 5)
+        self.assertEqual(len(self.stub.connections), 1)
+
+    def test_bounded_connections(self):
+        w3 = self.pool.get_web3(10)
+
+        def query():
+            for _ in range(5):
+                w3.eth.block_number
+
+        threads = [threading.Thread(target=query) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.stub.calls["eth_blockNumber"], 30)
+        self.assertLessEqual(len(self.stub.connections), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
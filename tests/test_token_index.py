@@ -0,0 +1,123 @@
+import unittest
+
+from utils.token_index import (
+    EXACT_NAME,
+    EXACT_SYMBOL,
+    PREFIX,
+    SUBSTRING,
+    TokenLookupIndex,
+)
+
+RECORDS = [
+    {
+        "id": 825,
+        "name": "Tether USDt",
+        "symbol": "USDT",
+        "decimals": 6,
+        "network_to_contract": {
+            "ethereum": "0xdAC17F958D2ee523a2206206994597C13D831ec7"
+        },
+    },
+    {
+        "id": 3408,
+        "name": "USDC",
+        "symbol": "USDC",
+        "decimals": 6,
+        "network_to_contract": {
+            "ethereum": "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48",
+            "base": "0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913",
+        },
+    },
+    {
+        "id": 7083,
+        "name": "Uniswap",
+        "symbol": "UNI",
+        "decimals": 18,
+        "network_to_contract": {
+            "ethereum": "0x1f9840a85d5aF5bf1D1762F925BDADdC4201F984"
+        },
+    },
+    {
+        "id": 9436,
+        "name": "Dogelon Mars",
+        "symbol": "ELON",
+        "decimals": 18,
+        "network_to_contract": {
+            "ethereum": "0x761D38e5ddf6ccf6Cf7c55759d5210750B5D60F3",
+            "polygon": "0xE0339c80fFDE91F3e20494Df88d4206D86024cdF",
+        },
+    },
+    {
+        "id": 5660,
+        "name": "Doge Killer",
+        "symbol": "LEASH",
+        "decimals": 18,
+        "network_to_contract": {
+            "ethereum": "0x27C70Cd1946795B66be9d954418546998b546634"
+        },
+    },
+    {
+        "id": 30171,
+        "name": "Ethena",
+        "symbol": "ENA",
+        "decimals": 18,
+        "network_to_contract": {
+            "ethereum": "0x57e114B691Db790C35207b2e685D4A43181e6061"
+        },
+    },
+    {
+        "id": 5975,
+        "name": "Ethernity Chain",
+        "symbol": "ERN",
+        "decimals": 18,
+        "network_to_contract": {
+            "polygon": "0x0E50BEA95Fe001A370A4F1C220C49AEdCB982DeC"
+        },
+    },
+]
+
+
+class TestTokenLookupIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TokenLookupIndex(RECORDS)
+
+    def test_exact_matches(self):
+        self.assertEqual(self.index.search("usdc"), [(EXACT_SYMBOL, 1)])
+        self.assertEqual(self.index.search("Uniswap"), [(EXACT_NAME, 2)])
+
+    def test_partial_matches(self):
+        self.assertEqual(self.index.search("usd"), [(PREFIX, 0), (PREFIX, 1)])
+        self.assertEqual(self.index.search("swap"), [(SUBSTRING, 2)])
+        self.assertEqual(self.index.search("dai"), [])
+
+    def test_lookup_by_chain(self):
+        self.assertEqual(self.index.lookup("USDC", "base"), 1)
+        self.assertEqual(self.index.lookup("swap", "ethereum"), 2)
+        # An exact match which is not on the chain hides partial matches
+        self.assertIsNone(self.index.lookup("USDT", "base"))
+        self.assertIsNone(self.index.lookup("USDC", None))
+
+    def test_lookup_partial_match_by_rank(self):
+        # The best ranked partial match with a contract on the chain
+        self.assertEqual(self.index.lookup("usd", "ethereum"), 0)
+        self.assertEqual(self.index.lookup("usd", "base"), 1)
+        self.assertEqual(self.index.lookup("DOGE", "polygon"), 3)
+        self.assertEqual(self.index.lookup("DOGE", "ethereum"), 3)
+        self.assertEqual(self.index.lookup("ETH", "ethereum"), 5)
+        self.assertIsNone(self.index.lookup("DOGE", "base"))
+
+    def test_lookup_by_address(self):
+        address = "0x833589fcd6edb6e08f4c7c32d4f71b54bda02913"
+        self.assertEqual(self.index.lookup(address, "base"), 1)
+        self.assertEqual(
+            self.index.lookup(address.upper().replace("0X", "0x"), "base"), 1
+        )
+        self.assertEqual(
+            self.index.get_contract_address(1, "base"),
+            "0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import zlib
+from unittest import mock
+
+import numpy as np
+
+from utils.embedding_store import EmbeddingStore
+from utils.token_searcher import TokenSearcher
+
+TOKENS = [
+    ("USDT", "Tether USDt", 6, {"ethereum": "0x01", "polygon": "0x02"}),
+    ("USDC", "USDC", 6, {"ethereum": "0x03", "base": "0x04"}),
+    ("USDe", "Ethena USDe", 18, {"ethereum": "0x05"}),
+    ("sUSDe", "Ethena Staked USDe", 18, {"ethereum": "0x06"}),
+    ("WBTC", "Wrapped Bitcoin", 8, {"ethereum": "0x07", "arbitrum": "0x08"}),
+    ("DAI", "Dai", 18, {"ethereum": "0x09", "base": "0x0a"}),
+]
+
+
+def fake_embedding(query, model=None):
+    rng = np.random.default_rng(zlib.crc32(query.encode()))
+    return rng.normal(size=8).tolist()
+
+
+class TestTokenSearcher(unittest.TestCase):
+
+    def setUp(self):
+        records = [
+            {
+                "id": i,
+                "name": name,
+                "symbol": symbol,
+                "decimals": decimals,
+                "network_to_contract": contracts,
+                "description": f"{name} ({symbol}) is a token.",
+            }
+            for i, (symbol, name, decimals, contracts) in enumerate(TOKENS)
+        ]
+        matrix = np.array([fake_embedding(r["name"]) for r in records], np.float32)
+        self.searcher = TokenSearcher()
+        self.searcher._store = EmbeddingStore(matrix, records)
+
+    def test_search_tokens(self):
+        queries = ["USDe", "stable dollar", "eth", "Wrapped Bitcoin", "dai", "usdc"]
+        chains = ["ethereum", None, "Ethereum", "arbitrum", "base", "optimism"]
+        with mock.patch(
+            "utils.token_searcher.get_cached_embedding", side_effect=fake_embedding
+        ), mock.patch(
+            "utils.token_searcher.get_cached_embeddings",
+            side_effect=lambda queries, model: [fake_embedding(q) for q in queries],
+        ) as embed_many:
+            results = self.searcher.search_tokens(queries, chains, other_options=True)
+            expected = [
+                self.searcher.search_token(query, chain, other_options=True)
+                for query, chain in zip(queries, chains)
+            ]
+        # One request for the queries without a confident lexical match
+        embed_many.assert_called_once()
+        self.assertNotIn("Wrapped Bitcoin", embed_many.call_args[0][0])
+
+        self.assertEqual(results[2]["suggested"]["symbol"], "ETH")
+        self.assertEqual(results[5]["other_options"], [])
+        for result, single in zip(results, expected):
+            self.assertEqual(result["suggested"], single["suggested"])
+            self.assertEqual(
+                [option["id"] for option in result["other_options"]],
+                [option["id"] for option in single["other_options"]],
+            )
+            np.testing.assert_allclose(
+                [option["score"] for option in result["other_options"]],
+                [option["score"] for option in single["other_options"]],
+                rtol=1e-5,
+            )
+
+    def test_confident_match_skips_embedding(self):
+        with mock.patch("utils.token_searcher.get_cached_embedding") as embed:
+            result = self.searcher.search_token(
+                "Wrapped Bitcoin", "arbitrum", other_options=True
+            )
+        embed.assert_not_called()
+        self.assertEqual(result["suggested"]["symbol"], "WBTC")
+
+    def test_chain_count_mismatch(self):
+        with self.assertRaises(ValueError):
+            self.searcher.search_tokens(["USDT", "DAI"], ["ethereum"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,8 @@
+import json
+import os
+import tempfile
 import unittest
-from utils.data_utils import DataUtils
+from utils.data_utils import DataUtils, NetworkRegistry
 
 
 class TestUtils(unittest.TestCase):
@@ -25,6 +28,38 @@ class TestUtils(unittest.TestCase):
         res2 = self.data_utils.get_network_info_by_id(123)
         self.assertIsNone(res2)
 
+    def test_get_network_info_by_alias(self):
+        self.assertEqual(self.data_utils.get_network_info_by_name("matic").id, 137)
+        self.assertEqual(self.data_utils.get_network_info_by_name("Arb").id, 42161)
+        self.assertEqual(
+            self.data_utils.get_network_info_by_name(" ETH  Mainnet ").id, 1
+        )
+        # Partial names still resolve, in file order
+        self.assertEqual(self.data_utils.get_network_info_by_name("zksync").id, 324)
+        self.assertIsNone(self.data_utils.get_network_info_by_name(""))
+
+    def test_network_registry_reload(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "network.json")
+            network = {
+                "id": 1,
+                "name": "ethereum",
+                "rpc_url": "http://localhost:8545",
+                "symbol": "ETH",
+                "decimals": 18,
+            }
+            with open(file_path, "w") as file:
+                json.dump([network], file)
+            registry = NetworkRegistry(file_path)
+            self.assertIs(registry.get_by_id(1), registry.get_by_name("ethereum"))
+            self.assertIsNone(registry.get_by_name("eth mainnet"))
+
+            network["aliases"] = ["eth mainnet"]
+            with open(file_path, "w") as file:
+                json.dump([network], file)
+            os.utime(file_path, (0, 1))
+            self.assertEqual(registry.get_by_name("eth mainnet").id, 1)
+
     def test_get_supported_actions(self):
         supported_actions = self.data_utils.get_supported_actions()
         self.assertEqual(len(supported_actions), 2)
@@ -1,6 +1,10 @@
 import unittest
 
-from web3_utils import erc20_utils
+from eth_abi import encode
+from web3_utils import erc20_encoder, erc20_utils
+
+RECIPIENT = "0x00e5DF023726d46F689F157E29d2586FCE0Ca1eD"
+SPENDER = "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"
 
 
 class TestWeb3Utils(unittest.TestCase):
@@ -20,5 +24,39 @@ class TestWeb3Utils(unittest.TestCase):
         )
 
 
+class TestERC20Encoder(unittest.TestCase):
+
+    def test_encode_approve(self):
+        for amount in (0, 1, 10**18, erc20_encoder.MAX_UINT256):
+            expected = (
+                "0x095ea7b3" + encode(["address", "uint256"], [SPENDER, amount]).hex()
+            )
+            self.assertEqual(erc20_encoder.encode_approve(SPENDER, amount), expected)
+
+    def test_encode_transfers(self):
+        transfers = [(RECIPIENT, 1000000), (SPENDER, 5), (RECIPIENT, 7)]
+        self.assertEqual(
+            erc20_encoder.encode_transfers(transfers),
+            [erc20_encoder.encode_transfer(*transfer) for transfer in transfers],
+        )
+        self.assertEqual(
+            erc20_encoder.encode_approves(transfers)[0],
+            erc20_encoder.encode_approve(RECIPIENT, 1000000),
+        )
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            erc20_encoder.encode_transfer("vitalik.eth", 1)
+        with self.assertRaises(ValueError):
+            # Like the ABI encoding, only checksum addresses are accepted
+            erc20_encoder.encode_transfer(RECIPIENT.lower(), 1)
+        with self.assertRaises(ValueError):
+            erc20_encoder.encode_transfer(RECIPIENT, -1)
+        with self.assertRaises(ValueError):
+            erc20_encoder.encode_approve(SPENDER, erc20_encoder.MAX_UINT256 + 1)
+        with self.assertRaises(ValueError):
+            erc20_encoder.encode_approve(SPENDER, 1.5)
+
+
 if __name__ == "__main__":
     unittest.main()
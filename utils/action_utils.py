@@ -3,9 +3,11 @@ import json
 from model.network import Network
 from web3_utils.ens_utils import resolve_ens, is_address
 from web3_utils.erc20_utils import ERC20Utils
-from .data_utils import DataUtils
-from .token_searcher import TokenSearcher
-from .protocol_searcher import ProtocolSearcher
+from .index_registry import (
+    get_data_utils,
+    get_token_searcher,
+    get_protocol_searcher,
+)
 
 
 def get_supported_actions() -> dict[str, str]:
@@ -18,30 +20,35 @@ def get_supported_actions() -> dict[str, str]:
     return {item["name"]: item["description"] for item in json_content}
 
 
-def evaluate_response(response: str) -> list[str]:
+def evaluate_response(response: str, batch: bool = False) -> list[str]:
     """
     Evaluate a generated response
+    If batch is True, the chains, receivers and tokens shared by several actions
+    are resolved only once. The results are the same either way.
     """
     actions = json.loads(response)
+    if batch:
+        return BatchPlanner(actions).evaluate()
     results = []
     for action_item in actions:
         results.append(evaluate_action(action_item))
     return results
 
 
-def evaluate_action(action_item: dict) -> str:
+def evaluate_action(action_item: dict, resolver: "ActionResolver | None" = None) -> str:
     """
     Evaluate an action item
     """
-    supported_actions = get_supported_actions()
+    resolver = resolver or ActionResolver()
+    supported_actions = resolver.get_supported_actions()
     action = action_item["action"]
     if action in supported_actions:
         description = supported_actions[action]
         match action:
             case "transfer":
-                return _get_transfer_action(action_item, description)
+                return _get_transfer_action(action_item, description, resolver)
             case "approve":
-                return _get_approve_action(action_item, description)
+                return _get_approve_action(action_item, description, resolver)
             case _:
                 return UnsupportedActionError(
                     error=f"Not yet supported action: {action}"
@@ -60,7 +67,7 @@ def _shorten_address(address: str, n: int = 6) -> str:
         return address
 
 
-def _get_transfer_action(action: dict, desc: str) -> str:
+def _get_transfer_action(action: dict, desc: str, resolver: "ActionResolver") -> str:
     try:
         user_chain = action["chain"]  # user input chain
         user_amount = action["amount"]  # user input amount
@@ -68,13 +75,13 @@ def _get_transfer_action(action: dict, desc: str) -> str:
         user_receiver = action["receiver"]
 
         # Resolve the chain
-        network = _resolve_chain(user_chain)
+        network = resolver.resolve_chain(user_chain)
         if network is None:
             return InvalidArgumentError(f"Unsupported chain: {user_chain}").to_json()
 
         # Resolve the receiver
         receiver = _resolve_receiver(
-            user_receiver, "transfer", user_token, network.name
+            user_receiver, "transfer", user_token, network.name, resolver
         )
         if receiver is None:
             return InvalidArgumentError(
@@ -82,8 +89,7 @@ def _get_transfer_action(action: dict, desc: str) -> str:
             ).to_json()
 
         # Resolve the token
-        token_searcher = TokenSearcher()
-        search_result = token_searcher.search_token(user_token, network.name)
+        search_result = resolver.search_token(user_token, network.name)
         suggested_token = search_result["suggested"]
         optional_tokens = search_result["other_options"]
         optional_token_symbols = [token["symbol"] for token in optional_tokens]
@@ -121,7 +127,7 @@ def _get_transfer_action(action: dict, desc: str) -> str:
             ).to_json()
         else:
             # Resolve the data
-            token_utils = ERC20Utils()
+            token_utils = resolver.get_erc20_utils()
             data = token_utils.encode_erc20_transfer(token_addr, receiver, token_amount)
 
             return ActionResponse(
@@ -137,7 +143,7 @@ def _get_transfer_action(action: dict, desc: str) -> str:
         return InvalidArgumentError(error=str(e)).to_json()
 
 
-def _get_approve_action(action: dict, desc: str) -> str:
+def _get_approve_action(action: dict, desc: str, resolver: "ActionResolver") -> str:
     try:
         user_chain = action["chain"]  # user input chain
         user_amount = action["amount"]  # user input amount
@@ -145,20 +151,21 @@ def _get_approve_action(action: dict, desc: str) -> str:
         user_spender = action["spender"]
 
         # Resolve the chain
-        network = _resolve_chain(user_chain)
+        network = resolver.resolve_chain(user_chain)
         if network is None:
             return InvalidArgumentError(f"Unsupported chain: {user_chain}").to_json()
 
         # Resolve the spender
-        spender = _resolve_receiver(user_spender, "approve", user_token, network.name)
+        spender = _resolve_receiver(
+            user_spender, "approve", user_token, network.name, resolver
+        )
         if spender is None:
             return InvalidArgumentError(
                 error=f"Invalid spender: {user_spender}"
             ).to_json()
 
         # Resolve the token
-        token_searcher = TokenSearcher()
-        search_result = token_searcher.search_token(user_token, network.name)
+        search_result = resolver.search_token(user_token, network.name)
         suggested_token = search_result["suggested"]
         optional_tokens = search_result["other_options"]
         optional_token_symbols = [token["symbol"] for token in optional_tokens]
@@ -191,7 +198,7 @@ def _get_approve_action(action: dict, desc: str) -> str:
             ).to_json()
         else:
             # Resolve the data
-            token_utils = ERC20Utils()
+            token_utils = resolver.get_erc20_utils()
             data = token_utils.encode_erc20_approve(token_addr, spender, token_amount)
 
             return ActionResponse(
@@ -213,10 +220,16 @@ def _resolve_chain(text: str) -> Network | None:
     Return the network info if the chain is supported; otherwise, return None
     """
     chain = text.strip()
-    return DataUtils().get_network_info_by_name(chain)
+    return get_data_utils().get_network_info_by_name(chain)
 
 
-def _resolve_receiver(raw_text: str, action: str, token: str, chain: str) -> str | None:
+def _resolve_receiver(
+    raw_text: str,
+    action: str,
+    token: str,
+    chain: str,
+    resolver: "ActionResolver | None" = None,
+) -> str | None:
     """
     Resolve the receiver address
     Parameters:
@@ -224,29 +237,191 @@ def _resolve_receiver(raw_text: str, action: str, token: str, chain: str) -> str
         action: str - The action type
         token: str - The token symbol
         chain: str - The chain name
+        resolver: ActionResolver - Resolves ENS names and protocols
     Return:
         the address if it is valid; otherwise, return None
     """
+    resolver = resolver or ActionResolver()
     text = raw_text.strip()
     if text.endswith(".eth"):
-        resolved_addr = resolve_ens(text)
+        resolved_addr = resolver.resolve_ens(text)
         return resolved_addr
     else:
         if is_address(text):
             return text
         else:
-            return _resolve_protocol(action, token, chain)
+            return resolver.resolve_protocol(action, token, chain)
 
 
 def _resolve_protocol(action: str, token: str, chain: str):
-    result = ProtocolSearcher().search_protocol(query=f"{action}, {token}, {chain}")
+    result = get_protocol_searcher().search_protocol(
+        query=protocol_query(action, token, chain)
+    )
+    return suggested_address(result)
+
+
+def protocol_query(action: str, token: str, chain: str) -> str:
+    """
+    Get the protocol search query of an action
+    """
+    return f"{action}, {token}, {chain}"
+
+
+def suggested_address(result: dict | None) -> str | None:
+    """
+    Get the suggested protocol's address of a protocol search result
+    """
     if result is None:
         return None
-    print("Protocols: ", result)
-    # Return the suggested protocol's address
     return result["suggested"]["address"]
 
 
+class ActionResolver:
+    """
+    Resolves the chains, receivers and tokens of action items
+    """
+
+    def get_supported_actions(self) -> dict[str, str]:
+        return get_supported_actions()
+
+    def resolve_chain(self, text: str) -> Network | None:
+        return _resolve_chain(text)
+
+    def resolve_ens(self, name: str) -> str | None:
+        return resolve_ens(name)
+
+    def resolve_protocol(self, action: str, token: str, chain: str) -> str | None:
+        return _resolve_protocol(action, token, chain)
+
+    def search_token(self, token: str, chain: str) -> dict:
+        return get_token_searcher().search_token(token, chain)
+
+    def get_erc20_utils(self) -> ERC20Utils:
+        return ERC20Utils()
+
+
+class CachingActionResolver(ActionResolver):
+    """
+    An ActionResolver which resolves each distinct input only once.
+    Errors are cached as well and raised again for every action that hits them.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._cache: dict[tuple, tuple] = {}
+
+    def _cached(self, key: tuple, resolve, *args):
+        try:
+            hash(key)
+        except TypeError:
+            # Malformed inputs (e.g. lists) are not cached
+            return resolve(*args)
+        if key not in self._cache:
+            try:
+                self._cache[key] = (resolve(*args), None)
+            except Exception as e:
+                self._cache[key] = (None, e)
+        result, error = self._cache[key]
+        if error is not None:
+            raise error
+        return result
+
+    def get_supported_actions(self) -> dict[str, str]:
+        return self._cached(("actions",), super().get_supported_actions)
+
+    def resolve_chain(self, text: str) -> Network | None:
+        return self._cached(("chain", text), super().resolve_chain, text)
+
+    def resolve_ens(self, name: str) -> str | None:
+        return self._cached(("ens", name), super().resolve_ens, name)
+
+    def resolve_protocol(self, action: str, token: str, chain: str) -> str | None:
+        key = ("protocol", action, token, chain)
+        return self._cached(key, super().resolve_protocol, action, token, chain)
+
+    def search_token(self, token: str, chain: str) -> dict:
+        key = ("token", token, chain)
+        return self._cached(key, super().search_token, token, chain)
+
+    def get_erc20_utils(self) -> ERC20Utils:
+        return self._cached(("erc20_utils",), super().get_erc20_utils)
+
+
+class BatchPlanner:
+    """
+    Evaluates the action items of one response together.
+    The distinct chains are resolved first, then the distinct receivers and
+    finally the distinct tokens; the per-action responses are then assembled
+    from the resolved values.
+    """
+
+    RECEIVER_KEYS = {"transfer": "receiver", "approve": "spender"}
+
+    def __init__(
+        self, actions: list[dict], resolver: CachingActionResolver | None = None
+    ):
+        self.actions = actions
+        self.resolver = resolver or CachingActionResolver()
+
+    def evaluate(self) -> list[str]:
+        self.resolve()
+        return [evaluate_action(item, self.resolver) for item in self.actions]
+
+    def resolve(self):
+        """
+        Resolve everything the actions need, each distinct input once
+        """
+        supported_actions = self.resolver.get_supported_actions()
+        items = [
+            item
+            for item in self.actions
+            if isinstance(item, dict)
+            and item.get("action") in supported_actions
+            and item.get("action") in self.RECEIVER_KEYS
+            and isinstance(item.get("chain"), str)
+        ]
+
+        # Chains
+        networks = {}
+        for chain in dict.fromkeys(item["chain"] for item in items):
+            networks[chain] = self._try(self.resolver.resolve_chain, chain)
+
+        # Receivers, only for actions whose chain is supported
+        pending = []
+        for item in items:
+            network = networks[item["chain"]]
+            receiver = item.get(self.RECEIVER_KEYS[item["action"]])
+            token = item.get("token")
+            if (
+                network is None
+                or not isinstance(receiver, str)
+                or not isinstance(token, str)
+            ):
+                continue
+            resolved = self._try(
+                _resolve_receiver,
+                receiver,
+                item["action"],
+                token,
+                network.name,
+                self.resolver,
+            )
+            if resolved is not None:
+                pending.append((token, network.name))
+
+        # Tokens, only for actions whose receiver was resolved
+        for token, chain in dict.fromkeys(pending):
+            self._try(self.resolver.search_token, token, chain)
+
+    @staticmethod
+    def _try(resolve, *args):
+        # Errors are cached by the resolver and reported when the action is evaluated
+        try:
+            return resolve(*args)
+        except Exception:
+            return None
+
+
 class _ActionError:
     def __init__(self, error: str | None = None):
         self.type = self.__class__.__name__
@@ -0,0 +1,294 @@
+import os
+import time
+import numpy as np
+
+from .embedding_store import store_digest
+from .embeddings_utils import normalize_embeddings, top_k_indices
+
+DEFAULT_N_PROBE = 8
+KMEANS_ITERATIONS = 10
+# Vectors sampled per list to train the centroids
+TRAINING_SAMPLES_PER_LIST = 256
+
+
+class IVFIndex:
+    """
+    Inverted-file index for approximate cosine similarity search.
+    The normalized vectors are clustered with spherical k-means; a search only
+    scores the vectors of the n_probe lists whose centroids are closest to the
+    query. Raising n_probe trades latency for recall; probing every list gives
+    the exact result.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        list_rows: np.ndarray,
+        vectors: np.ndarray,
+        n_probe: int = DEFAULT_N_PROBE,
+    ):
+        self.centroids = centroids
+        # The rows of list i are list_rows[list_offsets[i] : list_offsets[i + 1]]
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        # The vectors in list order, so each list is a contiguous block
+        self.list_vectors = np.ascontiguousarray(vectors[list_rows])
+        self.n_probe = n_probe
+
+    def __len__(self) -> int:
+        return len(self.list_rows)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        n_lists: int | None = None,
+        n_probe: int = DEFAULT_N_PROBE,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """
+        Cluster normalized vectors into n_lists lists (about sqrt(n) by default)
+        """
+        n = len(vectors)
+        if n_lists is None:
+            n_lists = max(1, int(round(np.sqrt(n))))
+        n_lists = min(n_lists, n)
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(n, n_lists * TRAINING_SAMPLES_PER_LIST)
+        sample = vectors[np.sort(rng.choice(n, sample_size, replace=False))]
+        centroids = _spherical_kmeans(sample, n_lists, rng)
+
+        assignments = _nearest_centroids(vectors, centroids)
+        list_rows = np.argsort(assignments, kind="stable").astype(np.intp)
+        counts = np.bincount(assignments, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.intp)
+        return cls(centroids, list_offsets, list_rows, vectors, n_probe)
+
+    def search(
+        self,
+        query_embedding,
+        top_k: int = 5,
+        n_probe: int | None = None,
+        allowed: np.ndarray | None = None,
+    ) -> list[tuple[int, float]]:
+        """
+        Get the top_k most similar rows as (row index, score) pairs, best first.
+        allowed is a boolean mask of the rows which may be returned; lists are
+        probed beyond n_probe until top_k allowed rows are found.
+        """
+        query = normalize_embeddings(query_embedding)
+        n_probe = n_probe or self.n_probe
+        order = np.argsort(-(self.centroids @ query), kind="stable")
+
+        rows = []
+        scores = []
+        found = 0
+        for probed, i in enumerate(order):
+            if probed >= n_probe and found >= top_k:
+                break
+            start, end = self.list_offsets[i], self.list_offsets[i + 1]
+            list_rows = self.list_rows[start:end]
+            list_scores = self.list_vectors[start:end] @ query
+            if allowed is not None:
+                mask = allowed[list_rows]
+                list_rows = list_rows[mask]
+                list_scores = list_scores[mask]
+            rows.append(list_rows)
+            scores.append(list_scores)
+            found += len(list_rows)
+
+        if not rows:
+            return []
+        rows = np.concatenate(rows)
+        scores = np.concatenate(scores)
+        # Break ties by row like the exact search
+        order = np.argsort(rows, kind="stable")
+        rows, scores = rows[order], scores[order]
+        return [(int(rows[i]), float(scores[i])) for i in top_k_indices(scores, top_k)]
+
+    def save(self, path: str, digest: str | None = None):
+        """
+        Save the index, with the digest of the store it was built from
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        arrays = {}
+        if digest is not None:
+            arrays["digest"] = np.array(digest)
+        with open(path + ".tmp", "wb") as file:
+            np.savez(
+                file,
+                centroids=self.centroids,
+                list_offsets=self.list_offsets,
+                list_rows=self.list_rows,
+                n_probe=self.n_probe,
+                **arrays,
+            )
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(
+        cls, path: str, vectors: np.ndarray, digest: str | None = None
+    ) -> "IVFIndex":
+        """
+        Load an index saved by save; the vectors are the normalized vectors it
+        was built from. If a digest is given, the index must have been saved
+        with the same one.
+        """
+        with np.load(path) as data:
+            list_rows = data["list_rows"]
+            if len(list_rows) != len(vectors):
+                raise ValueError(
+                    f"Index has {len(list_rows)} rows, got {len(vectors)} vectors"
+                )
+            saved_digest = str(data["digest"]) if "digest" in data else None
+            if digest is not None and saved_digest != digest:
+                raise ValueError("Index was built from other contents of the store")
+            return cls(
+                data["centroids"],
+                data["list_offsets"],
+                list_rows,
+                vectors,
+                int(data["n_probe"]),
+            )
+
+
+def get_index_path(name: str, directory: str) -> str:
+    return os.path.join(directory, f"{name}.ivf.npz")
+
+
+def load_or_build_index(
+    path: str,
+    vectors: np.ndarray,
+    n_probe: int = DEFAULT_N_PROBE,
+    digest: str | None = None,
+) -> IVFIndex:
+    """
+    Load a saved index, or build one if it is missing or stale.
+    It is stale unless it was saved with the digest of the store (by default
+    the digest of the vectors).
+    """
+    if os.path.exists(path):
+        if digest is None:
+            digest = store_digest(vectors)
+        try:
+            return IVFIndex.load(path, vectors, digest)
+        except ValueError:
+            pass
+    return IVFIndex.build(vectors, n_probe=n_probe)
+
+
+def _spherical_kmeans(
+    vectors: np.ndarray, k: int, rng: np.random.Generator
+) -> np.ndarray:
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = _nearest_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=k)
+        # Lists which lost all their vectors restart from a random vector
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize_embeddings(sums)
+    return centroids
+
+
+def _nearest_centroids(
+    vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 4096
+) -> np.ndarray:
+    assignments = np.empty(len(vectors), dtype=np.intp)
+    for i in range(0, len(vectors), chunk_size):
+        scores = vectors[i : i + chunk_size] @ centroids.T
+        assignments[i : i + chunk_size] = np.argmax(scores, axis=1)
+    return assignments
+
+
+def benchmark(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    index: IVFIndex,
+    top_k: int = 5,
+    n_probes: tuple[int, ...] = (1, 2, 4, 8, 16, 32),
+) -> list[dict]:
+    """
+    Compare the recall@top_k and the latency of the index with the exact search
+    """
+    exact = []
+    start = time.perf_counter()
+    for query in queries:
+        exact.append({i for i in top_k_indices(vectors @ query, top_k)})
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    results = [{"n_probe": "exact", "recall": 1.0, "latency_ms": exact_ms}]
+    for n_probe in n_probes:
+        if n_probe > index.n_lists:
+            break
+        hits = 0
+        start = time.perf_counter()
+        for query, expected in zip(queries, exact):
+            found = index.search(query, top_k, n_probe=n_probe)
+            hits += len(expected.intersection(row for row, _ in found))
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        results.append(
+            {
+                "n_probe": n_probe,
+                "recall": hits / (top_k * len(queries)),
+                "latency_ms": latency_ms,
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    from .embedding_store import STORE_DIR, TOKEN_STORE, load_embedding_store
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the IVF index against the exact search."
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Use this many random clustered vectors instead of the token store.",
+    )
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-lists", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        centers = rng.normal(size=(max(1, args.synthetic // 50), args.dim))
+        labels = rng.integers(len(centers), size=args.synthetic)
+        vectors = centers[labels] + rng.normal(size=(args.synthetic, args.dim))
+        vectors = normalize_embeddings(vectors)
+    else:
+        store = load_embedding_store(TOKEN_STORE)
+        vectors = normalize_embeddings(store.matrix)
+    # Queries near catalog entries, like the searched token names are
+    picks = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    noise = 0.05 * rng.normal(size=(len(picks), vectors.shape[1]))
+    queries = normalize_embeddings(vectors[picks] + noise)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(vectors, n_lists=args.n_lists)
+    build_s = time.perf_counter() - start
+    print(f"{len(vectors)} vectors, {index.n_lists} lists, built in {build_s:.2f}s")
+    if not args.synthetic:
+        index.save(get_index_path(TOKEN_STORE, STORE_DIR), store.digest)
+
+    print(f"{'n_probe':>8} {'recall@5':>9} {'latency (ms)':>13}")
+    for result in benchmark(vectors, queries, index):
+        print(
+            f"{result['n_probe']:>8} {result['recall']:>9.3f} "
+            f"{result['latency_ms']:>13.3f}"
+        )
@@ -0,0 +1,166 @@
+import asyncio
+import json
+
+from web3_utils.ens_utils import is_address
+from .action_utils import (
+    BatchPlanner,
+    CachingActionResolver,
+    evaluate_action,
+    protocol_query,
+    suggested_address,
+)
+from .index_registry import get_protocol_searcher
+
+# Seconds allowed for each resolution stage
+DEFAULT_STAGE_TIMEOUTS = {"chain": 5.0, "receiver": 15.0, "token": 15.0}
+
+RECEIVER_KEYS = BatchPlanner.RECEIVER_KEYS
+
+
+class AsyncActionResolver(CachingActionResolver):
+    """
+    A CachingActionResolver whose cache is filled by async resolutions.
+    Concurrent requests for the same input share one resolution, and each stage
+    fails with a TimeoutError if it takes longer than its timeout.
+    """
+
+    def __init__(self, timeouts: dict[str, float] | None = None):
+        super().__init__()
+        self.timeouts = {**DEFAULT_STAGE_TIMEOUTS, **(timeouts or {})}
+        self._pending: dict[tuple, asyncio.Task] = {}
+
+    async def aresolve_chain(self, text: str):
+        return await self._acached(
+            ("chain", text), "chain", asyncio.to_thread, self._base.resolve_chain, text
+        )
+
+    async def aresolve_ens(self, name: str) -> str | None:
+        return await self._acached(
+            ("ens", name), "receiver", asyncio.to_thread, self._base.resolve_ens, name
+        )
+
+    async def aresolve_protocol(self, action: str, token: str, chain: str):
+        return await self._acached(
+            ("protocol", action, token, chain),
+            "receiver",
+            _aresolve_protocol,
+            action,
+            token,
+            chain,
+        )
+
+    async def asearch_token(self, token: str, chain: str) -> dict:
+        return await self._acached(
+            ("token", token, chain),
+            "token",
+            asyncio.to_thread,
+            self._base.search_token,
+            token,
+            chain,
+        )
+
+    async def aresolve_receiver(
+        self, raw_text: str, action: str, token: str, chain: str
+    ) -> str | None:
+        """
+        Async version of action_utils._resolve_receiver
+        """
+        text = raw_text.strip()
+        if text.endswith(".eth"):
+            return await self.aresolve_ens(text)
+        if is_address(text):
+            return text
+        return await self.aresolve_protocol(action, token, chain)
+
+    @property
+    def _base(self):
+        # The uncached resolver methods of the classes after CachingActionResolver
+        return super(CachingActionResolver, self)
+
+    async def _acached(self, key: tuple, stage: str, resolve, *args):
+        if key not in self._cache:
+            task = self._pending.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._resolve(key, stage, resolve, *args))
+                self._pending[key] = task
+            await asyncio.shield(task)
+        result, error = self._cache[key]
+        if error is not None:
+            raise error
+        return result
+
+    async def _resolve(self, key: tuple, stage: str, resolve, *args):
+        try:
+            result = await asyncio.wait_for(resolve(*args), self.timeouts[stage])
+            self._cache[key] = (result, None)
+        except asyncio.TimeoutError:
+            error = TimeoutError(f"Timed out resolving the {stage}")
+            self._cache[key] = (None, error)
+        except Exception as e:
+            self._cache[key] = (None, e)
+        finally:
+            self._pending.pop(key, None)
+
+
+async def _aresolve_protocol(action: str, token: str, chain: str) -> str | None:
+    searcher = await asyncio.to_thread(get_protocol_searcher)
+    result = await searcher.asearch_protocol(query=protocol_query(action, token, chain))
+    return suggested_address(result)
+
+
+async def aevaluate_response(
+    response: str,
+    resolver: AsyncActionResolver | None = None,
+    timeouts: dict[str, float] | None = None,
+) -> list[str]:
+    """
+    Async version of action_utils.evaluate_response
+    All actions are resolved concurrently and share the resolved chains,
+    receivers and tokens.
+    """
+    actions = json.loads(response)
+    resolver = resolver or AsyncActionResolver(timeouts)
+    return list(
+        await asyncio.gather(*(aevaluate_action(item, resolver) for item in actions))
+    )
+
+
+async def aevaluate_action(
+    action_item: dict,
+    resolver: AsyncActionResolver | None = None,
+    timeouts: dict[str, float] | None = None,
+) -> str:
+    """
+    Async version of action_utils.evaluate_action
+    The chain is resolved first, then the receiver and the token concurrently.
+    The response is then assembled by evaluate_action from the resolved values,
+    so it is the same as the one evaluate_action returns. It runs in a thread,
+    because it still reads the supported actions and builds the ERC20 calls.
+    """
+    resolver = resolver or AsyncActionResolver(timeouts)
+    await _aresolve_action(action_item, resolver)
+    return await asyncio.to_thread(evaluate_action, action_item, resolver)
+
+
+async def _aresolve_action(item: dict, resolver: AsyncActionResolver):
+    # Inputs which can't be resolved are left to evaluate_action to report
+    if not isinstance(item, dict) or item.get("action") not in RECEIVER_KEYS:
+        return
+    receiver = item.get(RECEIVER_KEYS[item["action"]])
+    chain = item.get("chain")
+    token = item.get("token")
+    if not all(isinstance(value, str) for value in (chain, receiver, token)):
+        return
+
+    try:
+        network = await resolver.aresolve_chain(chain)
+    except Exception:
+        return
+    if network is None:
+        return
+
+    await asyncio.gather(
+        resolver.aresolve_receiver(receiver, item["action"], token, network.name),
+        resolver.asearch_token(token, network.name),
+        return_exceptions=True,
+    )
@@ -0,0 +1,360 @@
+import itertools
+import json
+import os
+import platform
+import time
+from contextlib import contextmanager
+from typing import Callable
+import numpy as np
+
+from web3_utils.ens_utils import EnsResolver
+from web3_utils.erc20_utils import ERC20Utils
+from web3_utils.provider_pool import ProviderPool, set_provider_pool
+from .action_utils import (
+    ActionResolver,
+    evaluate_action,
+    protocol_query,
+    suggested_address,
+)
+from .embedding_cache import EmbeddingCache, set_default_cache
+from .evaluation_service import create_standin_searchers, standin_embedding
+from .protocol_searcher import ProtocolSearcher
+from .token_searcher import TokenSearcher
+
+BENCHMARK_DIR = "processed/benchmarks"
+RESULTS_PATH = os.path.join(BENCHMARK_DIR, "results.json")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+# Seconds each case runs for, after the warm-up calls
+DEFAULT_MIN_TIME = 1.0
+WARMUP_CALLS = 10
+# A case regresses when its ops/sec drops by more than this fraction
+DEFAULT_TOLERANCE = 0.25
+# Dimensions of text-embedding-3-large, which the token catalog is embedded with
+TOKEN_EMBEDDING_DIM = 3072
+
+NETWORK_NAMES = ["Ethereum", "matic", "Arb", " ETH  Mainnet ", "zksync", "Gnosis"]
+TOKEN_QUERIES = [
+    ("USDC", "ethereum"),
+    ("usdt", "polygon"),
+    ("ETH", "ethereum"),
+    ("WBTC", "arbitrum"),
+    ("Degen", "base"),
+    ("unknown", "base"),
+]
+PROTOCOL_QUERIES = [
+    "approve, DAI, polygon",
+    "transfer, USDC, polygon",
+    "yearn v3 weth",
+    "approve, USDT, polygon",
+]
+RECIPIENT = "0x1234567890123456789012345678901234567890"
+ENS_NAMES = {"vitalik.eth": "0xd8dA6BF26964aF9D7eEd9e03E53415D37aA96045"}
+# Mainnet tokens whose metadata the JSON-RPC stub serves: (address, name, symbol, decimals)
+ERC20_TOKENS = [
+    ("0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48", "USD Coin", "USDC", 6),
+    ("0x6b175474e89094c44da98b954eedeac495271d0f", "Dai Stablecoin", "DAI", 18),
+]
+ACTIONS = [
+    {
+        "action": "transfer",
+        "chain": "Ethereum",
+        "amount": "50",
+        "token": "USDC",
+        "receiver": RECIPIENT,
+    },
+    {
+        "action": "transfer",
+        "chain": "Base",
+        "amount": "0.1",
+        "token": "ETH",
+        "receiver": "vitalik.eth",
+    },
+    {
+        "action": "approve",
+        "chain": "Polygon",
+        "amount": "10",
+        "token": "DAI",
+        "spender": "yearn v3",
+    },
+]
+
+
+class StubResolver(ActionResolver):
+    """
+    An ActionResolver using the given searchers and ENS resolver instead of the
+    process-wide ones. Nothing is cached between actions, like evaluate_action
+    without a resolver.
+    """
+
+    def __init__(
+        self,
+        token_searcher: TokenSearcher,
+        protocol_searcher: ProtocolSearcher,
+        ens_resolver: EnsResolver,
+    ):
+        self.token_searcher = token_searcher
+        self.protocol_searcher = protocol_searcher
+        self.ens_resolver = ens_resolver
+
+    def resolve_ens(self, name: str) -> str | None:
+        return self.ens_resolver.resolve(name)
+
+    def resolve_protocol(self, action: str, token: str, chain: str) -> str | None:
+        query = protocol_query(action, token, chain)
+        return suggested_address(self.protocol_searcher.search_protocol(query))
+
+    def search_token(self, token: str, chain: str) -> dict:
+        return self.token_searcher.search_token(token, chain)
+
+
+def measure(
+    fn: Callable[[], object],
+    min_time: float = DEFAULT_MIN_TIME,
+    warmup: int = WARMUP_CALLS,
+) -> dict:
+    """
+    Call fn repeatedly for at least min_time seconds and get its throughput
+    and latency percentiles
+    """
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    start = time.perf_counter()
+    end = start + min_time
+    while True:
+        call_start = time.perf_counter()
+        fn()
+        now = time.perf_counter()
+        latencies.append(now - call_start)
+        if now >= end:
+            break
+    elapsed = now - start
+    latencies_us = np.array(latencies) * 1e6
+    p50, p95, p99 = np.percentile(latencies_us, [50, 95, 99])
+    return {
+        "iterations": len(latencies),
+        "ops_per_sec": len(latencies) / elapsed,
+        "mean_us": float(latencies_us.mean()),
+        "p50_us": float(p50),
+        "p95_us": float(p95),
+        "p99_us": float(p99),
+    }
+
+
+@contextmanager
+def stub_services(dim: int = TOKEN_EMBEDDING_DIM):
+    """
+    Start the local stand-ins of the OpenAI embeddings endpoint and of an
+    Ethereum node, and point the process-wide embedding cache and provider
+    pool at them. Query embeddings are not cached, so every search embeds its
+    query over HTTP.
+    """
+    from openai import OpenAI
+    from .embeddings_stub import EmbeddingsStub
+    from .json_rpc_stub import (
+        JsonRpcStub,
+        add_ens_names,
+        add_erc20_token,
+        add_multicall,
+    )
+
+    embeddings_stub = EmbeddingsStub(embed=lambda text: standin_embedding(text, dim))
+    embeddings_stub.start()
+    rpc_stub = JsonRpcStub().start()
+    add_ens_names(rpc_stub, ENS_NAMES)
+    add_multicall(rpc_stub)
+    for token in ERC20_TOKENS:
+        add_erc20_token(rpc_stub, *token)
+
+    client = OpenAI(base_url=embeddings_stub.url, api_key="benchmark", max_retries=0)
+
+    def embed(text: str, model: str) -> list[float]:
+        return client.embeddings.create(input=[text], model=model).data[0].embedding
+
+    def embed_many(texts: list[str], model: str) -> list[list[float]]:
+        data = client.embeddings.create(input=texts, model=model).data
+        return [d.embedding for d in sorted(data, key=lambda d: d.index)]
+
+    pool = ProviderPool(rpc_urls={1: rpc_stub.url})
+    set_default_cache(
+        EmbeddingCache(
+            path=None, max_memory_entries=0, embed=embed, embed_many=embed_many
+        )
+    )
+    set_provider_pool(pool)
+    try:
+        yield
+    finally:
+        set_default_cache(None)
+        set_provider_pool(None)
+        pool.close()
+        client.close()
+        embeddings_stub.stop()
+        rpc_stub.stop()
+
+
+def build_cases(dim: int = TOKEN_EMBEDDING_DIM) -> dict[str, Callable[[], object]]:
+    """
+    Set up the benchmarked hot paths; call it within stub_services. The
+    searchers search the token and protocol catalogs embedded in dim
+    dimensions, and each case cycles through its sample inputs.
+    """
+    token_searcher, protocol_searcher = create_standin_searchers(dim)
+    data_utils = token_searcher.data_utils
+    erc20_utils = ERC20Utils()
+    ens_resolver = EnsResolver(cache_path=None, ttl=0, negative_ttl=0)
+    resolver = StubResolver(token_searcher, protocol_searcher, ens_resolver)
+
+    names = itertools.cycle(NETWORK_NAMES)
+    tokens = itertools.cycle(TOKEN_QUERIES)
+    embedding_tokens = itertools.cycle(TOKEN_QUERIES)
+    protocols = itertools.cycle(PROTOCOL_QUERIES)
+    encodings = itertools.cycle(
+        [
+            (erc20_utils.encode_erc20_transfer, 10**6),
+            (erc20_utils.encode_erc20_approve, 5 * 10**18),
+        ]
+    )
+    actions = itertools.cycle(ACTIONS)
+    token_addresses = [token[0] for token in ERC20_TOKENS]
+
+    def encode_erc20():
+        encode, amount = next(encodings)
+        return encode(token_addresses[0], RECIPIENT, amount)
+
+    return {
+        "data_utils_lookup": lambda: data_utils.get_network_info_by_name(next(names)),
+        "token_offline_search": lambda: token_searcher._search_token_offline(
+            *next(tokens)
+        ),
+        "token_embedding_search": lambda: token_searcher._search_token_embeddings(
+            *next(embedding_tokens)
+        ),
+        "protocol_search": lambda: protocol_searcher.search_protocol(next(protocols)),
+        "erc20_encode": encode_erc20,
+        "erc20_token_info": lambda: erc20_utils.get_token_info_many(token_addresses),
+        "evaluate_action": lambda: evaluate_action(next(actions), resolver),
+    }
+
+
+def run_benchmarks(
+    names: list[str] | None = None, min_time: float = DEFAULT_MIN_TIME
+) -> dict:
+    """
+    Run the named cases (all by default) and get their results
+    """
+    with stub_services():
+        cases = build_cases()
+        unknown = set(names or ()) - set(cases)
+        if unknown:
+            raise ValueError(f"Unknown benchmarks: {sorted(unknown)}")
+        return {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "min_time": min_time,
+            "cases": {
+                name: measure(fn, min_time)
+                for name, fn in cases.items()
+                if names is None or name in names
+            },
+        }
+
+
+def compare(
+    results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE
+) -> list[dict]:
+    """
+    Compare the ops/sec of the cases found in both results. A case regresses
+    when it is more than tolerance slower than the baseline.
+    """
+    comparisons = []
+    for name, stats in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            continue
+        change = stats["ops_per_sec"] / base["ops_per_sec"] - 1
+        comparisons.append(
+            {
+                "name": name,
+                "ops_per_sec": stats["ops_per_sec"],
+                "baseline_ops_per_sec": base["ops_per_sec"],
+                "change": change,
+                "regression": change < -tolerance,
+            }
+        )
+    return comparisons
+
+
+def save_results(results: dict, path: str = RESULTS_PATH) -> str:
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(results, file, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_results(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the evaluation hot paths against local stubs of "
+        "the OpenAI and RPC endpoints and compare them with a saved baseline."
+    )
+    parser.add_argument(
+        "--only", action="append", help="Run this case only (repeatable)"
+    )
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Save the results as the new baseline instead of comparing",
+    )
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args.min_time)
+    save_results(results, args.output)
+
+    print(f"{'case':<22} {'ops/s':>10} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10}")
+    for name, stats in results["cases"].items():
+        print(
+            f"{name:<22} {stats['ops_per_sec']:>10.1f} {stats['p50_us']:>10.1f} "
+            f"{stats['p95_us']:>10.1f} {stats['p99_us']:>10.1f}"
+        )
+    print(f"Results saved to {args.output}")
+
+    if args.save_baseline:
+        save_results(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    baseline = load_results(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; save one with --save-baseline")
+        sys.exit(0)
+    regressions = []
+    for comparison in compare(results, baseline, args.tolerance):
+        flag = "REGRESSION" if comparison["regression"] else "ok"
+        print(f"{comparison['name']:<22} {comparison['change']:>+8.1%}  {flag}")
+        if comparison["regression"]:
+            regressions.append(comparison["name"])
+    if regressions:
+        print(
+            f"{len(regressions)} benchmark(s) more than {args.tolerance:.0%} "
+            f"slower than the baseline: {', '.join(regressions)}"
+        )
+        sys.exit(1)
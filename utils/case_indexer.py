@@ -0,0 +1,195 @@
+import hashlib
+import os
+import re
+from typing import Callable, List
+
+from .embedding_batches import embed_texts, get_token_counter
+from .embedding_store import (
+    STORE_DIR,
+    build_embeddings,
+    load_previous_store,
+    save_embedding_store,
+)
+
+CASE_DIR = "case"
+CASE_STORE = "case"
+EMBEDDING_MODEL = "text-embedding-ada-002"
+CASE_FILES = ("index.ts", "index.details.ts")
+# Tokens per chunk, well below the model's input limit
+MAX_CHUNK_TOKENS = 1000
+# <chain>_<name> directories; shared ones like ___prebuilt-tx are skipped
+CASE_PATTERN = re.compile(r"[a-zA-Z0-9]+_[a-zA-Z0-9\-]+$")
+
+
+def scan_cases(case_dir: str = CASE_DIR) -> list[dict]:
+    """
+    Read the index.ts and index.details.ts files of every case directory
+    """
+    cases = []
+    for name in sorted(os.listdir(case_dir)):
+        path = os.path.join(case_dir, name)
+        if not os.path.isdir(path) or not CASE_PATTERN.match(name):
+            continue
+        network, case = name.split("_")
+        contents = []
+        for file_name in CASE_FILES:
+            file_path = os.path.join(path, file_name)
+            if os.path.exists(file_path):
+                with open(file_path, "r") as file:
+                    contents.append(file.read().strip())
+        cases.append(
+            {
+                "name": name,
+                "case": case.replace("-", "_"),
+                "network": network,
+                "content": "\n".join(contents),
+            }
+        )
+    return cases
+
+
+def chunk_text(
+    text: str, count_tokens: Callable[[str], int], max_tokens: int = MAX_CHUNK_TOKENS
+) -> list[str]:
+    """
+    Split a text into chunks of whole lines of at most max_tokens tokens.
+    A line longer than that is split in halves until it fits.
+    """
+    chunks = []
+    lines: list[str] = []
+    tokens = 0
+    for line in _split_lines(text, count_tokens, max_tokens):
+        line_tokens = count_tokens(line)
+        if lines and tokens + line_tokens > max_tokens:
+            chunks.append("\n".join(lines))
+            lines = []
+            tokens = 0
+        lines.append(line)
+        # The newline joining the lines counts as a token at most
+        tokens += line_tokens + 1
+    if lines:
+        chunks.append("\n".join(lines))
+    return chunks
+
+
+def _split_lines(text: str, count_tokens: Callable[[str], int], max_tokens: int):
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        pending = [line]
+        while pending:
+            part = pending.pop()
+            if len(part) > 1 and count_tokens(part) > max_tokens:
+                middle = len(part) // 2
+                pending += [part[middle:], part[:middle]]
+            else:
+                yield part
+
+
+def source_hash(name: str, content: str, max_tokens: int) -> str:
+    """
+    Hash of a case's directory name, its files and the chunk size they are
+    split with
+    """
+    key = f"{max_tokens}\0{name}\0{content}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def index_cases(
+    case_dir: str = CASE_DIR,
+    model: str = EMBEDDING_MODEL,
+    directory: str = STORE_DIR,
+    max_tokens: int = MAX_CHUNK_TOKENS,
+    count_tokens: Callable[[str], int] | None = None,
+    embed: Callable[[List[str]], List[List[float]]] | None = None,
+) -> dict[str, int]:
+    """
+    Index the case files into the case embedding store.
+    Cases whose files are unchanged keep their chunks from the previous store
+    without being split again, and only new or changed chunks are embedded.
+
+    Returns:
+    dict: The number of cases, of cases split into chunks, of chunks, and of
+    reused and recomputed embeddings.
+    """
+    previous = load_previous_store(CASE_STORE, model, directory)
+    previous_chunks: dict[str, list[str]] = {}
+    if previous is not None:
+        for record in previous.records:
+            previous_chunks.setdefault(record["source_hash"], []).append(record["text"])
+
+    cases = scan_cases(case_dir)
+    records = []
+    chunked = 0
+    for case in cases:
+        digest = source_hash(case["name"], case["content"], max_tokens)
+        chunks = previous_chunks.get(digest)
+        if chunks is None:
+            count_tokens = count_tokens or get_token_counter(model)
+            # Every chunk starts with the case and the network, like the
+            # texts of the protocols_qa notebook
+            header = f"{case['case']}. {case['network']}. "
+            chunks = [
+                header + chunk
+                for chunk in chunk_text(case["content"], count_tokens, max_tokens)
+            ]
+            chunked += 1
+        for i, text in enumerate(chunks):
+            records.append(
+                {
+                    "id": f"{case['name']}#{i}",
+                    "case": case["case"],
+                    "network": case["network"],
+                    "chunk": i,
+                    "source_hash": digest,
+                    "text": text,
+                }
+            )
+
+    texts = [record["text"] for record in records]
+    embeddings, hashes, stats = build_embeddings(
+        texts,
+        model,
+        embed or (lambda batch: embed_texts(batch, model=model)),
+        previous=previous,
+    )
+    summary = {
+        "cases": len(cases),
+        "chunked": chunked,
+        "chunks": len(records),
+        **stats,
+    }
+    if previous is not None and previous.hashes == hashes:
+        return summary
+
+    partitions: dict[str, list[int]] = {}
+    for i, record in enumerate(records):
+        partitions.setdefault(record["network"], []).append(i)
+    save_embedding_store(
+        CASE_STORE,
+        embeddings,
+        records,
+        model=model,
+        directory=directory,
+        partitions=partitions,
+        hashes=hashes,
+    )
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Embed the new or changed case files into the case store."
+    )
+    parser.add_argument("--case-dir", default=CASE_DIR)
+    parser.add_argument("--max-tokens", type=int, default=MAX_CHUNK_TOKENS)
+    args = parser.parse_args()
+
+    summary = index_cases(args.case_dir, max_tokens=args.max_tokens)
+    print(
+        f"{summary['cases']} cases in {summary['chunks']} chunks, "
+        f"{summary['chunked']} cases split again, "
+        f"{summary['reused']} embeddings reused, {summary['recomputed']} recomputed."
+    )
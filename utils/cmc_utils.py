@@ -1,28 +1,46 @@
 import csv
 import os
-from .data_utils import DataUtils
+from .data_utils import get_network_registry
 from itertools import islice
 import os
 import pandas as pd
-import numpy as np
 import requests
 import json
 from tqdm import tqdm
-from .embeddings_utils import get_embeddings
+from .ann_index import IVFIndex, get_index_path
+from .embedding_batches import embed_texts
+from .embeddings_utils import normalize_embeddings
+from .embedding_store import (
+    STORE_DIR,
+    TOKEN_STORE,
+    build_chain_partitions,
+    build_embeddings,
+    dataframe_to_records,
+    load_previous_store,
+    parse_network_to_contract,
+    save_embedding_store,
+    store_digest,
+)
 from web3 import Web3
-
+from web3_utils.multicall import ContractCall, Multicall
+from web3_utils.provider_pool import get_web3
 
 CMC_BASE_URL = "https://pro-api.coinmarketcap.com/v1"
+TOKEN_MAP_PATH = "data/cmc/map.csv"
+REFRESH_CHECKPOINT_PATH = "data/cmc/refresh_checkpoint.json"
 EMBEDDING_MODEL = "text-embedding-3-large"
-api_key = os.environ["CMC_API_KEY"]
-headers = {"Accepts": "application/json", "X-CMC_PRO_API_KEY": api_key}
+
+
+def _get_headers() -> dict[str, str]:
+    # The API key is read when CoinMarketCap is called, not at import
+    return {
+        "Accepts": "application/json",
+        "X-CMC_PRO_API_KEY": os.environ["CMC_API_KEY"],
+    }
 
 
 def _get_supported_chains():
-    network_path = "data/network.json"
-    with open(network_path, "r") as file:
-        data = json.load(file)
-        return {item["name"] for item in data}
+    return {network.name for network in get_network_registry().networks}
 
 
 def fetch_cmc_map(supported_chains: set[str], top_n: int = 5000) -> list[int]:
@@ -35,81 +53,133 @@ def fetch_cmc_map(supported_chains: set[str], top_n: int = 5000) -> list[int]:
     Returns:
     set: A set of token ids.
     """
-    if top_n > 5000:
-        raise ValueError("Maximum top_n is 5000.")  # For demo purposes
-    # Fetch the token map
-    url = f"{CMC_BASE_URL}/cryptocurrency/map"
-    parameters = {"aux": "platform", "sort": "cmc_rank", "limit": top_n}
-    print(f"Fetching token map...", end="", flush=True)
-    response = requests.get(url, headers=headers, params=parameters)
-    response.raise_for_status()
-    data = response.json()["data"]
-    print(f"{len(data)} tokens.")
-    ids = set()  # token which are already saved
+    data = _fetch_cmc_map_data(top_n)
 
     # Save the token map to a CSV file
-    output_path = "data/cmc/map.csv"
+    output_path = TOKEN_MAP_PATH
     directory = os.path.dirname(output_path)
     if not os.path.exists(directory):
         os.makedirs(directory)
 
+    # Keep the first entry of each supported token
+    tokens = _select_supported_tokens(data, supported_chains)
+    ids = {item["id"] for item in tokens}
+
+    # Fetch the decimals of all tokens with a few multicalls per chain
+    decimals = _get_token_decimals_many(
+        [
+            (
+                item["platform"]["token_address"].strip(),
+                item["platform"]["name"].lower().strip(),
+            )
+            for item in tokens
+        ]
+    )
+
     with open(output_path, mode="w", newline="") as file:
         writer = csv.DictWriter(file, fieldnames=["id", "name", "symbol", "decimals"])
         writer.writeheader()
 
-        for item in tqdm(data, desc="Processing tokens"):
-            if (
-                item["platform"]
-                and item["platform"]["name"].lower() in supported_chains
-            ):
-                chain = item["platform"]["name"].lower().strip()
-                token_addr = item["platform"]["token_address"].strip()
-                decimals = _get_token_decimals(token_addr, chain)
-                if item["id"] in ids:
-                    continue
-                ids.add(item["id"])
-                writer.writerow(
-                    {
-                        "id": item["id"],
-                        "name": item["name"].strip(),
-                        "symbol": item["symbol"].strip(),
-                        "decimals": decimals,
-                    }
-                )
+        for item, token_decimals in zip(tokens, decimals):
+            writer.writerow(
+                {
+                    "id": item["id"],
+                    "name": item["name"].strip(),
+                    "symbol": item["symbol"].strip(),
+                    "decimals": token_decimals,
+                }
+            )
 
     print(f"{len(ids)} tokens saved.")
     return list(ids)
 
 
-def _get_token_decimals(contract_addr: str, chain_name: str):
-    # Get supported network info
-    data_utils = DataUtils()
-    network = data_utils.get_network_info_by_name(chain_name)
+def _fetch_cmc_map_data(top_n: int) -> list[dict]:
+    if top_n > 5000:
+        raise ValueError("Maximum top_n is 5000.")  # For demo purposes
+    # Fetch the token map
+    url = f"{CMC_BASE_URL}/cryptocurrency/map"
+    parameters = {"aux": "platform", "sort": "cmc_rank", "limit": top_n}
+    print(f"Fetching token map...", end="", flush=True)
+    response = requests.get(url, headers=_get_headers(), params=parameters)
+    response.raise_for_status()
+    data = response.json()["data"]
+    print(f"{len(data)} tokens.")
+    return data
+
 
-    if network is None:
-        raise ValueError(f"Unsupported chain name: {chain_name}")
+def _select_supported_tokens(data: list[dict], supported_chains: set[str]):
+    """
+    Get the first map entry of each token on a supported chain, in CMC rank order
+    """
+    ids = set()  # token which are already saved
+    tokens = []
+    for item in data:
+        if item["platform"] and item["platform"]["name"].lower() in supported_chains:
+            if item["id"] in ids:
+                continue
+            ids.add(item["id"])
+            tokens.append(item)
+    return tokens
 
-    # ERC20 ABI
-    file_path = f"data/abi/erc20.json"
-    with open(file_path, "r") as file:
-        abi = file.read()
 
-    api_key = os.getenv("INFURA_API_KEY")
-    provider = Web3.HTTPProvider(network.rpc_url.format(infura_api_key=api_key))
-    w3 = Web3(provider)
-    contract_address = w3.to_checksum_address(contract_addr)
-    contract = w3.eth.contract(address=contract_address, abi=abi)
-    try:
-        return int(contract.functions.decimals().call())
-    except Exception as e:
-        # Some tokens do not have a decimals function
-        return 0
+def _get_token_decimals_many(tokens: list[tuple[str, str]]) -> list[int]:
+    """
+    Get the decimals of (contract address, chain name) pairs, 0 for tokens
+    without a decimals function
+    """
+    by_chain: dict[str, list[int]] = {}
+    for i, (_, chain_name) in enumerate(tokens):
+        by_chain.setdefault(chain_name, []).append(i)
+
+    decimals = [0] * len(tokens)
+    for chain_name, rows in tqdm(by_chain.items(), desc="Fetching decimals"):
+        # Get supported network info
+        network = get_network_registry().get_by_name(chain_name)
+        if network is None:
+            raise ValueError(f"Unsupported chain name: {chain_name}")
+
+        rows = [i for i in rows if Web3.is_address(tokens[i][0])]
+        calls = [
+            ContractCall(tokens[i][0], "decimals()", output_types=["uint8"])
+            for i in rows
+        ]
+        multicall = Multicall(get_web3(network.id), chain_id=network.id)
+        for i, result in zip(rows, multicall.aggregate(calls)):
+            # Some tokens do not have a decimals function
+            decimals[i] = int(result) if result is not None else 0
+    return decimals
 
 
 def fetch_cmc_tokens(supported_chains: set[str], chunk_size: int = 100):
     """
     Fetch token info from CoinMarketCap and save it to the token map.
     """
+    # Load the token map
+    token_map_path = TOKEN_MAP_PATH
+    tokens = read_token_map(token_map_path)
+    ids = tokens["id"].tolist()
+
+    token_info = []
+    for chunk_info in _fetch_token_info(ids, supported_chains, chunk_size):
+        token_info.extend(chunk_info)
+
+    # Update the map.csv with network_to_contract and description
+    id_to_contract = {info["id"]: info["network_to_contract"] for info in token_info}
+    id_to_description = {info["id"]: info["description"] for info in token_info}
+
+    tokens["network_to_contract"] = tokens["id"].map(id_to_contract)
+    tokens["description"] = tokens["id"].map(id_to_description)
+    tokens.to_csv(token_map_path, index=False)
+
+    print(f"{len(token_info)} tokens saved.")
+
+
+def _fetch_token_info(ids: list[int], supported_chains: set[str], chunk_size: int):
+    """
+    Fetch the description and the supported contracts of tokens from CoinMarketCap.
+    Yields the token info of each chunk of ids.
+    """
 
     def chunked_iterable(iterable, size):
         it = iter(iterable)
@@ -119,22 +189,17 @@ def fetch_cmc_tokens(supported_chains: set[str], chunk_size: int = 100):
                 break
             yield chunk
 
-    # Load the token map
-    token_map_path = "data/cmc/map.csv"
-    tokens = pd.read_csv(token_map_path)
-    ids = tokens["id"].tolist()
-
     url = f"{CMC_BASE_URL}/cryptocurrency/info"
-    token_info = []
     chunks = list(chunked_iterable(ids, chunk_size))
 
     for chunk in tqdm(chunks, desc="Fetching token info"):
         parameters = {"id": ",".join(map(str, chunk))}
-        response = requests.get(url, headers=headers, params=parameters)
+        response = requests.get(url, headers=_get_headers(), params=parameters)
         response.raise_for_status()
 
         # Parse the response
         data = response.json()["data"]
+        token_info = []
         for id in chunk:
             crypto = data[str(id)]
             description = crypto["description"]
@@ -150,56 +215,236 @@ def fetch_cmc_tokens(supported_chains: set[str], chunk_size: int = 100):
                     "network_to_contract": network_to_contract,
                 }
             )
+        yield token_info
 
-    # Update the map.csv with network_to_contract and description
-    id_to_contract = {info["id"]: info["network_to_contract"] for info in token_info}
-    id_to_description = {info["id"]: info["description"] for info in token_info}
 
-    tokens["network_to_contract"] = tokens["id"].map(id_to_contract)
-    tokens["description"] = tokens["id"].map(id_to_description)
-    tokens.to_csv(token_map_path, index=False)
+def read_token_map(token_map_path: str = TOKEN_MAP_PATH) -> pd.DataFrame:
+    """
+    Read the token map. Only empty cells are missing values, so symbols and
+    names such as "NAN" or "NULL" are kept as they are.
+    """
+    return pd.read_csv(token_map_path, keep_default_na=False, na_values=[""])
 
-    print(f"{len(token_info)} tokens saved.")
+
+def diff_token_map(
+    tokens: list[dict], catalog: pd.DataFrame
+) -> tuple[list[int], list[int], list[int]]:
+    """
+    Compare supported CMC map entries with the stored token catalog.
+    A token has changed if its name, symbol or platform contract differs from the
+    catalog, or if its info was never fetched.
+    Returns the (added, changed, removed) ids.
+    """
+    rows = {int(row["id"]): row for row in catalog.to_dict(orient="records")}
+    added = []
+    changed = []
+    for item in tokens:
+        row = rows.get(item["id"])
+        if row is None:
+            added.append(item["id"])
+            continue
+        chain = item["platform"]["name"].lower().strip()
+        contracts = parse_network_to_contract(row.get("network_to_contract"))
+        contract = contracts.get(chain) or ""
+        if (
+            row["name"] != item["name"].strip()
+            or row["symbol"] != item["symbol"].strip()
+            or contract.lower() != item["platform"]["token_address"].strip().lower()
+            or not isinstance(row.get("description"), str)
+        ):
+            changed.append(item["id"])
+
+    ids = {item["id"] for item in tokens}
+    removed = [id for id in rows if id not in ids]
+    return added, changed, removed
+
+
+def refresh_cmc_tokens(
+    supported_chains: set[str],
+    top_n: int = 5000,
+    chunk_size: int = 100,
+    token_map_path: str = TOKEN_MAP_PATH,
+    checkpoint_path: str = REFRESH_CHECKPOINT_PATH,
+) -> dict[str, int]:
+    """
+    Refresh the token map incrementally: only new and changed tokens get their
+    decimals and info fetched, unchanged tokens keep their stored rows.
+    Progress is checkpointed, so an interrupted refresh resumes without fetching
+    again what it already has.
+
+    Returns:
+    dict: The number of added, changed, removed and unchanged tokens.
+    """
+    # A checkpoint is only resumed by a refresh with the same arguments
+    params = {
+        "top_n": top_n,
+        "supported_chains": sorted(supported_chains),
+        "token_map_path": os.path.normpath(token_map_path),
+    }
+    checkpoint = _load_checkpoint(checkpoint_path)
+    if checkpoint is not None and checkpoint.get("params") != params:
+        print("Discarding the checkpoint of a refresh with other arguments.")
+        checkpoint = None
+    if checkpoint is None:
+        tokens = _select_supported_tokens(_fetch_cmc_map_data(top_n), supported_chains)
+        if os.path.exists(token_map_path):
+            catalog = read_token_map(token_map_path)
+        else:
+            catalog = pd.DataFrame(columns=["id", "name", "symbol"])
+        added, changed, removed = diff_token_map(tokens, catalog)
+        checkpoint = {
+            "params": params,
+            "tokens": tokens,
+            "added": added,
+            "changed": changed,
+            "removed": removed,
+            "decimals": None,
+            "info": {},
+        }
+        _save_checkpoint(checkpoint_path, checkpoint)
+    else:
+        print("Resuming the interrupted refresh.")
+
+    tokens = {item["id"]: item for item in checkpoint["tokens"]}
+    # New and changed tokens, in CMC rank order
+    fetch = set(checkpoint["added"] + checkpoint["changed"])
+    pending = [id for id in tokens if id in fetch]
+
+    if checkpoint["decimals"] is None:
+        decimals = _get_token_decimals_many(
+            [
+                (
+                    tokens[id]["platform"]["token_address"].strip(),
+                    tokens[id]["platform"]["name"].lower().strip(),
+                )
+                for id in pending
+            ]
+        )
+        checkpoint["decimals"] = {str(id): d for id, d in zip(pending, decimals)}
+        _save_checkpoint(checkpoint_path, checkpoint)
+
+    missing = [id for id in pending if str(id) not in checkpoint["info"]]
+    for chunk_info in _fetch_token_info(missing, supported_chains, chunk_size):
+        for info in chunk_info:
+            checkpoint["info"][str(info["id"])] = info
+        _save_checkpoint(checkpoint_path, checkpoint)
+
+    # Merge the fetched tokens with the unchanged rows, in CMC rank order
+    catalog = {}
+    if os.path.exists(token_map_path):
+        for row in read_token_map(token_map_path).to_dict(orient="records"):
+            catalog[int(row["id"])] = row
+    rows = []
+    for id, item in tokens.items():
+        if str(id) in checkpoint["info"]:
+            info = checkpoint["info"][str(id)]
+            decimals = checkpoint["decimals"][str(id)]
+            network_to_contract = info["network_to_contract"]
+            description = info["description"]
+        else:
+            row = catalog[id]
+            decimals = row["decimals"]
+            network_to_contract = parse_network_to_contract(row["network_to_contract"])
+            description = row["description"]
+        rows.append(
+            {
+                "id": id,
+                "name": item["name"].strip(),
+                "symbol": item["symbol"].strip(),
+                "decimals": decimals,
+                "network_to_contract": network_to_contract,
+                "description": description,
+            }
+        )
+
+    directory = os.path.dirname(token_map_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    pd.DataFrame(rows).to_csv(token_map_path + ".tmp", index=False)
+    os.replace(token_map_path + ".tmp", token_map_path)
+    os.remove(checkpoint_path)
+
+    summary = {
+        "added": len(checkpoint["added"]),
+        "changed": len(checkpoint["changed"]),
+        "removed": len(checkpoint["removed"]),
+        "unchanged": len(rows) - len(pending),
+    }
+    print(f"{len(rows)} tokens saved: {summary}")
+    return summary
+
+
+def _load_checkpoint(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def _save_checkpoint(path: str, checkpoint: dict):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path + ".tmp", "w") as file:
+        json.dump(checkpoint, file)
+    os.replace(path + ".tmp", path)
 
 
 def get_token_embeddings():
     """
     Get embeddings for ERC20 tokens.
     """
-    tokens = pd.read_csv("data/cmc/map.csv")
+    tokens = read_token_map(TOKEN_MAP_PATH)
     descriptions = tokens["description"].tolist()
 
-    # Split descriptions into batches for better performance
-    batch_size = 100
-    description_batches = np.array_split(
-        descriptions, len(descriptions) // batch_size + 1
+    # Only new or changed descriptions are embedded, with concurrent requests
+    embeddings, hashes, stats = build_embeddings(
+        descriptions,
+        EMBEDDING_MODEL,
+        lambda text_list: embed_texts(text_list, model=EMBEDDING_MODEL),
+        previous=load_previous_store(TOKEN_STORE, EMBEDDING_MODEL),
     )
+    print(f"{stats['reused']} embeddings reused, {stats['recomputed']} recomputed.")
 
-    tqdm.pandas(desc="Processing embeddings")
-
-    embeddings = []
-    for batch in tqdm(description_batches, desc="Processing embeddings"):
-        text_list = batch.tolist()  # Convert NumPy array to list
-        batch_embeddings = get_embeddings(list_of_text=text_list, model=EMBEDDING_MODEL)
-        embeddings.extend(batch_embeddings)
+    tokens["network_to_contract"] = tokens["network_to_contract"].apply(
+        parse_network_to_contract
+    )
+    records = dataframe_to_records(tokens)
+    output_path = save_embedding_store(
+        TOKEN_STORE,
+        embeddings,
+        records,
+        model=EMBEDDING_MODEL,
+        partitions=build_chain_partitions(records),
+        hashes=hashes,
+    )
+    print(f"Embeddings saved to {output_path}.")
 
-    tokens["embedding"] = pd.Series(embeddings)
+    # Build the approximate search index of the new embeddings
+    IVFIndex.build(normalize_embeddings(embeddings)).save(
+        get_index_path(TOKEN_STORE, STORE_DIR), store_digest(embeddings, hashes)
+    )
 
-    output_path = "processed/embeddings/erc20_tokens.csv"
-    directory = os.path.dirname(output_path)
-    if not os.path.exists(directory):
-        os.makedirs(directory)
 
-    tokens.to_csv(output_path, index=False)
-    print(f"Embeddings saved to {output_path}.")
+if __name__ == "__main__":
+    import argparse
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only fetch the tokens which are new or changed since the last update.",
+    )
+    args = parser.parse_args()
 
-if __name__ == "__main__":
     # Get supported chains
     chain_names = _get_supported_chains()
-    # Fetch CMC crypto map
-    ids = fetch_cmc_map(chain_names, top_n=1000)
-    # Fetch tokens by ids
-    fetch_cmc_tokens(chain_names)
+    if args.incremental:
+        refresh_cmc_tokens(chain_names, top_n=1000)
+    else:
+        # Fetch CMC crypto map
+        ids = fetch_cmc_map(chain_names, top_n=1000)
+        # Fetch tokens by ids
+        fetch_cmc_tokens(chain_names)
     # Get embeddings
     get_token_embeddings()
@@ -0,0 +1,383 @@
+import os
+import time
+import numpy as np
+
+from .embedding_store import store_digest
+from .embeddings_utils import EmbeddingSearchEngine, normalize_embeddings, top_k_indices
+
+COMPACT_DTYPES = ("float32", "float16", "int8")
+# Candidates re-ranked with the full-precision vectors, per requested result
+DEFAULT_RERANK_FACTOR = 4
+MIN_RERANK_CANDIDATES = 32
+# Rows converted back to float32 at a time when scoring
+SCORE_CHUNK_SIZE = 1024
+
+
+class CompactVectors:
+    """
+    Normalized embeddings stored in a compact form for first-pass scoring.
+    dims keeps only the leading dimensions (text-embedding-3 vectors can be
+    shortened this way) before the rows are normalized again. float16 halves
+    the float32 size; int8 quarters it, with one float32 scale per row.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray | None = None):
+        self.codes = codes
+        self.scales = scales
+        # Digest of the store the vectors were saved for, when loaded
+        self.digest: str | None = None
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    @property
+    def dtype(self) -> str:
+        return self.codes.dtype.name
+
+    @property
+    def dims(self) -> int:
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    @classmethod
+    def encode(
+        cls,
+        embeddings,
+        dtype: str = "int8",
+        dims: int | None = None,
+        chunk_size: int = SCORE_CHUNK_SIZE,
+    ) -> "CompactVectors":
+        """
+        Encode embeddings (e.g. a memory-mapped store matrix) chunk by chunk
+        """
+        if dtype not in COMPACT_DTYPES:
+            raise ValueError(f"Unsupported compact dtype: {dtype}")
+        n, dim = len(embeddings), np.shape(embeddings)[1]
+        dims = dim if dims is None else min(dims, dim)
+        codes = np.empty((n, dims), dtype=dtype)
+        scales = np.empty(n, dtype=np.float32) if dtype == "int8" else None
+        for start in range(0, n, chunk_size):
+            end = start + chunk_size
+            vectors = normalize_embeddings(np.asarray(embeddings[start:end])[:, :dims])
+            if scales is None:
+                codes[start:end] = vectors
+                continue
+            # Symmetric per-row scaling of the largest component to 127
+            row_scales = np.abs(vectors).max(axis=1) / 127
+            row_scales[row_scales == 0] = 1.0
+            codes[start:end] = np.rint(vectors / row_scales[:, None])
+            scales[start:end] = row_scales
+        return cls(codes, scales)
+
+    def take(self, rows) -> "CompactVectors":
+        """
+        Get a contiguous copy of a subset of the rows
+        """
+        return CompactVectors(
+            np.ascontiguousarray(self.codes[rows]),
+            None if self.scales is None else self.scales[rows],
+        )
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """
+        Approximate cosine similarity of a normalized full-dimension query, or
+        of a matrix of queries (one column of scores per query)
+        """
+        query = normalize_embeddings(query[..., : self.dims]).T
+        if self.codes.dtype == np.float32:
+            return self.codes @ query
+        scores = np.empty((len(self),) + query.shape[1:], dtype=np.float32)
+        # numpy has no fast float16 or int8 products, so the rows are scored
+        # as float32 a chunk at a time
+        for start in range(0, len(self), SCORE_CHUNK_SIZE):
+            end = start + SCORE_CHUNK_SIZE
+            scores[start:end] = self.codes[start:end].astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales.reshape((-1,) + (1,) * (scores.ndim - 1))
+        return scores
+
+    def save(self, path: str, digest: str | None = None):
+        """
+        Save the vectors, with the digest of the store they were encoded from
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        arrays = {"codes": self.codes}
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        if digest is not None:
+            arrays["digest"] = np.array(digest)
+        with open(path + ".tmp", "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "CompactVectors":
+        with np.load(path) as data:
+            compact = cls(data["codes"], data["scales"] if "scales" in data else None)
+            if "digest" in data:
+                compact.digest = str(data["digest"])
+        return compact
+
+
+class CompactSearchEngine:
+    """
+    Cosine similarity search which scores every row with compact vectors, then
+    re-ranks the best candidates exactly with the full-precision embeddings.
+    Only the candidate rows of the full embeddings are read per query, so they
+    can stay memory-mapped on disk. Same interface as EmbeddingSearchEngine;
+    the returned scores are the exact ones.
+    """
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        compact: CompactVectors,
+        rerank_factor: int = DEFAULT_RERANK_FACTOR,
+    ):
+        if len(compact) != len(embeddings):
+            raise ValueError(
+                f"Compact vectors have {len(compact)} rows, got {len(embeddings)} embeddings"
+            )
+        self.embeddings = embeddings
+        self.compact = compact
+        self.rerank_factor = rerank_factor
+        self.partitions: dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.compact)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory held for scoring, not counting the memory-mapped embeddings
+        """
+        return self.compact.nbytes + sum(
+            rows.nbytes for rows in self.partitions.values()
+        )
+
+    def add_partition(self, name: str, rows):
+        rows = np.asarray(rows, dtype=np.intp)
+        self.partitions[name] = rows
+
+    def search(
+        self,
+        query_embedding,
+        top_k: int = 5,
+        rows: np.ndarray | None = None,
+        partition: str | None = None,
+    ) -> list[tuple[int, float]]:
+        """
+        Get the top_k most similar rows as (row index, score) pairs, best first.
+        The search can be restricted to the given rows or to a named partition.
+        """
+        query = normalize_embeddings(query_embedding)
+        rows, compact = self._get_rows(rows, partition)
+        return self._rerank(query, compact.scores(query), rows, top_k)
+
+    def search_many(
+        self,
+        query_embeddings,
+        top_k: int = 5,
+        rows: np.ndarray | None = None,
+        partition: str | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        """
+        Batch version of search: the first pass scores all the queries with a
+        single matrix-matrix product
+        """
+        if len(query_embeddings) == 0:
+            return []
+        queries = normalize_embeddings(query_embeddings)
+        rows, compact = self._get_rows(rows, partition)
+        scores = compact.scores(queries)
+        return [
+            self._rerank(query, scores[:, j], rows, top_k)
+            for j, query in enumerate(queries)
+        ]
+
+    def _get_rows(self, rows, partition: str | None):
+        if partition is not None:
+            rows = self.partitions[partition]
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.intp)
+            return rows, self.compact.take(rows)
+        return None, self.compact
+
+    def _rerank(
+        self,
+        query: np.ndarray,
+        first_scores: np.ndarray,
+        rows: np.ndarray | None,
+        top_k: int,
+    ) -> list[tuple[int, float]]:
+        n_candidates = max(top_k * self.rerank_factor, MIN_RERANK_CANDIDATES)
+        candidates = top_k_indices(first_scores, n_candidates)
+        if rows is not None:
+            candidates = rows[candidates]
+        # Sorted rows read the memory-mapped embeddings in order and break
+        # ties by row like the exact search
+        candidates = np.sort(candidates)
+        scores = normalize_embeddings(self.embeddings[candidates]) @ query
+        return [
+            (int(candidates[i]), float(scores[i])) for i in top_k_indices(scores, top_k)
+        ]
+
+
+def get_compact_path(
+    name: str, directory: str, dtype: str, dims: int | None = None
+) -> str:
+    suffix = dtype if dims is None else f"{dtype}-{dims}"
+    return os.path.join(directory, f"{name}.{suffix}.npz")
+
+
+def load_or_build_compact(
+    path: str,
+    embeddings: np.ndarray,
+    dtype: str,
+    dims: int | None = None,
+    digest: str | None = None,
+) -> CompactVectors:
+    """
+    Load saved compact vectors, or encode them if they are missing or stale.
+    They are stale unless they were saved with the digest of the store (by
+    default the digest of the embeddings).
+    """
+    if os.path.exists(path):
+        if digest is None:
+            digest = store_digest(embeddings)
+        compact = CompactVectors.load(path)
+        if len(compact) == len(embeddings) and compact.digest == digest:
+            return compact
+    return CompactVectors.encode(embeddings, dtype, dims)
+
+
+def compare_modes(
+    embeddings: np.ndarray,
+    queries: np.ndarray,
+    modes: list[tuple[str, int | None]],
+    top_k: int = 5,
+    rerank_factor: int = DEFAULT_RERANK_FACTOR,
+) -> list[dict]:
+    """
+    Compare compact (dtype, dims) modes with the full-precision search: the
+    memory held for scoring, the top_k agreement (share of the exact top_k
+    found), the share of queries with the identical ranked list, and the latency
+    """
+    engine = EmbeddingSearchEngine(embeddings)
+    exact = []
+    start = time.perf_counter()
+    for query in queries:
+        exact.append(engine.search(query, top_k))
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    results = [
+        {
+            "dtype": "float32",
+            "dims": embeddings.shape[1],
+            "bytes": engine.vectors.nbytes,
+            "agreement": 1.0,
+            "identical": 1.0,
+            "latency_ms": exact_ms,
+        }
+    ]
+    for dtype, dims in modes:
+        compact = CompactVectors.encode(embeddings, dtype, dims)
+        compact_engine = CompactSearchEngine(embeddings, compact, rerank_factor)
+        hits = 0
+        identical = 0
+        start = time.perf_counter()
+        for query, expected in zip(queries, exact):
+            found = compact_engine.search(query, top_k)
+            hits += len({row for row, _ in expected}.intersection(r for r, _ in found))
+            identical += [r for r, _ in found] == [r for r, _ in expected]
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        results.append(
+            {
+                "dtype": dtype,
+                "dims": compact.dims,
+                "bytes": compact.nbytes,
+                "agreement": hits / (top_k * len(queries)),
+                "identical": identical / len(queries),
+                "latency_ms": latency_ms,
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    from .embedding_store import (
+        PROTOCOL_STORE,
+        STORE_DIR,
+        TOKEN_STORE,
+        load_embedding_store,
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Report the memory footprint and the top-k agreement of the "
+        "compact storage modes against the full-precision search."
+    )
+    parser.add_argument(
+        "--store", choices=[TOKEN_STORE, PROTOCOL_STORE], default=TOKEN_STORE
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="Use this many random clustered vectors instead of the store.",
+    )
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument(
+        "--save",
+        metavar="DTYPE",
+        choices=COMPACT_DTYPES,
+        help="Save the store's compact vectors in this dtype.",
+    )
+    parser.add_argument("--save-dims", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        centers = rng.normal(size=(max(1, args.synthetic // 50), args.dim))
+        labels = rng.integers(len(centers), size=args.synthetic)
+        embeddings = centers[labels] + rng.normal(size=(args.synthetic, args.dim))
+        embeddings = normalize_embeddings(embeddings)
+    else:
+        store = load_embedding_store(args.store)
+        embeddings = store.matrix
+    dim = embeddings.shape[1]
+    # Queries near catalog entries, like the searched names are
+    picks = rng.choice(len(embeddings), min(args.queries, len(embeddings)), False)
+    vectors = normalize_embeddings(embeddings[np.sort(picks)])
+    queries = normalize_embeddings(vectors + 0.05 * rng.normal(size=vectors.shape))
+
+    modes = [("float16", None), ("int8", None)]
+    for dims in (1024, 512, 256):
+        if dims < dim:
+            modes += [("float16", dims), ("int8", dims)]
+
+    print(f"{len(embeddings)} vectors of {dim} dimensions, {len(queries)} queries")
+    print(
+        f"{'dtype':>8} {'dims':>5} {'MiB':>8} {f'agree@{args.top_k}':>9} "
+        f"{'identical':>9} {'latency (ms)':>13}"
+    )
+    for result in compare_modes(embeddings, queries, modes, args.top_k):
+        print(
+            f"{result['dtype']:>8} {result['dims']:>5} "
+            f"{result['bytes'] / 2**20:>8.2f} {result['agreement']:>9.3f} "
+            f"{result['identical']:>9.3f} {result['latency_ms']:>13.3f}"
+        )
+
+    if args.save and not args.synthetic:
+        path = get_compact_path(args.store, STORE_DIR, args.save, args.save_dims)
+        CompactVectors.encode(embeddings, args.save, args.save_dims).save(
+            path, store.digest
+        )
+        print(f"Saved {path}")
@@ -1,7 +1,113 @@
 import json
+import os
+import threading
 from enum import Enum, unique
+from types import MappingProxyType
+from typing import Mapping
 from model.network import Network
 
+NETWORK_DATA_PATH = "data/network.json"
+
+
+class NetworkRegistry:
+    """
+    Supported networks parsed once from a json file.
+    The file is parsed again only when its modification time changes.
+
+    Names are resolved in this order: exact name, exact alias, then the first
+    network (in file order) whose name contains the given text.
+    """
+
+    def __init__(self, file_path: str = NETWORK_DATA_PATH):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._mtime: float | None = None
+        self._networks: tuple[Network, ...] = ()
+        self._by_id: Mapping[int, Network] = MappingProxyType({})
+        self._by_name: Mapping[str, Network] = MappingProxyType({})
+        self._by_alias: Mapping[str, Network] = MappingProxyType({})
+
+    def load(self):
+        self._refresh()
+
+    @property
+    def networks(self) -> tuple[Network, ...]:
+        self._refresh()
+        return self._networks
+
+    def get_by_id(self, id: int) -> Network | None:
+        self._refresh()
+        return self._by_id.get(id, None)
+
+    def get_by_name(self, name: str) -> Network | None:
+        self._refresh()
+        key = _normalize_name(name)
+        if not key:
+            return None
+        network = self._by_name.get(key) or self._by_alias.get(key)
+        if network is not None:
+            return network
+        # Fall back to a partial match on the network names
+        for network in self._networks:
+            if key in network.name.lower():
+                return network
+        return None
+
+    def _refresh(self):
+        mtime = os.stat(self.file_path).st_mtime
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime != self._mtime:
+                self._load()
+                self._mtime = mtime
+
+    def _load(self):
+        with open(self.file_path, "r") as file:
+            json_content = json.load(file)
+
+        networks = []
+        by_id = {}
+        by_name = {}
+        by_alias = {}
+        for item in json_content:
+            network = Network(
+                id=item["id"],
+                name=item["name"],
+                rpc_url=item["rpc_url"],
+                symbol=item["symbol"],
+                decimals=item["decimals"],
+            )
+            networks.append(network)
+            by_id[network.id] = network
+            by_name[_normalize_name(network.name)] = network
+            for alias in item.get("aliases", []):
+                # The first network declaring an alias wins
+                by_alias.setdefault(_normalize_name(alias), network)
+
+        self._networks = tuple(networks)
+        self._by_id = MappingProxyType(by_id)
+        self._by_name = MappingProxyType(by_name)
+        self._by_alias = MappingProxyType(by_alias)
+
+
+def _normalize_name(name: str) -> str:
+    return " ".join(str(name).lower().split())
+
+
+_registries: dict[str, NetworkRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_network_registry(file_path: str = NETWORK_DATA_PATH) -> NetworkRegistry:
+    """
+    Get the process-wide registry of a network file
+    """
+    with _registries_lock:
+        if file_path not in _registries:
+            _registries[file_path] = NetworkRegistry(file_path)
+        return _registries[file_path]
+
 
 class DataUtils:
     @unique
@@ -9,14 +115,13 @@ class DataUtils:
         BY_ID = 1
         BY_NAME = 2
 
-    def __get_supported_networks(self, flag: QueryFlag) -> dict[str | int, Network]:
+    def __init__(self, file_path: str = NETWORK_DATA_PATH):
+        self.network_registry = get_network_registry(file_path)
+
+    def get_supported_networks(self, flag: QueryFlag) -> dict[str | int, Network]:
         """
-        Get supported networks from a json file
+        Get supported networks keyed by id or name
         """
-        file_path = "data/network.json"
-        with open(file_path, "r") as file:
-            json_content = json.load(file)
-
         if flag == self.QueryFlag.BY_NAME:
             key = "name"
         elif flag == self.QueryFlag.BY_ID:
@@ -25,29 +130,23 @@ class DataUtils:
             raise ValueError(f"Invalid query flag: {flag}")
 
         return {
-            item[key]: Network(
-                id=item["id"],
-                name=item["name"],
-                rpc_url=item["rpc_url"],
-                symbol=item["symbol"],
-                decimals=item["decimals"],
-            )
-            for item in json_content
+            getattr(network, key): network for network in self.network_registry.networks
         }
 
+    def load(self):
+        """
+        Load the supported networks ahead of the first lookup
+        """
+        self.network_registry.load()
+
     def get_network_info_by_name(self, name: str) -> Network | None:
         """
-        Get network info by name
+        Get network info by name or alias
         """
-        supported_networks = self.__get_supported_networks(self.QueryFlag.BY_NAME)
-        matching_keys = [
-            key for key in supported_networks.keys() if name.lower() in str(key).lower()
-        ]
-        return supported_networks[matching_keys[0]] if matching_keys else None
+        return self.network_registry.get_by_name(name)
 
     def get_network_info_by_id(self, id: int) -> Network | None:
         """
         Get network info by id
         """
-        supported_networks = self.__get_supported_networks(self.QueryFlag.BY_ID)
-        return supported_networks.get(id, None)
+        return self.network_registry.get_by_id(id)
@@ -0,0 +1,116 @@
+import asyncio
+from functools import lru_cache
+from typing import Callable, List
+from openai import AsyncOpenAI
+from tenacity import AsyncRetrying, stop_after_attempt, wait_random_exponential
+
+# Limits of one embeddings API request
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+MAX_TOKENS_PER_INPUT = 8191
+# Requests sent at the same time
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(model: str) -> Callable[[str], int]:
+    """
+    Get a function counting the tokens of a text with the model's tiktoken encoding
+    """
+    import tiktoken
+
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text))
+
+
+def pack_batches(
+    texts: list[str],
+    count_tokens: Callable[[str], int],
+    max_tokens: int = MAX_TOKENS_PER_REQUEST,
+    max_inputs: int = MAX_INPUTS_PER_REQUEST,
+) -> list[list[int]]:
+    """
+    Pack consecutive texts into batches within the per-request limits.
+    Returns the text indexes of each batch.
+    """
+    batches = []
+    batch: list[int] = []
+    batch_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if tokens > MAX_TOKENS_PER_INPUT:
+            raise ValueError(f"Text {i} has {tokens} tokens, more than an input allows")
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_inputs):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def aembed_batches(
+    texts: List[str],
+    model: str = "text-embedding-3-small",
+    client: AsyncOpenAI | None = None,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    count_tokens: Callable[[str], int] | None = None,
+    max_tokens: int = MAX_TOKENS_PER_REQUEST,
+    max_inputs: int = MAX_INPUTS_PER_REQUEST,
+    max_attempts: int = 6,
+    wait=wait_random_exponential(min=1, max=20),
+) -> List[List[float]]:
+    """
+    Embed texts with concurrent, token-budgeted requests.
+    At most max_in_flight requests run at once; a failed request is retried on
+    its own without sending the other batches again. The embeddings are returned
+    in the order of the texts.
+    """
+    # replace newlines, which can negatively affect performance.
+    texts = [text.replace("\n", " ") for text in texts]
+    batches = pack_batches(
+        texts, count_tokens or get_token_counter(model), max_tokens, max_inputs
+    )
+
+    own_client = client is None
+    if own_client:
+        # Retries are done per batch below
+        client = AsyncOpenAI(max_retries=0)
+    semaphore = asyncio.Semaphore(max_in_flight)
+    embeddings: List[List[float] | None] = [None] * len(texts)
+
+    async def embed_batch(batch: list[int]):
+        async with semaphore:
+            async for attempt in AsyncRetrying(
+                wait=wait, stop=stop_after_attempt(max_attempts), reraise=True
+            ):
+                with attempt:
+                    response = await client.embeddings.create(
+                        input=[texts[i] for i in batch], model=model
+                    )
+        for data in response.data:
+            embeddings[batch[data.index]] = data.embedding
+
+    tasks = [asyncio.ensure_future(embed_batch(batch)) for batch in batches]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    finally:
+        if own_client:
+            await client.close()
+    return embeddings
+
+
+def embed_texts(texts: List[str], model: str = "text-embedding-3-small", **kwargs):
+    """
+    Sync version of aembed_batches
+    """
+    return asyncio.run(aembed_batches(texts, model, **kwargs))
@@ -0,0 +1,365 @@
+import asyncio
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List
+import numpy as np
+from . import embeddings_utils
+from .embedding_store import normalize_text
+
+DEFAULT_CACHE_PATH = "processed/cache/embeddings.sqlite"
+FINE_TUNING_DATA_PATH = "data/fine-tuning"
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for query embeddings keyed by (model, normalized text).
+    A bounded in-memory LRU sits in front of a persistent SQLite store; both tiers
+    evict the least recently used entries when they are full.
+    Misses are embedded with the OpenAI API unless embed / embed_many functions
+    (e.g. offline stand-ins) are given.
+    """
+
+    def __init__(
+        self,
+        path: str | None = DEFAULT_CACHE_PATH,
+        max_memory_entries: int = 1024,
+        max_disk_entries: int = 100_000,
+        embed: Callable[..., List[float]] | None = None,
+        embed_many: Callable[..., List[List[float]]] | None = None,
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.embed = embed
+        self.embed_many = embed_many
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._lock = threading.RLock()
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            self._db = self._open(path)
+
+    def get(self, text: str, model: str) -> List[float] | None:
+        """
+        Get a cached embedding, or None if neither tier has it
+        """
+        key = (model, normalize_text(text))
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector.tolist()
+
+            vector = self._read_disk(key)
+            if vector is not None:
+                self._put_memory(key, vector)
+                self.disk_hits += 1
+                return vector.tolist()
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, model: str, embedding: List[float]):
+        key = (model, normalize_text(text))
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._put_memory(key, vector)
+            self._write_disk([(key, vector)])
+
+    def get_embedding(
+        self,
+        text: str,
+        model: str,
+        embed: Callable[..., List[float]] | None = None,
+    ) -> List[float]:
+        """
+        Get the embedding of a text from the cache, calling the API on a miss
+        """
+        embedding = self.get(text, model)
+        if embedding is None:
+            embed = embed or self.embed or embeddings_utils.get_embedding
+            embedding = embed(text=normalize_text(text), model=model)
+            self.put(text, model, embedding)
+        return embedding
+
+    def get_embeddings(
+        self,
+        texts: list[str],
+        model: str,
+        embed_many: Callable[..., List[List[float]]] | None = None,
+        batch_size: int = 2048,
+    ) -> List[List[float]]:
+        """
+        Get the embeddings of many texts from the cache, embedding all the missing
+        ones with one API call (per batch_size texts)
+        """
+        embeddings = [self.get(text, model) for text in texts]
+        missing = list(
+            dict.fromkeys(
+                normalize_text(text)
+                for text, embedding in zip(texts, embeddings)
+                if embedding is None
+            )
+        )
+        if not missing:
+            return embeddings
+
+        embed_many = embed_many or self.embed_many or embeddings_utils.get_embeddings
+        computed = {}
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i : i + batch_size]
+            computed.update(zip(batch, embed_many(batch, model=model)))
+        with self._lock:
+            items = [
+                ((model, text), np.asarray(embedding, dtype=np.float32))
+                for text, embedding in computed.items()
+            ]
+            for key, vector in items:
+                self._put_memory(key, vector)
+            self._write_disk(items)
+        return [
+            embedding if embedding is not None else computed[normalize_text(text)]
+            for text, embedding in zip(texts, embeddings)
+        ]
+
+    async def aget_embedding(self, text: str, model: str) -> List[float]:
+        """
+        Async version of get_embedding, calling the async API on a miss
+        """
+        embedding = self.get(text, model)
+        if embedding is None:
+            if self.embed is not None:
+                embedding = await asyncio.to_thread(
+                    self.embed, text=normalize_text(text), model=model
+                )
+            else:
+                embedding = await embeddings_utils.aget_embedding(
+                    text=normalize_text(text), model=model
+                )
+            self.put(text, model, embedding)
+        return embedding
+
+    def prewarm(self, texts: list[str], model: str, batch_size: int = 100) -> int:
+        """
+        Embed the texts that are not cached yet, in batches.
+        Returns the number of newly embedded texts.
+        """
+        with self._lock:
+            pending = []
+            for text in dict.fromkeys(normalize_text(text) for text in texts):
+                key = (model, text)
+                if key not in self._memory and self._read_disk(key) is None:
+                    pending.append(text)
+
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i : i + batch_size]
+            embed_many = self.embed_many or embeddings_utils.get_embeddings
+            embeddings = embed_many(batch, model=model)
+            with self._lock:
+                self._write_disk(
+                    [
+                        ((model, text), np.asarray(embedding, dtype=np.float32))
+                        for text, embedding in zip(batch, embeddings)
+                    ]
+                )
+        return len(pending)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._count_disk(),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text)
+            )
+            """)
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        db.commit()
+        return db
+
+    def _put_memory(self, key: tuple[str, str], vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key: tuple[str, str]) -> np.ndarray | None:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT vector FROM embeddings WHERE model = ? AND text = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute(
+            "UPDATE embeddings SET last_used = ? WHERE model = ? AND text = ?",
+            (time.time(), *key),
+        )
+        self._db.commit()
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def _write_disk(self, items: list[tuple[tuple[str, str], np.ndarray]]):
+        if self._db is None or not items:
+            return
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text, vector, last_used) "
+            "VALUES (?, ?, ?, ?)",
+            [(model, text, vector.tobytes(), now) for (model, text), vector in items],
+        )
+        overflow = self._count_disk() - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            )
+        self._db.commit()
+
+    def _count_disk(self) -> int:
+        if self._db is None:
+            return 0
+        return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+_default_cache: EmbeddingCache | None = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> EmbeddingCache:
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
+
+
+def set_default_cache(cache: EmbeddingCache | None):
+    """
+    Replace the process-wide cache, e.g. with one using offline stand-ins.
+    None creates the default cache again on next use.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
+
+
+def get_cached_embedding(text: str, model: str) -> List[float]:
+    """
+    Get a query embedding through the default process-wide cache
+    """
+    return get_default_cache().get_embedding(text, model)
+
+
+def get_cached_embeddings(texts: list[str], model: str) -> List[List[float]]:
+    """
+    Get the embeddings of many queries through the default process-wide cache
+    """
+    return get_default_cache().get_embeddings(texts, model)
+
+
+async def aget_cached_embedding(text: str, model: str) -> List[float]:
+    """
+    Async version of get_cached_embedding
+    """
+    return await get_default_cache().aget_embedding(text, model)
+
+
+def get_fine_tuning_queries(
+    directory: str = FINE_TUNING_DATA_PATH,
+) -> dict[str, list[str]]:
+    """
+    Collect the token and protocol search queries the fine-tuning completions
+    would produce when evaluated.
+    """
+    from web3_utils.ens_utils import is_address
+    from .data_utils import DataUtils
+
+    data_utils = DataUtils()
+    token_queries = []
+    protocol_queries = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "r") as file:
+            data = json.load(file)
+        for entry in data:
+            completion = entry["completion"]
+            items = completion if isinstance(completion, list) else [completion]
+            for item in items:
+                token = item.get("token")
+                if not token:
+                    continue
+                token_queries.append(token)
+
+                # Receivers which are neither addresses nor ENS names are searched as protocols
+                receiver = item.get("receiver") or item.get("spender")
+                network = data_utils.get_network_info_by_name(item.get("chain", ""))
+                if (
+                    receiver
+                    and network is not None
+                    and not receiver.strip().endswith(".eth")
+                    and not is_address(receiver.strip())
+                ):
+                    protocol_queries.append(
+                        f"{item['action']}, {token}, {network.name}"
+                    )
+    return {"token": token_queries, "protocol": protocol_queries}
+
+
+def prewarm_from_fine_tuning(
+    cache: EmbeddingCache | None = None, directory: str = FINE_TUNING_DATA_PATH
+) -> int:
+    """
+    Prewarm the cache with the queries found in the fine-tuning data.
+    Returns the number of newly embedded queries.
+    """
+    from .token_searcher import TokenSearcher
+    from .protocol_searcher import ProtocolSearcher
+
+    cache = cache or get_default_cache()
+    queries = get_fine_tuning_queries(directory)
+    return cache.prewarm(
+        queries["token"], TokenSearcher.EMBEDDING_MODEL
+    ) + cache.prewarm(queries["protocol"], ProtocolSearcher.EMBEDDING_MODEL)
+
+
+if __name__ == "__main__":
+    count = prewarm_from_fine_tuning()
+    print(f"{count} queries embedded. Cache stats: {get_default_cache().stats()}")
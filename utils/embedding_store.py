@@ -0,0 +1,383 @@
+import ast
+import glob
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Callable, List
+import numpy as np
+
+from .embeddings_utils import normalize_embeddings
+
+# pandas is slow to import and only needed to convert tables, so it is
+# imported by the functions using it
+if TYPE_CHECKING:
+    import pandas as pd
+
+STORE_DIR = "processed/embeddings"
+TOKEN_STORE = "erc20_tokens"
+PROTOCOL_STORE = "protocol"
+
+
+class EmbeddingStore:
+    """
+    A float32 embedding matrix with one metadata record per row.
+    The matrix is usually memory-mapped from an .npy file, so loading a store
+    does not read the vectors until they are used.
+    Partitions map a key (e.g. a chain name) to the row indexes belonging to it.
+    Hashes are the content hashes of the embedded texts, one per row.
+    normalized is set when the rows are unit length, as saved stores are, so
+    they can be searched without normalizing a copy of the matrix.
+    The digest identifies the contents of the store, so the indexes built from
+    it can tell when they are stale.
+    """
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        records: list[dict],
+        model: str | None = None,
+        partitions: dict[str, np.ndarray] | None = None,
+        hashes: list[str] | None = None,
+        normalized: bool = False,
+    ):
+        if matrix.ndim != 2:
+            raise ValueError(f"Expected a 2-D matrix, got shape {matrix.shape}")
+        if matrix.shape[0] != len(records):
+            raise ValueError(
+                f"Row count mismatch: {matrix.shape[0]} vectors, {len(records)} records"
+            )
+        self.matrix = matrix
+        self.records = records
+        self.model = model
+        self.partitions = partitions or {}
+        self.hashes = hashes
+        self.normalized = normalized
+        self._digest: str | None = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = store_digest(self.matrix, self.hashes)
+        return self._digest
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """
+        Get the metadata records as a DataFrame (without the embeddings)
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self.records)
+
+
+def get_store_paths(name: str, directory: str = STORE_DIR) -> tuple[str, str]:
+    """
+    Get the (matrix, metadata) file paths of a store
+    """
+    return (
+        os.path.join(directory, f"{name}.npy"),
+        os.path.join(directory, f"{name}.meta.json"),
+    )
+
+
+def get_index_paths(name: str, directory: str = STORE_DIR) -> list[str]:
+    """
+    Get the paths of the saved indexes built from a store (e.g. its IVF index
+    and its compact vectors)
+    """
+    return glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(name)}.*.npz"))
+
+
+def store_digest(matrix, hashes: list[str] | None = None) -> str:
+    """
+    Digest of the contents of a store: its shape and the content hashes of its
+    rows, or the matrix itself when it has no hashes
+    """
+    digest = hashlib.sha256(str(tuple(np.shape(matrix))).encode("utf-8"))
+    if hashes is not None:
+        for h in hashes:
+            digest.update(h.encode("utf-8"))
+    else:
+        for start in range(0, len(matrix), 1024):
+            digest.update(np.ascontiguousarray(matrix[start : start + 1024]).tobytes())
+    return digest.hexdigest()
+
+
+def store_exists(name: str, directory: str = STORE_DIR) -> bool:
+    matrix_path, meta_path = get_store_paths(name, directory)
+    return os.path.exists(matrix_path) and os.path.exists(meta_path)
+
+
+def save_embedding_store(
+    name: str,
+    embeddings,
+    records: list[dict],
+    model: str | None = None,
+    directory: str = STORE_DIR,
+    partitions: dict[str, list[int]] | None = None,
+    hashes: list[str] | None = None,
+) -> str:
+    """
+    Save embeddings as a float32 .npy matrix and the records (and optional
+    partitions and content hashes) as a JSON sidecar. The rows are saved
+    normalized, so the loaded matrix can be searched as it is.
+    Returns the path of the matrix file.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1 and len(matrix) == 0:
+        matrix = matrix.reshape(0, 0)
+    matrix = normalize_embeddings(matrix)
+    if matrix.shape[0] != len(records):
+        raise ValueError(
+            f"Row count mismatch: {matrix.shape[0]} vectors, {len(records)} records"
+        )
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    matrix_path, meta_path = get_store_paths(name, directory)
+    # Write to temporary files first so readers never see a half-written store
+    np.save(matrix_path + ".tmp.npy", matrix)
+    with open(meta_path + ".tmp", "w") as file:
+        json.dump(
+            {
+                "model": model,
+                "count": int(matrix.shape[0]),
+                "dim": int(matrix.shape[1]),
+                "records": records,
+                "partitions": partitions or {},
+                "hashes": hashes,
+                "normalized": True,
+            },
+            file,
+            default=_to_json_value,
+        )
+    os.replace(matrix_path + ".tmp.npy", matrix_path)
+    os.replace(meta_path + ".tmp", meta_path)
+    # The indexes built from the previous contents are stale
+    for path in get_index_paths(name, directory):
+        os.remove(path)
+    return matrix_path
+
+
+def load_embedding_store(
+    name: str, directory: str = STORE_DIR, mmap: bool = True
+) -> EmbeddingStore:
+    """
+    Load a store saved by save_embedding_store.
+    The matrix is memory-mapped read-only unless mmap is False.
+    """
+    matrix_path, meta_path = get_store_paths(name, directory)
+    if not os.path.exists(matrix_path) or not os.path.exists(meta_path):
+        raise FileNotFoundError(
+            f"Embedding store '{name}' not found in {directory}. "
+            "Run the update scripts or migrate the legacy CSV first."
+        )
+    with open(meta_path, "r") as file:
+        meta = json.load(file)
+    matrix = np.load(matrix_path, mmap_mode="r" if mmap else None)
+    partitions = {
+        key: np.asarray(rows, dtype=np.intp)
+        for key, rows in meta.get("partitions", {}).items()
+    }
+    return EmbeddingStore(
+        matrix,
+        meta["records"],
+        model=meta.get("model"),
+        partitions=partitions,
+        hashes=meta.get("hashes"),
+        normalized=meta.get("normalized", False),
+    )
+
+
+def normalize_text(text) -> str:
+    """
+    Normalize a text before embedding it: newlines and repeated whitespace become
+    a single space. Other values, like the NaN pandas reads for an empty
+    description, are converted to strings.
+    """
+    return " ".join(str(text).split())
+
+
+def content_hash(text, model: str) -> str:
+    """
+    Hash of the (model, normalized text) pair an embedding is computed from
+    """
+    key = f"{model}\0{normalize_text(text)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def build_embeddings(
+    texts: list[str],
+    model: str,
+    embed: Callable[[List[str]], List[List[float]]],
+    previous: EmbeddingStore | None = None,
+    batch_size: int | None = None,
+) -> tuple[np.ndarray, list[str], dict[str, int]]:
+    """
+    Embed texts, reusing the vectors of a previous store for the texts whose
+    content hash is unchanged. Only new or changed texts are passed to embed, in
+    batches of batch_size (all at once if None).
+
+    Returns:
+    tuple: The embedding matrix, the content hashes and the number of reused and
+    recomputed rows.
+    """
+    hashes = [content_hash(text, model) for text in texts]
+    previous_rows = {}
+    if previous is not None and previous.hashes is not None:
+        previous_rows = {h: i for i, h in enumerate(previous.hashes)}
+
+    pending = [h for h in dict.fromkeys(hashes) if h not in previous_rows]
+    first_text = {}
+    for text, h in zip(texts, hashes):
+        first_text.setdefault(h, text)
+
+    vectors: dict[str, np.ndarray] = {}
+    batch_size = batch_size or max(len(pending), 1)
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i : i + batch_size]
+        embeddings = embed([normalize_text(first_text[h]) for h in batch])
+        for h, embedding in zip(batch, embeddings):
+            vectors[h] = np.asarray(embedding, dtype=np.float32)
+
+    reused = 0
+    rows = []
+    for h in hashes:
+        if h in vectors:
+            rows.append(vectors[h])
+        else:
+            rows.append(np.asarray(previous.matrix[previous_rows[h]], dtype=np.float32))
+            reused += 1
+    matrix = np.vstack(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+    return matrix, hashes, {"reused": reused, "recomputed": len(hashes) - reused}
+
+
+def load_previous_store(name: str, model: str, directory: str = STORE_DIR):
+    """
+    Load a store to reuse vectors from, or None if there is none for the model
+    """
+    if not store_exists(name, directory):
+        return None
+    store = load_embedding_store(name, directory)
+    return store if store.model == model else None
+
+
+def build_chain_partitions(records: list[dict]) -> dict[str, list[int]]:
+    """
+    Group the row indexes of token records by the chains they have a contract on
+    """
+    partitions: dict[str, list[int]] = {}
+    for i, record in enumerate(records):
+        for chain in record.get("network_to_contract") or {}:
+            partitions.setdefault(chain, []).append(i)
+    return partitions
+
+
+def parse_network_to_contract(value) -> dict[str, str]:
+    """
+    Parse the stringified network_to_contract column of data/cmc/map.csv
+    """
+    if isinstance(value, dict):
+        return value
+    if not isinstance(value, str):
+        return {}
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def convert_legacy_csv(
+    csv_path: str,
+    name: str,
+    model: str | None = None,
+    directory: str = STORE_DIR,
+    text_column: str | None = None,
+) -> str:
+    """
+    Convert a CSV with a stringified 'embedding' column into an embedding store.
+    If the column of the embedded text is given, the content hashes are saved
+    too, so the next build reuses the converted vectors.
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    if "embedding" not in df.columns:
+        raise ValueError(f"{csv_path} has no embedding column")
+    df = df.loc[:, ~df.columns.str.startswith("Unnamed")]
+    embeddings = [ast.literal_eval(embedding) for embedding in df["embedding"]]
+    hashes = None
+    if model is not None and text_column in df.columns:
+        hashes = [content_hash(str(text), model) for text in df[text_column]]
+    df = df.drop(columns=["embedding", "text"], errors="ignore")
+    if "network_to_contract" in df.columns:
+        df["network_to_contract"] = df["network_to_contract"].apply(
+            parse_network_to_contract
+        )
+    records = dataframe_to_records(df)
+    return save_embedding_store(
+        name,
+        embeddings,
+        records,
+        model=model,
+        directory=directory,
+        partitions=build_chain_partitions(records),
+        hashes=hashes,
+    )
+
+
+def dataframe_to_records(df: "pd.DataFrame") -> list[dict]:
+    """
+    Convert a DataFrame into JSON-friendly records (NaN becomes None)
+    """
+    import pandas as pd
+
+    df = df.astype(object).where(pd.notna(df), None)
+    return df.to_dict(orient="records")
+
+
+def _to_json_value(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if __name__ == "__main__":
+    # Migrate the legacy CSV embeddings to the binary store format
+    legacy = [
+        (
+            "processed/embeddings/erc20_tokens.csv",
+            TOKEN_STORE,
+            "text-embedding-3-large",
+            "description",
+        ),
+        (
+            "processed/embeddings/protocol.csv",
+            PROTOCOL_STORE,
+            "text-embedding-3-small",
+            "text",
+        ),
+    ]
+    for csv_path, name, model, text_column in legacy:
+        if os.path.exists(csv_path):
+            print(f"Converting {csv_path}...", end="", flush=True)
+            try:
+                output_path = convert_legacy_csv(
+                    csv_path, name, model=model, text_column=text_column
+                )
+            except ValueError as e:
+                print("Skipped:", e)
+                continue
+            print("Saved to", output_path)
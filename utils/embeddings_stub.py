@@ -0,0 +1,110 @@
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+import numpy as np
+
+
+class EmbeddingsStub:
+    """
+    A local stand-in for the OpenAI embeddings endpoint.
+    The embedding of a text is embed(text) if given, else [len(text), index of
+    the request], and requests containing a text of fail_once fail with a 500
+    the first time. Embeddings are sent base64-encoded when the request asks
+    for it, like the API does.
+    """
+
+    def __init__(
+        self,
+        delay: float = 0.0,
+        fail_once: set[str] | None = None,
+        embed: Callable[[str], list[float]] | None = None,
+    ):
+        self.delay = delay
+        self.fail_once = set(fail_once or ())
+        self.embed = embed
+        self.requests: list[list[str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "EmbeddingsStub":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, request: dict) -> tuple[int, dict]:
+        texts = request["input"]
+        with self._lock:
+            self.requests.append(texts)
+            number = len(self.requests)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            failing = self.fail_once.intersection(texts)
+            self.fail_once -= failing
+        try:
+            time.sleep(self.delay)
+            if failing:
+                return 500, {"error": {"message": "Server error", "type": "server"}}
+            embeddings = [
+                self.embed(text) if self.embed else [len(text), number]
+                for text in texts
+            ]
+            if request.get("encoding_format") == "base64":
+                embeddings = [
+                    base64.b64encode(np.asarray(e, dtype=np.float32).tobytes()).decode()
+                    for e in embeddings
+                ]
+            data = [
+                {"object": "embedding", "index": i, "embedding": embedding}
+                for i, embedding in enumerate(embeddings)
+            ]
+            # The API doesn't promise the data is in input order
+            data.reverse()
+            usage = {"prompt_tokens": 0, "total_tokens": 0}
+            return 200, {
+                "object": "list",
+                "data": data,
+                "model": request["model"],
+                "usage": usage,
+            }
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # The headers and the body are written separately; without this,
+            # delayed ACKs stall every kept-alive response by ~40ms
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                status, response = stub.handle(json.loads(self.rfile.read(length)))
+                body = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -1,22 +1,46 @@
 from typing import List
 import ast
+import threading
 
-import matplotlib.pyplot as plt
-from scipy import spatial
-from sklearn.decomposition import PCA
-from sklearn.manifold import TSNE
-from sklearn.metrics import average_precision_score, precision_recall_curve
-
-from openai import OpenAI
 import numpy as np
-import pandas as pd
 from tenacity import (
     retry,
     wait_random_exponential,
     stop_after_attempt,
 )  # for retrying API calls
 
-client = OpenAI(max_retries=5)
+# The analysis and plotting helpers are in embeddings_analysis, so importing
+# this module doesn't load matplotlib, scipy or sklearn. The OpenAI clients
+# are created on first use.
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Get the OpenAI client, created on first use
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+
+            _client = OpenAI(max_retries=5)
+        return _client
+
+
+def get_async_client():
+    """
+    Get the async OpenAI client, created on first use
+    """
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            from openai import AsyncOpenAI
+
+            _async_client = AsyncOpenAI(max_retries=5)
+        return _async_client
 
 
 # Retry up to 6 times with exponential backoff, starting at 1 second and maxing out at 20 seconds delay
@@ -25,20 +49,22 @@ def get_embedding(text: str, model="text-embedding-3-small", **kwargs) -> List[f
     # replace newlines, which can negatively affect performance.
     text = text.replace("\n", " ")
 
-    response = client.embeddings.create(input=[text], model=model, **kwargs)
+    response = get_client().embeddings.create(input=[text], model=model, **kwargs)
 
     return response.data[0].embedding
 
 
+@retry(wait=wait_random_exponential(min=1, max=20), stop=stop_after_attempt(6))
 async def aget_embedding(
     text: str, model="text-embedding-3-small", **kwargs
 ) -> List[float]:
     # replace newlines, which can negatively affect performance.
     text = text.replace("\n", " ")
 
-    return (await client.embeddings.create(input=[text], model=model, **kwargs))[
-        "data"
-    ][0]["embedding"]
+    response = await get_async_client().embeddings.create(
+        input=[text], model=model, **kwargs
+    )
+    return response.data[0].embedding
 
 
 @retry(wait=wait_random_exponential(min=1, max=20), stop=stop_after_attempt(6))
@@ -50,10 +76,13 @@ def get_embeddings(
     # replace newlines, which can negatively affect performance.
     list_of_text = [text.replace("\n", " ") for text in list_of_text]
 
-    data = client.embeddings.create(input=list_of_text, model=model, **kwargs).data
+    data = (
+        get_client().embeddings.create(input=list_of_text, model=model, **kwargs).data
+    )
     return [d.embedding for d in data]
 
 
+@retry(wait=wait_random_exponential(min=1, max=20), stop=stop_after_attempt(6))
 async def aget_embeddings(
     list_of_text: List[str], model="text-embedding-3-small", **kwargs
 ) -> List[List[float]]:
@@ -63,7 +92,9 @@ async def aget_embeddings(
     list_of_text = [text.replace("\n", " ") for text in list_of_text]
 
     data = (
-        await client.embeddings.create(input=list_of_text, model=model, **kwargs)
+        await get_async_client().embeddings.create(
+            input=list_of_text, model=model, **kwargs
+        )
     ).data
     return [d.embedding for d in data]
 
@@ -72,121 +103,116 @@ def cosine_similarity(a, b):
     return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
 
-def plot_multiclass_precision_recall(
-    y_score, y_true_untransformed, class_list, classifier_name
-):
+def normalize_embeddings(embeddings) -> np.ndarray:
     """
-    Precision-Recall plotting for a multiclass problem. It plots average precision-recall, per class precision recall and reference f1 contours.
-
-    Code slightly modified, but heavily based on https://scikit-learn.org/stable/auto_examples/model_selection/plot_precision_recall.html
+    Return float32 copies of the embeddings scaled to unit length (zero rows stay zero)
     """
-    n_classes = len(class_list)
-    y_true = pd.concat(
-        [(y_true_untransformed == class_list[i]) for i in range(n_classes)], axis=1
-    ).values
-
-    # For each class
-    precision = dict()
-    recall = dict()
-    average_precision = dict()
-    for i in range(n_classes):
-        precision[i], recall[i], _ = precision_recall_curve(y_true[:, i], y_score[:, i])
-        average_precision[i] = average_precision_score(y_true[:, i], y_score[:, i])
-
-    # A "micro-average": quantifying score on all classes jointly
-    precision_micro, recall_micro, _ = precision_recall_curve(
-        y_true.ravel(), y_score.ravel()
-    )
-    average_precision_micro = average_precision_score(y_true, y_score, average="micro")
-    print(
-        str(classifier_name)
-        + " - Average precision score over all classes: {0:0.2f}".format(
-            average_precision_micro
-        )
-    )
+    matrix = np.array(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
 
-    # setup plot details
-    plt.figure(figsize=(9, 10))
-    f_scores = np.linspace(0.2, 0.8, num=4)
-    lines = []
-    labels = []
-    for f_score in f_scores:
-        x = np.linspace(0.01, 1)
-        y = f_score * x / (2 * x - f_score)
-        (l,) = plt.plot(x[y >= 0], y[y >= 0], color="gray", alpha=0.2)
-        plt.annotate("f1={0:0.1f}".format(f_score), xy=(0.9, y[45] + 0.02))
-
-    lines.append(l)
-    labels.append("iso-f1 curves")
-    (l,) = plt.plot(recall_micro, precision_micro, color="gold", lw=2)
-    lines.append(l)
-    labels.append(
-        "average Precision-recall (auprc = {0:0.2f})" "".format(average_precision_micro)
-    )
 
-    for i in range(n_classes):
-        (l,) = plt.plot(recall[i], precision[i], lw=2)
-        lines.append(l)
-        labels.append(
-            "Precision-recall for class `{0}` (auprc = {1:0.2f})"
-            "".format(class_list[i], average_precision[i])
-        )
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Return the indices of the k highest scores, best first.
+    Uses partial selection instead of a full sort; ties keep the lower index first.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    # Keep every candidate tied with the k-th best score, then order them
+    kth_score = np.partition(scores, n - k)[n - k]
+    candidates = np.flatnonzero(scores >= kth_score)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order[:k]]
+
+
+class EmbeddingSearchEngine:
+    """
+    Cosine similarity search over a fixed set of embeddings.
+    The vectors are normalized once, so scoring a query against the whole set is
+    a single matrix-vector product. Embeddings which are already normalized
+    (e.g. a memory-mapped store matrix) are used as they are, without a copy.
+    Named partitions keep the indexes of a subset of the rows, so searches
+    restricted to them only score those rows.
+    """
 
-    fig = plt.gcf()
-    fig.subplots_adjust(bottom=0.25)
-    plt.xlim([0.0, 1.0])
-    plt.ylim([0.0, 1.05])
-    plt.xlabel("Recall")
-    plt.ylabel("Precision")
-    plt.title(f"{classifier_name}: Precision-Recall curve for each class")
-    plt.legend(lines, labels)
-
-
-def distances_from_embeddings(
-    query_embedding: List[float],
-    embeddings: List[List[float]],
-    distance_metric="cosine",
-) -> List[List]:
-    """Return the distances between a query embedding and a list of embeddings."""
-    distance_metrics = {
-        "cosine": spatial.distance.cosine,
-        "L1": spatial.distance.cityblock,
-        "L2": spatial.distance.euclidean,
-        "Linf": spatial.distance.chebyshev,
-    }
-    distances = [
-        distance_metrics[distance_metric](query_embedding, embedding)
-        for embedding in embeddings
-    ]
-    return distances
-
-
-def indices_of_nearest_neighbors_from_distances(distances) -> np.ndarray:
-    """Return a list of indices of nearest neighbors from a list of distances."""
-    return np.argsort(distances)
-
-
-def pca_components_from_embeddings(
-    embeddings: List[List[float]], n_components=2
-) -> np.ndarray:
-    """Return the PCA components of a list of embeddings."""
-    pca = PCA(n_components=n_components)
-    array_of_embeddings = np.array(embeddings)
-    return pca.fit_transform(array_of_embeddings)
-
-
-def tsne_components_from_embeddings(
-    embeddings: List[List[float]], n_components=2, **kwargs
-) -> np.ndarray:
-    """Returns t-SNE components of a list of embeddings."""
-    # use better defaults if not specified
-    if "init" not in kwargs.keys():
-        kwargs["init"] = "pca"
-    if "learning_rate" not in kwargs.keys():
-        kwargs["learning_rate"] = "auto"
-    tsne = TSNE(n_components=n_components, **kwargs)
-    array_of_embeddings = np.array(embeddings)
-    return tsne.fit_transform(array_of_embeddings)
+    def __init__(self, embeddings, normalized: bool = False):
+        if normalized:
+            self.vectors = np.asarray(embeddings, dtype=np.float32)
+        else:
+            self.vectors = normalize_embeddings(embeddings)
+        self.partitions: dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def add_partition(self, name: str, rows):
+        """
+        Name a subset of rows (e.g. the tokens on one chain). Its vectors are
+        gathered when it is searched, so they are not held twice in memory.
+        """
+        self.partitions[name] = np.asarray(rows, dtype=np.intp)
+
+    def scores(self, query_embedding, rows: np.ndarray | None = None) -> np.ndarray:
+        """
+        Cosine similarity of the query against all vectors, or only the given rows
+        """
+        query = normalize_embeddings(query_embedding)
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        return vectors @ query
+
+    def search(
+        self,
+        query_embedding,
+        top_k: int = 5,
+        rows: np.ndarray | None = None,
+        partition: str | None = None,
+    ) -> list[tuple[int, float]]:
+        """
+        Get the top_k most similar rows as (row index, score) pairs, best first.
+        The search can be restricted to the given rows or to a named partition.
+        """
+        if partition is not None:
+            rows = self.partitions[partition]
+        scores = self.scores(query_embedding, rows)
+        winners = top_k_indices(scores, top_k)
+        if rows is None:
+            return [(int(i), float(scores[i])) for i in winners]
+        rows = np.asarray(rows)
+        return [(int(rows[i]), float(scores[i])) for i in winners]
+
+    def search_many(
+        self,
+        query_embeddings,
+        top_k: int = 5,
+        rows: np.ndarray | None = None,
+        partition: str | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        """
+        Batch version of search: the queries are scored with a single
+        matrix-matrix product, and the top_k matches of each query returned
+        """
+        if len(query_embeddings) == 0:
+            return []
+        queries = normalize_embeddings(query_embeddings)
+        if partition is not None:
+            rows = self.partitions[partition]
+        if rows is not None:
+            rows = np.asarray(rows)
+            vectors = self.vectors[rows]
+        else:
+            vectors = self.vectors
+        results = []
+        for scores in queries @ vectors.T:
+            winners = top_k_indices(scores, top_k)
+            if rows is None:
+                results.append([(int(i), float(scores[i])) for i in winners])
+            else:
+                results.append([(int(rows[i]), float(scores[i])) for i in winners])
+        return results
 
 
 def convert_to_numpy_array(embedding: str) -> np.ndarray:
@@ -0,0 +1,630 @@
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Hashable
+import numpy as np
+from web3 import Web3
+
+from web3_utils.ens_utils import get_default_resolver, normalize_ens_name
+from web3_utils.erc20_utils import ERC20Utils
+from .action_utils import get_supported_actions, protocol_query, suggested_address
+from .async_action_utils import AsyncActionResolver, aevaluate_response
+from .cmc_utils import TOKEN_MAP_PATH, read_token_map
+from .embedding_cache import EmbeddingCache, set_default_cache
+from .embedding_store import (
+    EmbeddingStore,
+    build_chain_partitions,
+    dataframe_to_records,
+    parse_network_to_contract,
+)
+from .index_registry import get_protocol_searcher, get_token_searcher, warm_up
+from .lexical_index import tokenize
+from .protocol_searcher import ProtocolSearcher
+from .token_searcher import TokenSearcher
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Seconds a batch waits for more items after its first one
+DEFAULT_MAX_WAIT = 0.005
+DEFAULT_MAX_BATCH_SIZE = 64
+# Dimensions of the offline stand-in embeddings
+STANDIN_DIM = 256
+# The stand-in embeddings of a query and a protocol sharing a few terms are
+# less similar than their text-embedding-3-small embeddings
+STANDIN_MIN_SCORE = 0.3
+PROTOCOL_DATA_PATH = "data/protocol.json"
+FINE_TUNING_DATA_PATH = "data/fine-tuning"
+MAX_BODY_SIZE = 1 << 20
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class MicroBatcher:
+    """
+    Merges the items submitted by concurrent requests into batches.
+    A batch is processed when max_size distinct items are waiting, or max_wait
+    seconds after its first item was submitted. process gets the list of items
+    and returns one result per item (an exception instance fails that item);
+    it runs in a worker thread so the event loop keeps accepting requests.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[list], list],
+        max_wait: float = DEFAULT_MAX_WAIT,
+        max_size: int = DEFAULT_MAX_BATCH_SIZE,
+    ):
+        self.process = process
+        self.max_wait = max_wait
+        self.max_size = max_size
+        self.batches = 0
+        self.items = 0
+        # item -> future of its result, for the batch being collected
+        self._pending: dict[Hashable, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item: Hashable):
+        """
+        Get the result of an item, processed with the items submitted around
+        the same time. Equal items of a batch are processed once.
+        """
+        future = self._pending.get(item)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[item] = future
+            if len(self._pending) >= self.max_size:
+                self.flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self.flush)
+        # A cancelled request must not cancel the result other requests share
+        return await asyncio.shield(future)
+
+    def flush(self):
+        """
+        Process the waiting items now
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            task = asyncio.ensure_future(self._run(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    async def _run(self, pending: dict[Hashable, asyncio.Future]):
+        self.batches += 1
+        self.items += len(pending)
+        items = list(pending)
+        try:
+            results = list(await asyncio.to_thread(self.process, items))
+            if len(results) != len(items):
+                raise ValueError(
+                    f"Expected {len(items)} results from the batch, got {len(results)}"
+                )
+        except Exception as e:
+            results = [e] * len(items)
+        for future, result in zip(pending.values(), results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class ServiceResolver(AsyncActionResolver):
+    """
+    An AsyncActionResolver for one request of the service.
+    Its token searches, protocol searches and ENS lookups go through the
+    service's batchers, and the supported actions and ERC20 utils are shared.
+    """
+
+    def __init__(
+        self, service: "EvaluationService", timeouts: dict[str, float] | None = None
+    ):
+        super().__init__(timeouts)
+        self.service = service
+
+    async def aresolve_ens(self, name: str) -> str | None:
+        return await self._acached(
+            ("ens", name), "receiver", self.service.ens_batcher.submit, name
+        )
+
+    async def aresolve_protocol(self, action: str, token: str, chain: str):
+        return await self._acached(
+            ("protocol", action, token, chain),
+            "receiver",
+            self.service.aresolve_protocol,
+            action,
+            token,
+            chain,
+        )
+
+    async def asearch_token(self, token: str, chain: str) -> dict:
+        return await self._acached(
+            ("token", token, chain),
+            "token",
+            self.service.token_batcher.submit,
+            (token, chain),
+        )
+
+    def get_supported_actions(self) -> dict[str, str]:
+        return self.service.supported_actions
+
+    def get_erc20_utils(self) -> ERC20Utils:
+        return self.service.erc20_utils
+
+
+class EvaluationService:
+    """
+    Evaluates generated responses with indexes and clients loaded once.
+    The token searches, protocol searches and ENS lookups of concurrent
+    requests are merged into micro-batches, so one embedding request or one
+    round of RPC calls serves all the requests of a wait window.
+    """
+
+    def __init__(
+        self,
+        token_searcher: TokenSearcher,
+        protocol_searcher: ProtocolSearcher,
+        ens_resolver,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        timeouts: dict[str, float] | None = None,
+    ):
+        """
+        ens_resolver: anything with the resolve and resolve_many methods of
+        web3_utils.ens_utils.EnsResolver.
+        """
+        self.token_searcher = token_searcher
+        self.protocol_searcher = protocol_searcher
+        self.ens_resolver = ens_resolver
+        self.timeouts = timeouts
+        self.supported_actions = get_supported_actions()
+        self.erc20_utils = ERC20Utils()
+        self.requests = 0
+        self.token_batcher = MicroBatcher(self._search_tokens, max_wait, max_batch_size)
+        self.protocol_batcher = MicroBatcher(
+            protocol_searcher.search_protocols, max_wait, max_batch_size
+        )
+        self.ens_batcher = MicroBatcher(self._resolve_ens, max_wait, max_batch_size)
+
+    @classmethod
+    def create(
+        cls,
+        offline: bool = False,
+        latency: float = 0.0,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        timeouts: dict[str, float] | None = None,
+    ) -> "EvaluationService":
+        """
+        Load everything the service needs. Offline, the embeddings and the ENS
+        lookups are computed by stand-ins which take latency seconds per batch,
+        and the catalogs are embedded with them at start-up.
+        """
+        if offline:
+            token_searcher, protocol_searcher, ens_resolver = create_standins(latency)
+        else:
+            warm_up()
+            token_searcher = get_token_searcher()
+            protocol_searcher = get_protocol_searcher()
+            ens_resolver = get_default_resolver()
+        return cls(
+            token_searcher,
+            protocol_searcher,
+            ens_resolver,
+            max_wait=max_wait,
+            max_batch_size=max_batch_size,
+            timeouts=timeouts,
+        )
+
+    async def evaluate(self, response: str) -> list[str]:
+        """
+        Evaluate a generated response, like action_utils.evaluate_response
+        """
+        self.requests += 1
+        return await aevaluate_response(response, ServiceResolver(self, self.timeouts))
+
+    async def aresolve_protocol(self, action: str, token: str, chain: str):
+        result = await self.protocol_batcher.submit(
+            protocol_query(action, token, chain)
+        )
+        return suggested_address(result)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "tokens": self.token_batcher.stats(),
+            "protocols": self.protocol_batcher.stats(),
+            "ens": self.ens_batcher.stats(),
+        }
+
+    def _search_tokens(self, items: list[tuple[str, str]]) -> list[dict]:
+        tokens = [token for token, _ in items]
+        chains = [chain for _, chain in items]
+        return self.token_searcher.search_tokens(tokens, chains)
+
+    def _resolve_ens(self, names: list[str]) -> list:
+        try:
+            addresses = self.ens_resolver.resolve_many(names)
+            return [addresses[name] for name in names]
+        except Exception:
+            # EnsResolver reports failures per name; other resolvers may fail
+            # the whole batch, so find the names which fail
+            return [self._try_resolve_ens(name) for name in names]
+
+    def _try_resolve_ens(self, name: str):
+        try:
+            return self.ens_resolver.resolve(name)
+        except Exception as e:
+            return e
+
+
+def standin_embedding(text: str, dim: int = STANDIN_DIM) -> list[float]:
+    """
+    Offline stand-in for an embedding: the terms of the text hashed into dim
+    signed buckets, normalized. Texts sharing terms get similar vectors.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for term in tokenize(text):
+        digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = norm = 1.0
+    return (vector / norm).tolist()
+
+
+class StandInEnsResolver:
+    """
+    Offline stand-in for EnsResolver. Every name resolves to an address derived
+    from its hash, after latency seconds per call.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def resolve(self, name: str) -> str | None:
+        return self.resolve_many([name])[name]
+
+    def resolve_many(self, names: list[str]) -> dict[str, str | None]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return {name: self._address(name) for name in names}
+
+    @staticmethod
+    def _address(name: str) -> str:
+        digest = hashlib.sha256(normalize_ens_name(name).encode("utf-8")).hexdigest()
+        return Web3.to_checksum_address("0x" + digest[:40])
+
+
+def create_standins(
+    latency: float = 0.0,
+    token_map_path: str = TOKEN_MAP_PATH,
+    protocol_data_path: str = PROTOCOL_DATA_PATH,
+) -> tuple[TokenSearcher, ProtocolSearcher, StandInEnsResolver]:
+    """
+    Searchers and an ENS resolver which work without network access.
+    The process-wide embedding cache is replaced by an in-memory one which
+    embeds with standin_embedding, and the token and protocol catalogs are
+    embedded the same way.
+    """
+
+    def embed(text: str, model: str | None = None) -> list[float]:
+        time.sleep(latency)
+        return standin_embedding(text)
+
+    def embed_many(texts: list[str], model: str | None = None) -> list[list[float]]:
+        time.sleep(latency)
+        return [standin_embedding(text) for text in texts]
+
+    set_default_cache(EmbeddingCache(path=None, embed=embed, embed_many=embed_many))
+    token_searcher, protocol_searcher = create_standin_searchers(
+        token_map_path=token_map_path, protocol_data_path=protocol_data_path
+    )
+    return token_searcher, protocol_searcher, StandInEnsResolver(latency)
+
+
+def create_standin_searchers(
+    dim: int = STANDIN_DIM,
+    token_map_path: str = TOKEN_MAP_PATH,
+    protocol_data_path: str = PROTOCOL_DATA_PATH,
+) -> tuple[TokenSearcher, ProtocolSearcher]:
+    """
+    Searchers over the token and protocol catalogs embedded with
+    standin_embedding, in dim dimensions. Their queries are embedded through
+    the process-wide embedding cache.
+    """
+    tokens = read_token_map(token_map_path)
+    tokens["network_to_contract"] = tokens["network_to_contract"].apply(
+        parse_network_to_contract
+    )
+    records = dataframe_to_records(tokens)
+    token_store = EmbeddingStore(
+        _embed_records(records, lambda record: str(record["description"]), dim),
+        records,
+        partitions=build_chain_partitions(records),
+        normalized=True,
+    )
+
+    with open(protocol_data_path, "r") as file:
+        protocols = json.load(file)
+    protocol_store = EmbeddingStore(
+        # Protocols are embedded with all their values, like protocol_setup_utils
+        _embed_records(
+            protocols, lambda record: ", ".join(str(v) for v in record.values()), dim
+        ),
+        protocols,
+        normalized=True,
+    )
+
+    token_searcher = TokenSearcher(store=token_store)
+    token_searcher.load()
+    protocol_searcher = ProtocolSearcher(store=protocol_store)
+    protocol_searcher.MIN_SCORE = STANDIN_MIN_SCORE
+    protocol_searcher.load()
+    return token_searcher, protocol_searcher
+
+
+def _embed_records(records: list[dict], get_text, dim: int) -> np.ndarray:
+    return np.array(
+        [standin_embedding(get_text(record), dim) for record in records],
+        dtype=np.float32,
+    ).reshape(len(records), dim)
+
+
+async def start_server(
+    service: EvaluationService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
+) -> asyncio.Server:
+    """
+    Serve the evaluation service over HTTP/JSON:
+        GET /health
+        GET /stats
+        POST /evaluate {"response": "<generated response>"}
+            -> {"results": [<evaluated action>, ...]}
+    One request is served per connection.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            status, payload = await _handle_request(service, reader)
+        except (ValueError, asyncio.IncompleteReadError):
+            status, payload = 400, {"error": "Malformed HTTP request"}
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        try:
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def _handle_request(
+    service: EvaluationService, reader: asyncio.StreamReader
+) -> tuple[int, dict]:
+    method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_SIZE:
+        return 413, {"error": "Request body is too large"}
+    body = await reader.readexactly(length)
+
+    match path:
+        case "/health":
+            if method != "GET":
+                return 405, {"error": f"{method} is not allowed"}
+            return 200, {"status": "ok"}
+        case "/stats":
+            if method != "GET":
+                return 405, {"error": f"{method} is not allowed"}
+            return 200, service.stats()
+        case "/evaluate":
+            if method != "POST":
+                return 405, {"error": f"{method} is not allowed"}
+            return await _evaluate(service, body)
+        case _:
+            return 404, {"error": f"Not found: {path}"}
+
+
+async def _evaluate(service: EvaluationService, body: bytes) -> tuple[int, dict]:
+    try:
+        response = json.loads(body)["response"]
+        if not isinstance(response, str):
+            raise TypeError("response must be a string")
+        results = await service.evaluate(response)
+    except (ValueError, KeyError, TypeError) as e:
+        return 400, {"error": f"Invalid request: {e!r}"}
+    except Exception as e:
+        return 500, {"error": str(e)}
+    return 200, {"results": [json.loads(result) for result in results]}
+
+
+async def request_json(
+    host: str, port: int, method: str, path: str, payload: dict | None = None
+) -> tuple[int, dict]:
+    """
+    Send a request to the service and get its status code and JSON body
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    head = (
+        f"{method} {path} HTTP/1.1\r\n"
+        f"Host: {host}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    try:
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+        data = await reader.read()
+    finally:
+        writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), json.loads(body)
+
+
+def load_sample_responses(directory: str = FINE_TUNING_DATA_PATH) -> list[str]:
+    """
+    Get the transfer and approve completions of the fine-tuning data as
+    generated responses
+    """
+    responses = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "r") as file:
+            for entry in json.load(file):
+                completion = entry.get("completion")
+                if isinstance(completion, list) and all(
+                    isinstance(item, dict)
+                    and item.get("action") in ("transfer", "approve")
+                    for item in completion
+                ):
+                    responses.append(json.dumps(completion))
+    return responses
+
+
+async def run_load_test(
+    host: str,
+    port: int,
+    responses: list[str],
+    total: int,
+    concurrency: int = 32,
+) -> dict:
+    """
+    Send total evaluation requests with concurrency requests in flight and
+    measure the throughput and latencies
+    """
+    latencies = []
+    errors = 0
+    next_request = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in next_request:
+            start = time.perf_counter()
+            status, _ = await request_json(
+                host,
+                port,
+                "POST",
+                "/evaluate",
+                {"response": responses[i % len(responses)]},
+            )
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": total,
+        "errors": errors,
+        "seconds": elapsed,
+        "requests_per_second": total / elapsed if elapsed else 0.0,
+        "p50_ms": float(np.percentile(latencies_ms, 50)) if total else 0.0,
+        "p95_ms": float(np.percentile(latencies_ms, 95)) if total else 0.0,
+    }
+
+
+async def _main(args):
+    service = EvaluationService.create(
+        offline=args.offline,
+        latency=args.latency_ms / 1000,
+        max_wait=args.max_wait_ms / 1000,
+        max_batch_size=args.max_batch_size,
+    )
+    server = await start_server(service, args.host, args.port)
+    host, port = server.sockets[0].getsockname()[:2]
+    if not args.load_test:
+        print(f"Serving on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+        return
+
+    async with server:
+        report = await run_load_test(
+            host, port, load_sample_responses(), args.load_test, args.concurrency
+        )
+    print(
+        f"{report['requests']} requests ({report['errors']} errors) in "
+        f"{report['seconds']:.2f}s: {report['requests_per_second']:.1f} requests/s, "
+        f"p50 {report['p50_ms']:.1f} ms, p95 {report['p95_ms']:.1f} ms"
+    )
+    for stage in ("tokens", "protocols", "ens"):
+        stats = service.stats()[stage]
+        print(
+            f"{stage}: {stats['items']} items in {stats['batches']} batches "
+            f"(mean {stats['mean_batch_size']:.1f})"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Serve evaluate_response over HTTP with warm indexes, "
+        "merging concurrent lookups into micro-batches."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT * 1000)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Use stand-in embeddings and ENS lookups instead of the APIs",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0.0,
+        help="Simulated latency of an offline embedding or ENS batch",
+    )
+    parser.add_argument(
+        "--load-test",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Send N requests from the fine-tuning data, report and exit",
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    asyncio.run(_main(args))
@@ -0,0 +1,89 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULE = "utils.action_utils"
+# Modules the evaluation path must not import
+HEAVY_MODULES = ("matplotlib", "scipy", "sklearn", "openai", "pandas")
+# Seconds; the import took about 4.3s when it loaded the analysis helpers
+DEFAULT_BUDGET = 2.5
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "heavy": heavy}}))
+"""
+
+
+def measure_import(module: str = DEFAULT_MODULE) -> dict:
+    """
+    Import a module in a fresh interpreter, without API keys in the
+    environment, and get the seconds it took and the heavy modules it loaded
+    """
+    code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key not in ("OPENAI_API_KEY", "CMC_API_KEY")
+    }
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark(module: str = DEFAULT_MODULE, runs: int = 5) -> dict:
+    """
+    Measure the cold import of a module several times
+    """
+    results = [measure_import(module) for _ in range(runs)]
+    seconds = [result["seconds"] for result in results]
+    return {
+        "module": module,
+        "runs": runs,
+        "median_seconds": statistics.median(seconds),
+        "min_seconds": min(seconds),
+        "max_seconds": max(seconds),
+        "heavy": results[-1]["heavy"],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the cold import time of the evaluation path."
+    )
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET,
+        help="Fail if the median import takes longer than this many seconds",
+    )
+    args = parser.parse_args()
+
+    report = benchmark(args.module, args.runs)
+    print(
+        f"import {report['module']}: median {report['median_seconds']:.3f}s "
+        f"(min {report['min_seconds']:.3f}s, max {report['max_seconds']:.3f}s, "
+        f"{report['runs']} runs)"
+    )
+    failed = False
+    if report["heavy"]:
+        print(f"Heavy modules imported: {', '.join(report['heavy'])}")
+        failed = True
+    if report["median_seconds"] > args.budget:
+        print(f"Slower than the budget of {args.budget:.2f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
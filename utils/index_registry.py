@@ -0,0 +1,105 @@
+import threading
+from .data_utils import DataUtils
+from .token_searcher import TokenSearcher
+from .protocol_searcher import ProtocolSearcher
+
+
+class IndexRegistry:
+    """
+    Process-wide holder of the loaded searchers and network list.
+    Everything is loaded once, on first use or by warm_up(), and shared by all threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data_utils: DataUtils | None = None
+        self._token_searcher: TokenSearcher | None = None
+        self._protocol_searcher: ProtocolSearcher | None = None
+
+    def get_data_utils(self) -> DataUtils:
+        data_utils = self._data_utils
+        if data_utils is None:
+            with self._lock:
+                data_utils = self._load_data_utils()
+        return data_utils
+
+    def get_token_searcher(self) -> TokenSearcher:
+        token_searcher = self._token_searcher
+        if token_searcher is None:
+            with self._lock:
+                token_searcher = self._load_token_searcher()
+        return token_searcher
+
+    def get_protocol_searcher(self) -> ProtocolSearcher:
+        protocol_searcher = self._protocol_searcher
+        if protocol_searcher is None:
+            with self._lock:
+                protocol_searcher = self._load_protocol_searcher()
+        return protocol_searcher
+
+    def warm_up(self):
+        """
+        Load the network list, token catalog and protocol catalog now instead of on
+        the first request
+        """
+        with self._lock:
+            self._load_data_utils()
+            self._load_token_searcher()
+            self._load_protocol_searcher()
+
+    def reset(self):
+        """
+        Drop the loaded indexes, e.g. after the embedding stores were rebuilt
+        """
+        with self._lock:
+            self._data_utils = None
+            self._token_searcher = None
+            self._protocol_searcher = None
+
+    # The _load_* methods must be called with the lock held
+    def _load_data_utils(self) -> DataUtils:
+        if self._data_utils is None:
+            data_utils = DataUtils()
+            data_utils.load()
+            self._data_utils = data_utils
+        return self._data_utils
+
+    def _load_token_searcher(self) -> TokenSearcher:
+        if self._token_searcher is None:
+            token_searcher = TokenSearcher(self._load_data_utils())
+            token_searcher.load()
+            self._token_searcher = token_searcher
+        return self._token_searcher
+
+    def _load_protocol_searcher(self) -> ProtocolSearcher:
+        if self._protocol_searcher is None:
+            protocol_searcher = ProtocolSearcher()
+            protocol_searcher.load()
+            self._protocol_searcher = protocol_searcher
+        return self._protocol_searcher
+
+
+_registry = IndexRegistry()
+
+
+def get_registry() -> IndexRegistry:
+    return _registry
+
+
+def get_data_utils() -> DataUtils:
+    return _registry.get_data_utils()
+
+
+def get_token_searcher() -> TokenSearcher:
+    return _registry.get_token_searcher()
+
+
+def get_protocol_searcher() -> ProtocolSearcher:
+    return _registry.get_protocol_searcher()
+
+
+def warm_up():
+    """
+    Load all shared indexes. Call this at service start-up.
+    """
+    _registry.warm_up()
@@ -0,0 +1,153 @@
+import math
+import re
+from collections import defaultdict
+import numpy as np
+
+from .embeddings_utils import top_k_indices
+
+K1 = 1.2
+B = 0.75
+# A lexical match is trusted when it covers every query term and beats the
+# runner-up by this factor
+CONFIDENCE_RATIO = 1.5
+# Weight of the scaled lexical score when fused with the cosine similarity
+LEXICAL_WEIGHT = 0.3
+# Field weights of the catalog records
+TOKEN_FIELDS = {"symbol": 3.0, "name": 3.0, "description": 1.0}
+PROTOCOL_FIELDS = {"protocol": 3.0, "id": 2.0, "chain": 1.0, "description": 1.0}
+
+_TERM = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text) -> list[str]:
+    if not isinstance(text, str):
+        return []
+    return _TERM.findall(text.lower())
+
+
+class BM25Index:
+    """
+    BM25 index over the text fields of catalog records.
+    A term occurring in a field counts as the field's weight, so a symbol or
+    protocol name outweighs a mention in a description. The per-row impact of
+    every term is precomputed; scoring a query only adds up its terms' postings.
+    """
+
+    def __init__(
+        self,
+        records: list[dict],
+        fields: dict[str, float],
+        k1: float = K1,
+        b: float = B,
+    ):
+        n = len(records)
+        self.size = n
+        # term -> row -> weighted term frequency, rows in increasing order
+        term_freqs: dict[str, dict[int, float]] = defaultdict(dict)
+        lengths = np.zeros(n, dtype=np.float32)
+        for i, record in enumerate(records):
+            for field, weight in fields.items():
+                terms = tokenize(record.get(field))
+                lengths[i] += weight * len(terms)
+                for term in terms:
+                    term_freqs[term][i] = term_freqs[term].get(i, 0.0) + weight
+
+        average_length = lengths.mean() if n and lengths.mean() > 0 else 1.0
+        length_norms = k1 * (1 - b + b * lengths / average_length)
+        # term -> (rows, impacts)
+        self.postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for term, freqs in term_freqs.items():
+            rows = np.fromiter(freqs.keys(), dtype=np.intp, count=len(freqs))
+            tf = np.fromiter(freqs.values(), dtype=np.float32, count=len(freqs))
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            impacts = idf * tf * (k1 + 1) / (tf + length_norms[rows])
+            self.postings[term] = (rows, impacts.astype(np.float32))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def search(
+        self, query: str, top_k: int = 5, allowed: np.ndarray | None = None
+    ) -> list[tuple[int, float]]:
+        """
+        Get the top_k rows matching any query term as (row index, score) pairs,
+        best first. allowed is a boolean mask of the rows which may be returned.
+        """
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                rows, impacts = posting
+                scores[rows] += impacts
+        if allowed is not None:
+            scores[~allowed] = 0
+        matched = np.flatnonzero(scores > 0)
+        matched_scores = scores[matched]
+        return [
+            (int(matched[i]), float(matched_scores[i]))
+            for i in top_k_indices(matched_scores, top_k)
+        ]
+
+    def is_confident(self, query: str, matches: list[tuple[int, float]]) -> bool:
+        """
+        Whether the best match can be trusted without a semantic search: it
+        contains every query term and clearly beats the runner-up
+        """
+        if not matches:
+            return False
+        top_row, top_score = matches[0]
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                return False
+            rows = posting[0]
+            i = np.searchsorted(rows, top_row)
+            if i == len(rows) or rows[i] != top_row:
+                return False
+        return len(matches) == 1 or top_score >= CONFIDENCE_RATIO * matches[1][1]
+
+
+def scale_scores(matches: list[tuple[int, float]]) -> list[tuple[int, float]]:
+    """
+    Scale lexical scores so the best match scores 1
+    """
+    best = max((score for _, score in matches), default=0.0) or 1.0
+    return [(row, score / best) for row, score in matches]
+
+
+def fuse_scores(
+    semantic: list[tuple[int, float]],
+    lexical: list[tuple[int, float]],
+    weight: float = LEXICAL_WEIGHT,
+) -> list[tuple[int, float]]:
+    """
+    Combine the cosine similarities of the candidate rows with their scaled
+    lexical scores (0 for rows without a lexical match), best first
+    """
+    lexical_scores = dict(scale_scores(lexical))
+    fused = [
+        (row, (1 - weight) * score + weight * lexical_scores.get(row, 0.0))
+        for row, score in semantic
+    ]
+    fused.sort(key=lambda match: (-match[1], match[0]))
+    return fused
+
+
+def fuse_search(
+    engine,
+    query_embedding,
+    semantic: list[tuple[int, float]],
+    lexical: list[tuple[int, float]],
+    top_k: int = 5,
+) -> list[tuple[int, float]]:
+    """
+    Fuse the semantic and the lexical matches of a query. The rows found by the
+    lexical search only are scored with the embedding search engine first.
+    The fused scores only order the rows; each is returned with its cosine
+    similarity, so score thresholds keep their meaning.
+    """
+    rows = sorted({row for row, _ in semantic} | {row for row, _ in lexical})
+    rows = np.asarray(rows, dtype=np.intp)
+    semantic = engine.search(query_embedding, len(rows), rows=rows)
+    cosine = dict(semantic)
+    return [(row, cosine[row]) for row, _ in fuse_scores(semantic, lexical)[:top_k]]
@@ -1,55 +1,170 @@
-import ast
-import pandas as pd
-import numpy as np
-from .embeddings_utils import get_embedding, cosine_similarity
+from .compact_index import CompactSearchEngine, get_compact_path, load_or_build_compact
+from .embeddings_utils import EmbeddingSearchEngine
+from .embedding_cache import (
+    aget_cached_embedding,
+    get_cached_embedding,
+    get_cached_embeddings,
+)
+from .embedding_store import (
+    PROTOCOL_STORE,
+    STORE_DIR,
+    EmbeddingStore,
+    load_embedding_store,
+)
+from .lexical_index import PROTOCOL_FIELDS, BM25Index, fuse_search, scale_scores
 
 
 class ProtocolSearcher:
 
     EMBEDDING_MODEL = "text-embedding-3-small"
+    # For demo, no protocol is suggested below this cosine similarity
+    # The threshold is only used for text-embedding-3-small model and may not be applicable to other models
+    MIN_SCORE = 0.5
+
+    def __init__(
+        self,
+        compact: str | None = None,
+        compact_dims: int | None = None,
+        lexical: bool = True,
+        store: EmbeddingStore | None = None,
+    ):
+        """
+        store: search this protocol store instead of the saved one.
+        lexical: answer from a BM25 index when it is confident, without embedding
+        the query, scoring its matches relative to the best one; otherwise its
+        matches are fused with the embedding search to order the results, and
+        the reported scores are cosine similarities.
+        compact: score the protocols with float16 or int8 vectors, optionally
+        truncated to compact_dims dimensions, and re-rank the best candidates
+        with the full-precision embeddings.
+        """
+        self.compact = compact
+        self.compact_dims = compact_dims
+        self.lexical = lexical
+        self._store: EmbeddingStore | None = store
+        self._engine: EmbeddingSearchEngine | CompactSearchEngine | None = None
+        self._lexical_index: BM25Index | None = None
 
     def search_protocol(self, query: str) -> dict | None:
+        lexical = self._search_lexical(query)
+        if self._is_confident(query, lexical):
+            return self._to_search_result(self._to_cases(scale_scores(lexical)))
+        query_embedding = get_cached_embedding(query, self.EMBEDDING_MODEL)
+        return self._to_search_result(self._rank(query_embedding, lexical))
+
+    async def asearch_protocol(self, query: str) -> dict | None:
+        """
+        Async version of search_protocol, embedding the query with the async client
+        """
+        lexical = self._search_lexical(query)
+        if self._is_confident(query, lexical):
+            return self._to_search_result(self._to_cases(scale_scores(lexical)))
+        query_embedding = await aget_cached_embedding(query, self.EMBEDDING_MODEL)
+        return self._to_search_result(self._rank(query_embedding, lexical))
+
+    def search_protocols(self, queries: list[str]) -> list[dict | None]:
+        """
+        Batch version of search_protocol. The queries which need an embedding
+        search are embedded with one request and scored with one matrix product.
+        """
+        lexical = [self._search_lexical(query) for query in queries]
+        results: list[dict | None] = [None] * len(queries)
+        pending = []
+        for i, query in enumerate(queries):
+            if self._is_confident(query, lexical[i]):
+                cases = self._to_cases(scale_scores(lexical[i]))
+                results[i] = self._to_search_result(cases)
+            else:
+                pending.append(i)
+
+        embeddings = get_cached_embeddings(
+            [queries[i] for i in pending], self.EMBEDDING_MODEL
+        )
+        engine = self._get_engine()
+        for i, query_embedding, matches in zip(
+            pending, embeddings, engine.search_many(embeddings, 5)
+        ):
+            if lexical[i]:
+                matches = fuse_search(engine, query_embedding, matches, lexical[i], 5)
+            results[i] = self._to_search_result(self._to_cases(matches))
+        return results
+
+    def _to_search_result(self, top_cases) -> dict | None:
         search_result = [
             {"score": score, "id": id, "address": address}
-            for score, id, address in self._search_embeddings(query)
+            for score, id, address in top_cases
         ]
 
-        suggested_protocol = search_result[0]
-        other_options = search_result[1:]
-
         result = dict()
-        # For demo, return None if the highest score is less than 0.5
-        # The threshold is only used for text-embedding-3-small model and may not be applicable to other models
-        if suggested_protocol["score"] < 0.5:
+        # Suggest the best ranked protocol whose score passes the threshold
+        passing = [
+            i for i, case in enumerate(search_result) if case["score"] >= self.MIN_SCORE
+        ]
+        if not passing:
             return None
 
+        suggested_protocol = search_result.pop(passing[0])
+        other_options = search_result
+
         result["suggested"] = suggested_protocol
         result["other_options"] = other_options
         return result
 
-    def _search_embeddings(self, query):
-        top_n = 5
-        df = pd.read_csv("processed/embeddings/protocol.csv")
-        # Convert the 'embedding' column to a column of NumPy arrays
-        df["embedding"] = df["embedding"].apply(self._convert_to_numpy_array)
-
-        query_embedding = get_embedding(text=query, model=self.EMBEDDING_MODEL)
-
-        def calculate_similarity(row):
-            return (
-                cosine_similarity(query_embedding, row["embedding"]),
-                row["id"],
-                row["address"],
-            )
-
-        protocol_to_score_list = [calculate_similarity(row) for _, row in df.iterrows()]
-        protocol_to_score_list.sort(key=lambda x: x[0], reverse=True)
-        top_cases = protocol_to_score_list[:top_n]
-        return top_cases
-
-    def _convert_to_numpy_array(self, embedding):
-        if isinstance(embedding, str):
-            embedding = ast.literal_eval(
-                embedding
-            )  # Convert string representation of list to actual list
-        return np.array(embedding)
+    def _search_lexical(self, query: str, top_n: int = 5) -> list[tuple[int, float]]:
+        if not self.lexical:
+            return []
+        return self._get_lexical_index().search(query, top_n)
+
+    def _is_confident(self, query: str, lexical: list[tuple[int, float]]) -> bool:
+        return bool(lexical) and self._get_lexical_index().is_confident(query, lexical)
+
+    def _rank(self, query_embedding, lexical=(), top_n: int = 5):
+        engine = self._get_engine()
+        matches = engine.search(query_embedding, top_n)
+        if lexical:
+            matches = fuse_search(engine, query_embedding, matches, lexical, top_n)
+        return self._to_cases(matches)
+
+    def _to_cases(self, matches):
+        store = self._load_store()
+        return [
+            (score, store.records[i]["id"], store.records[i]["address"])
+            for i, score in matches
+        ]
+
+    def load(self):
+        """
+        Load the protocol catalog and build the search engine ahead of the first query
+        """
+        self._get_engine()
+        if self.lexical:
+            self._get_lexical_index()
+
+    def _load_store(self) -> EmbeddingStore:
+        if self._store is None:
+            self._store = load_embedding_store(PROTOCOL_STORE)
+        return self._store
+
+    def _get_engine(self) -> EmbeddingSearchEngine | CompactSearchEngine:
+        if self._engine is None:
+            store = self._load_store()
+            matrix = store.matrix
+            if self.compact is not None:
+                compact = load_or_build_compact(
+                    get_compact_path(
+                        PROTOCOL_STORE, STORE_DIR, self.compact, self.compact_dims
+                    ),
+                    matrix,
+                    self.compact,
+                    self.compact_dims,
+                    store.digest,
+                )
+                self._engine = CompactSearchEngine(matrix, compact)
+            else:
+                self._engine = EmbeddingSearchEngine(matrix, store.normalized)
+        return self._engine
+
+    def _get_lexical_index(self) -> BM25Index:
+        if self._lexical_index is None:
+            self._lexical_index = BM25Index(self._load_store().records, PROTOCOL_FIELDS)
+        return self._lexical_index
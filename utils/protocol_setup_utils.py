@@ -1,17 +1,20 @@
-import os
 import csv
 import json
-from matplotlib.pyplot import get
 import pandas as pd
-from openai import OpenAI
-from .embeddings_utils import get_embeddings
+from .embedding_batches import embed_texts
+from .embedding_store import (
+    PROTOCOL_STORE,
+    build_embeddings,
+    dataframe_to_records,
+    load_previous_store,
+    save_embedding_store,
+)
 
 EMBEDDING_MODEL = "text-embedding-3-small"
 # EMBEDDING_MODEL = "text-embedding-ada-002"
 RAW_DATA_INPUT_PATH = "data/protocol.json"
-EMBEDDINGS_OUTPUT_PATH = "processed/embeddings/protocol.csv"
-
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+# Not the legacy protocol.csv, which has an embedding column
+TEXT_OUTPUT_PATH = "processed/embeddings/protocol_text.csv"
 
 
 def json_to_csv(json_file_path, csv_file_path):
@@ -45,14 +48,27 @@ def remove_newlines(serie):
 
 if __name__ == "__main__":
     # Load the data
-    json_to_csv(RAW_DATA_INPUT_PATH, EMBEDDINGS_OUTPUT_PATH)
-    df = pd.read_csv(EMBEDDINGS_OUTPUT_PATH)
+    json_to_csv(RAW_DATA_INPUT_PATH, TEXT_OUTPUT_PATH)
+    df = pd.read_csv(TEXT_OUTPUT_PATH)
 
     # Create embeddings
     df["text"] = remove_newlines(df["text"])
     text_list = df["text"].tolist()
     print("Getting embeddings...", end="", flush=True)
-    df["embedding"] = get_embeddings(text_list, model=EMBEDDING_MODEL)
+    # Only new or changed protocols are embedded
+    embeddings, hashes, stats = build_embeddings(
+        text_list,
+        EMBEDDING_MODEL,
+        lambda batch: embed_texts(batch, model=EMBEDDING_MODEL),
+        previous=load_previous_store(PROTOCOL_STORE, EMBEDDING_MODEL),
+    )
+    print(f"{stats['reused']} reused, {stats['recomputed']} recomputed.", end=" ")
     # Save the embeddings
-    df.to_csv(EMBEDDINGS_OUTPUT_PATH)
-    print("Done. Saved to", EMBEDDINGS_OUTPUT_PATH)
+    output_path = save_embedding_store(
+        PROTOCOL_STORE,
+        embeddings,
+        dataframe_to_records(df.drop(columns=["text"])),
+        model=EMBEDDING_MODEL,
+        hashes=hashes,
+    )
+    print("Done. Saved to", output_path)
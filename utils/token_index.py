@@ -0,0 +1,118 @@
+from collections import defaultdict
+
+# Match tiers, best first
+EXACT_ADDRESS = 0
+EXACT_SYMBOL = 1
+EXACT_NAME = 2
+PREFIX = 3
+SUBSTRING = 4
+
+MAX_GRAM = 3
+
+
+class TokenLookupIndex:
+    """
+    Precomputed lookup tables for the offline token search.
+    Built once from the token records (in CMC rank order); lookups only use
+    dictionaries and set intersections.
+    """
+
+    def __init__(self, records: list[dict]):
+        self.records = records
+        self.symbols: dict[str, list[int]] = defaultdict(list)
+        self.names: dict[str, list[int]] = defaultdict(list)
+        # Lower-cased contract address -> row indexes, for all chains and per chain
+        self.addresses: dict[str, list[int]] = defaultdict(list)
+        self.chain_addresses: dict[str, dict[str, int]] = defaultdict(dict)
+        # n-gram (up to MAX_GRAM characters) -> row indexes whose name or symbol contains it
+        self.grams: dict[str, set[int]] = defaultdict(set)
+
+        for i, record in enumerate(records):
+            symbol = _lower(record.get("symbol"))
+            name = _lower(record.get("name"))
+            self.symbols[symbol].append(i)
+            self.names[name].append(i)
+            for key in (symbol, name):
+                for gram in _grams(key):
+                    self.grams[gram].add(i)
+            for chain, addr in (record.get("network_to_contract") or {}).items():
+                addr = _lower(addr)
+                self.addresses[addr].append(i)
+                self.chain_addresses[chain].setdefault(addr, i)
+
+    def get_contract_address(self, row: int, chain: str | None) -> str | None:
+        contracts = self.records[row].get("network_to_contract") or {}
+        return contracts.get(chain, None)
+
+    def search(self, query: str) -> list[tuple[int, int]]:
+        """
+        Get the matching rows as (tier, row index) pairs, best first.
+        Rows are ranked by match tier, then by CMC rank. If any row matches exactly,
+        partial matches are not returned.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        exact = [(EXACT_ADDRESS, i) for i in self.addresses.get(query, [])]
+        exact.extend((EXACT_SYMBOL, i) for i in self.symbols.get(query, []))
+        exact.extend((EXACT_NAME, i) for i in self.names.get(query, []))
+        if exact:
+            return _dedupe(exact)
+
+        partial = []
+        for i in sorted(self._substring_candidates(query)):
+            record = self.records[i]
+            keys = (_lower(record.get("symbol")), _lower(record.get("name")))
+            if any(key.startswith(query) for key in keys):
+                partial.append((PREFIX, i))
+            elif any(query in key for key in keys):
+                partial.append((SUBSTRING, i))
+        partial.sort()
+        return partial
+
+    def lookup(self, query: str, chain: str | None) -> int | None:
+        """
+        Get the best match which has a contract on the chain. An exact match
+        hides the partial ones; partial matches are ranked by match tier, then
+        by CMC rank.
+        """
+        if chain is not None:
+            row = self.chain_addresses.get(chain, {}).get(query.strip().lower())
+            if row is not None:
+                return row
+        for _, i in self.search(query):
+            if self.get_contract_address(i, chain) is not None:
+                return i
+        return None
+
+    def _substring_candidates(self, query: str) -> set[int]:
+        if len(query) <= MAX_GRAM:
+            return self.grams.get(query, set())
+        # Rows containing the query contain every one of its n-grams
+        postings = [
+            self.grams.get(query[i : i + MAX_GRAM], set())
+            for i in range(len(query) - MAX_GRAM + 1)
+        ]
+        postings.sort(key=len)
+        return set.intersection(*postings)
+
+
+def _lower(value) -> str:
+    return value.strip().lower() if isinstance(value, str) else ""
+
+
+def _grams(key: str):
+    for n in range(1, MAX_GRAM + 1):
+        for i in range(len(key) - n + 1):
+            yield key[i : i + n]
+
+
+def _dedupe(matches: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    seen = set()
+    result = []
+    for tier, i in sorted(matches):
+        if i not in seen:
+            seen.add(i)
+            result.append((tier, i))
+    return result
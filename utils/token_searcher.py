@@ -1,14 +1,62 @@
-import pandas as pd
-import ast
+from collections import defaultdict
 import numpy as np
+from .ann_index import DEFAULT_N_PROBE, IVFIndex, get_index_path, load_or_build_index
+from .compact_index import CompactSearchEngine, get_compact_path, load_or_build_compact
 from .data_utils import DataUtils
-from .embeddings_utils import get_embedding, cosine_similarity
+from .embeddings_utils import EmbeddingSearchEngine
+from .embedding_cache import get_cached_embedding, get_cached_embeddings
+from .embedding_store import (
+    STORE_DIR,
+    TOKEN_STORE,
+    EmbeddingStore,
+    build_chain_partitions,
+    load_embedding_store,
+)
+from .lexical_index import TOKEN_FIELDS, BM25Index, fuse_search, scale_scores
+from .token_index import TokenLookupIndex
 
 
 class TokenSearcher:
 
     EMBEDDING_MODEL = "text-embedding-3-large"
 
+    def __init__(
+        self,
+        data_utils: DataUtils | None = None,
+        use_ann: bool = False,
+        n_probe: int = DEFAULT_N_PROBE,
+        compact: str | None = None,
+        compact_dims: int | None = None,
+        lexical: bool = True,
+        store: EmbeddingStore | None = None,
+    ):
+        """
+        store: search this token store instead of the saved one.
+        lexical: answer from a BM25 index when it is confident, without embedding
+        the query, scoring its matches relative to the best one; otherwise its
+        matches are fused with the embedding search to order the results, and
+        the reported scores are cosine similarities.
+        use_ann: search the embeddings with an approximate (IVF) index instead of
+        scoring every token; n_probe sets its recall/latency trade-off.
+        compact: score the tokens with float16 or int8 vectors, optionally
+        truncated to compact_dims dimensions, and re-rank the best candidates
+        with the full-precision embeddings.
+        """
+        if use_ann and compact is not None:
+            raise ValueError("use_ann and compact can't be combined")
+        self.data_utils = data_utils if data_utils is not None else DataUtils()
+        self.use_ann = use_ann
+        self.n_probe = n_probe
+        self.compact = compact
+        self.compact_dims = compact_dims
+        self.lexical = lexical
+        self._store: EmbeddingStore | None = store
+        self._engine: EmbeddingSearchEngine | CompactSearchEngine | None = None
+        self._lookup_index: TokenLookupIndex | None = None
+        self._ann_index: IVFIndex | None = None
+        self._lexical_index: BM25Index | None = None
+        self._chain_masks: dict[str, np.ndarray] = {}
+
     def search_token(
         self,
         query: str,
@@ -31,11 +79,40 @@ class TokenSearcher:
             result["other_options"] = options
         return result
 
+    def search_tokens(
+        self,
+        queries: list[str],
+        chains: list[str | None],
+        other_options: bool = False,
+    ) -> list[dict]:
+        """
+        Batch version of search_token, for the (query, chain) pairs of a
+        multi-action intent. The queries which need an embedding search are
+        embedded with one request and scored with one matrix product per chain.
+        """
+        if len(chains) != len(queries):
+            raise ValueError("Expected one chain per query")
+        chains = [chain.lower() if chain is not None else None for chain in chains]
+        results = [
+            {"suggested": self._search_token_offline(query, chain), "other_options": []}
+            for query, chain in zip(queries, chains)
+        ]
+
+        if other_options:
+            for result, options in zip(
+                results, self._search_token_embeddings_many(queries, chains)
+            ):
+                suggested = result["suggested"]
+                if suggested is not None:
+                    options = [op for op in options if op["id"] != suggested["id"]]
+                result["other_options"] = options
+        return results
+
     def _search_token_offline(self, query: str, chain: str | None) -> dict | None:
         # Check if the query is a native token
         if chain is not None:
             chain = chain.lower()
-            network = DataUtils().get_network_info_by_name(chain)
+            network = self.data_utils.get_network_info_by_name(chain)
             if network is not None and query.lower() == network.symbol.lower():
                 return {
                     "id": 0,
@@ -46,54 +123,26 @@ class TokenSearcher:
                     "contract_address": None,
                 }
 
-        # Load the CSV file
-        df = pd.read_csv("processed/embeddings/erc20_tokens.csv")
-
-        # Function to extract contract address for the specified chain
-        def get_contract_address(row, chain):
-            try:
-                contracts = ast.literal_eval(row["network_to_contract"])
-                return contracts.get(chain, None)
-            except (ValueError, SyntaxError):
-                return None
-
-        # Convert query to lowercase for case-insensitive search
-        query = query.lower()
-
-        # Filter rows based on name, symbol, or contract address
-        filtered_df = df[
-            (df["name"].str.lower().str.contains(query))
-            | (df["symbol"].str.lower().str.contains(query))
-            | (
-                df["network_to_contract"].apply(
-                    lambda x: query in ast.literal_eval(x).values()
-                )
-            )
-        ]
-
-        if filtered_df.empty:
+        # Look up the query in the precompiled index
+        index = self._get_lookup_index()
+        row = index.lookup(query, chain)
+        if row is None:
             return None
 
-        # Select the first result
-        first_result = filtered_df.iloc[0]
-
-        # If chain is specified, extract the contract address for that chain
-        contract_addr = get_contract_address(first_result, chain)
-        if contract_addr is None:
-            return None
-        else:
-            return {
-                "id": first_result["id"],
-                "name": first_result["name"],
-                "symbol": first_result["symbol"],
-                "decimals": first_result["decimals"],
-                "network": chain,
-                "contract_address": contract_addr,
-            }
+        record = index.records[row]
+        return {
+            "id": record["id"],
+            "name": record["name"],
+            "symbol": record["symbol"],
+            "decimals": record["decimals"],
+            "network": chain,
+            "contract_address": index.get_contract_address(row, chain),
+        }
 
     def _search_token_embeddings(self, query: str, chain: str | None, top_n: int = 5):
         """
         Search for tokens based on the query and return the top_n most similar tokens.
+        A confident lexical match is returned without embedding the query.
         Parameters:
         query (str): The search query.
         top_n (int): The number of top related tokens to return (default is 5).
@@ -102,50 +151,165 @@ class TokenSearcher:
         list: A list of dictionaries containing the keys 'score' and 'token_info'.
         """
 
-        df = pd.read_csv("processed/embeddings/erc20_tokens.csv")
-        # Filter the DataFrame to include only tokens available on the specified chain
-        if chain is not None:
-            df = self._filter_by_chain(df, chain)
-        # Convert the 'embedding' column to a column of NumPy arrays
-        df["embedding"] = df["embedding"].apply(self._convert_to_numpy_array)
-
-        query_embedding = get_embedding(text=query, model=self.EMBEDDING_MODEL)
-
-        tokens = [
-            {
-                "score": cosine_similarity(query_embedding, row["embedding"]),
-                "id": row["id"],
-                "name": row["name"],
-                "symbol": row["symbol"],
-                "decimals": row["decimals"],
-                "contracts": [
-                    {"chain": chain, "contract_addr": addr}
-                    for chain, addr in eval(row["network_to_contract"]).items()
-                ],
-            }
-            for i, row in df.iterrows()
-        ]
+        engine = self._get_engine()
+        # Only score the tokens available on the specified chain
+        if chain is not None and chain not in engine.partitions:
+            return []
 
-        tokens.sort(key=lambda x: x["score"], reverse=True)
-        results = [token for token in tokens[:top_n]]
+        lexical = self._search_lexical(query, chain, top_n)
+        if self._is_confident(query, lexical):
+            return self._to_results(scale_scores(lexical))
+
+        query_embedding = get_cached_embedding(query, self.EMBEDDING_MODEL)
+
+        if self.use_ann:
+            matches = self._get_ann_index().search(
+                query_embedding, top_n, self.n_probe, self._get_chain_mask(chain)
+            )
+        else:
+            matches = engine.search(query_embedding, top_n, partition=chain)
+        if lexical:
+            matches = fuse_search(engine, query_embedding, matches, lexical, top_n)
+        return self._to_results(matches)
+
+    def _search_token_embeddings_many(
+        self, queries: list[str], chains: list[str | None], top_n: int = 5
+    ) -> list[list[dict]]:
+        engine = self._get_engine()
+        matches: list[list[tuple[int, float]]] = [[] for _ in queries]
+        # chain -> (query index, lexical matches) of the queries to embed
+        pending = defaultdict(list)
+        for i, (query, chain) in enumerate(zip(queries, chains)):
+            if chain is not None and chain not in engine.partitions:
+                continue
+            lexical = self._search_lexical(query, chain, top_n)
+            if self._is_confident(query, lexical):
+                matches[i] = scale_scores(lexical)
+            else:
+                pending[chain].append((i, lexical))
+
+        embeddings = get_cached_embeddings(
+            [queries[i] for group in pending.values() for i, _ in group],
+            self.EMBEDDING_MODEL,
+        )
+        start = 0
+        for chain, group in pending.items():
+            query_embeddings = embeddings[start : start + len(group)]
+            start += len(group)
+            if self.use_ann:
+                mask = self._get_chain_mask(chain)
+                found = [
+                    self._get_ann_index().search(embedding, top_n, self.n_probe, mask)
+                    for embedding in query_embeddings
+                ]
+            else:
+                found = engine.search_many(query_embeddings, top_n, partition=chain)
+            for (i, lexical), embedding, semantic in zip(
+                group, query_embeddings, found
+            ):
+                if lexical:
+                    semantic = fuse_search(engine, embedding, semantic, lexical, top_n)
+                matches[i] = semantic
+        return [self._to_results(query_matches) for query_matches in matches]
+
+    def _search_lexical(
+        self, query: str, chain: str | None, top_n: int
+    ) -> list[tuple[int, float]]:
+        if not self.lexical:
+            return []
+        return self._get_lexical_index().search(
+            query, top_n, self._get_chain_mask(chain)
+        )
+
+    def _is_confident(self, query: str, lexical: list[tuple[int, float]]) -> bool:
+        return bool(lexical) and self._get_lexical_index().is_confident(query, lexical)
+
+    def _to_results(self, matches) -> list[dict]:
+        store = self._load_store()
+        results = []
+        for i, score in matches:
+            record = store.records[i]
+            results.append(
+                {
+                    "score": score,
+                    "id": record["id"],
+                    "name": record["name"],
+                    "symbol": record["symbol"],
+                    "decimals": record["decimals"],
+                    "contracts": [
+                        {"chain": chain, "contract_addr": addr}
+                        for chain, addr in (record["network_to_contract"] or {}).items()
+                    ],
+                }
+            )
         return results
 
-    def _convert_to_numpy_array(self, embedding):
-        if isinstance(embedding, str):
-            embedding = ast.literal_eval(
-                embedding
-            )  # Convert string representation of list to actual list
-        return np.array(embedding)
-
-    def _filter_by_chain(self, df: pd.DataFrame, filtering_chain: str) -> pd.DataFrame:
-        # Function to check if the specified chain is in the network_to_contract field
-        def has_chain(network_to_contract, chain):
-            try:
-                # Convert the string representation of dictionary to an actual dictionary
-                network_dict = eval(network_to_contract)
-                return chain in network_dict
-            except (SyntaxError, NameError):
-                return False
-
-        # Filter the DataFrame to include only tokens available on the specified chain
-        return df[df["network_to_contract"].apply(has_chain, args=(filtering_chain,))]
+    def load(self):
+        """
+        Load the token catalog and build the indexes ahead of the first query
+        """
+        self._get_lookup_index()
+        self._get_engine()
+        if self.use_ann:
+            self._get_ann_index()
+        if self.lexical:
+            self._get_lexical_index()
+
+    def _load_store(self) -> EmbeddingStore:
+        if self._store is None:
+            self._store = load_embedding_store(TOKEN_STORE)
+        return self._store
+
+    def _get_lookup_index(self) -> TokenLookupIndex:
+        if self._lookup_index is None:
+            self._lookup_index = TokenLookupIndex(self._load_store().records)
+        return self._lookup_index
+
+    def _get_engine(self) -> EmbeddingSearchEngine | CompactSearchEngine:
+        if self._engine is None:
+            store = self._load_store()
+            if self.compact is not None:
+                compact = load_or_build_compact(
+                    get_compact_path(
+                        TOKEN_STORE, STORE_DIR, self.compact, self.compact_dims
+                    ),
+                    store.matrix,
+                    self.compact,
+                    self.compact_dims,
+                    store.digest,
+                )
+                engine = CompactSearchEngine(store.matrix, compact)
+            else:
+                engine = EmbeddingSearchEngine(store.matrix, store.normalized)
+            # Stores written before partitions were saved get them computed here
+            partitions = store.partitions or build_chain_partitions(store.records)
+            for chain, rows in partitions.items():
+                engine.add_partition(chain, rows)
+            self._engine = engine
+        return self._engine
+
+    def _get_lexical_index(self) -> BM25Index:
+        if self._lexical_index is None:
+            self._lexical_index = BM25Index(self._load_store().records, TOKEN_FIELDS)
+        return self._lexical_index
+
+    def _get_ann_index(self) -> IVFIndex:
+        if self._ann_index is None:
+            # Use the index saved with the store if it is up to date
+            self._ann_index = load_or_build_index(
+                get_index_path(TOKEN_STORE, STORE_DIR),
+                self._get_engine().vectors,
+                self.n_probe,
+                self._load_store().digest,
+            )
+        return self._ann_index
+
+    def _get_chain_mask(self, chain: str | None) -> np.ndarray | None:
+        if chain is None:
+            return None
+        if chain not in self._chain_masks:
+            engine = self._get_engine()
+            mask = np.zeros(len(engine), dtype=bool)
+            mask[engine.partitions[chain]] = True
+            self._chain_masks[chain] = mask
+        return self._chain_masks[chain]
@@ -0,0 +1,148 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+
+from .provider_pool import get_provider_pool
+
+ABI_DIR = "data/abi"
+CASE_DIR = "case"
+
+
+class AbiRegistry:
+    """
+    Content-addressed ABIs of data/abi and of the cases' abi directories.
+    Files are indexed by name (path in the abi directory without .json) and by
+    the sha256 of their content; each distinct content is parsed once, however
+    many cases carry a copy of it.
+    Contract objects are cached per (chain id, address, ABI hash).
+    """
+
+    def __init__(self, abi_dir: str = ABI_DIR, case_dir: str | None = CASE_DIR):
+        self.abi_dir = abi_dir
+        self.case_dir = case_dir
+        self._lock = threading.Lock()
+        # name -> hash of the shared ABIs, (case, name) -> hash of the case ABIs
+        self._names: dict[str, str] | None = None
+        self._case_names: dict[tuple[str, str], str] = {}
+        # hash -> first file with the content, and the parsed ABIs by hash
+        self._paths: dict[str, str] = {}
+        self._abis: dict[str, list[dict]] = {}
+        self._contracts: dict[tuple[int, str, str], object] = {}
+
+    def load(self):
+        """
+        Index the ABI files ahead of the first lookup
+        """
+        self._get_names()
+
+    def names(self, case: str | None = None) -> list[str]:
+        if case is None:
+            return sorted(self._get_names())
+        self._get_names()
+        return sorted(name for c, name in self._case_names if c == case)
+
+    def get_hash(self, name: str, case: str | None = None) -> str:
+        """
+        Get the content hash of an ABI.
+        A case's own ABI takes precedence over the shared one of the same name.
+        """
+        names = self._get_names()
+        if case is not None and (case, name) in self._case_names:
+            return self._case_names[(case, name)]
+        if name in names:
+            return names[name]
+        if case is None:
+            hashes = {h for (_, n), h in self._case_names.items() if n == name}
+            if len(hashes) == 1:
+                return hashes.pop()
+            if hashes:
+                raise ValueError(f"ABI {name} differs between cases; specify a case")
+        raise KeyError(f"ABI not found: {name}")
+
+    def get(self, name: str, case: str | None = None) -> list[dict]:
+        """
+        Get a parsed ABI by name
+        """
+        return self.get_by_hash(self.get_hash(name, case))
+
+    def get_by_hash(self, abi_hash: str) -> list[dict]:
+        abi = self._abis.get(abi_hash)
+        if abi is None:
+            with self._lock:
+                abi = self._abis.get(abi_hash)
+                if abi is None:
+                    with open(self._paths[abi_hash], "r") as file:
+                        abi = json.load(file)
+                    self._abis[abi_hash] = abi
+        return abi
+
+    def get_contract(
+        self, chain_id: int, address: str, name: str, case: str | None = None
+    ):
+        """
+        Get a contract object of a chain's shared Web3 instance
+        """
+        abi_hash = self.get_hash(name, case)
+        key = (chain_id, address.lower(), abi_hash)
+        contract = self._contracts.get(key)
+        if contract is None:
+            w3 = get_provider_pool().get_web3(chain_id)
+            contract = w3.eth.contract(
+                address=w3.to_checksum_address(address),
+                abi=self.get_by_hash(abi_hash),
+            )
+            with self._lock:
+                contract = self._contracts.setdefault(key, contract)
+        return contract
+
+    def stats(self) -> dict[str, int]:
+        names = self._get_names()
+        return {
+            "files": len(names) + len(self._case_names),
+            "unique": len(self._paths),
+            "parsed": len(self._abis),
+            "contracts": len(self._contracts),
+        }
+
+    def _get_names(self) -> dict[str, str]:
+        if self._names is None:
+            with self._lock:
+                if self._names is None:
+                    self._index()
+        return self._names
+
+    def _index(self):
+        names = {}
+        for path in sorted(
+            glob.glob(os.path.join(self.abi_dir, "**", "*.json"), recursive=True)
+        ):
+            name = os.path.splitext(os.path.relpath(path, self.abi_dir))[0]
+            names[name.replace(os.sep, "/")] = self._add_file(path)
+
+        if self.case_dir is not None:
+            pattern = os.path.join(self.case_dir, "*", "abi", "*.json")
+            for path in sorted(glob.glob(pattern)):
+                case = os.path.basename(os.path.dirname(os.path.dirname(path)))
+                name = os.path.splitext(os.path.basename(path))[0]
+                self._case_names[(case, name)] = self._add_file(path)
+        self._names = names
+
+    def _add_file(self, path: str) -> str:
+        with open(path, "rb") as file:
+            abi_hash = hashlib.sha256(file.read()).hexdigest()
+        self._paths.setdefault(abi_hash, path)
+        return abi_hash
+
+
+_default_registry: AbiRegistry | None = None
+_default_registry_lock = threading.Lock()
+
+
+def get_abi_registry() -> AbiRegistry:
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = AbiRegistry()
+        return _default_registry
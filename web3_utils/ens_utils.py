@@ -1,19 +1,201 @@
 import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from ens import ENS
 from web3 import Web3
 
+from .provider_pool import get_provider_pool
+
+DEFAULT_CACHE_PATH = "processed/cache/ens.sqlite"
+# Seconds a resolved address (or an unregistered name) stays cached
+DEFAULT_TTL = 60 * 60
+DEFAULT_NEGATIVE_TTL = 5 * 60
+MAINNET_CHAIN_ID = 1
+
 
 def is_address(text: str) -> bool:
     """
     Check if a text is an address
     """
-    return Web3().is_address(text)
+    return Web3.is_address(text)
+
+
+def normalize_ens_name(name: str) -> str:
+    return name.strip().lower()
+
+
+class EnsResolver:
+    """
+    Resolves ENS names through the shared mainnet provider of the provider pool.
+    Results are kept in memory and in a SQLite file until their TTL expires;
+    names without an address are cached too, for negative_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        rpc_url: str | None = None,
+        cache_path: str | None = DEFAULT_CACHE_PATH,
+        ttl: float = DEFAULT_TTL,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        max_workers: int = 8,
+    ):
+        self.rpc_url = rpc_url
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_workers = max_workers
+        self.hits = 0
+        self.misses = 0
+        # name -> (address or None, expiry timestamp)
+        self._memory: dict[str, tuple[str | None, float]] = {}
+        self._lock = threading.RLock()
+        self._ns: ENS | None = None
+        self._db: sqlite3.Connection | None = None
+        if cache_path is not None:
+            self._db = self._open(cache_path)
+
+    @property
+    def ns(self) -> ENS:
+        """
+        The ENS instance, created on first use
+        """
+        if self._ns is None:
+            with self._lock:
+                if self._ns is None:
+                    pool = get_provider_pool()
+                    if self.rpc_url is not None:
+                        w3 = pool.get_web3_for_url(self.rpc_url)
+                    else:
+                        w3 = pool.get_web3(MAINNET_CHAIN_ID)
+                    self._ns = ENS.from_web3(w3)
+        return self._ns
+
+    def resolve(self, name: str) -> str | None:
+        """
+        Get the address of an ENS name, or None if it has no address
+        """
+        key = normalize_ens_name(name)
+        found, address = self._get(key)
+        if found:
+            return address
+        address = self.ns.address(key)
+        self._put(key, address)
+        return address
+
+    def resolve_many(self, names: list[str]) -> dict[str, str | Exception | None]:
+        """
+        Resolve several ENS names, querying the uncached ones concurrently.
+        Returns the addresses keyed by the given names. A name whose lookup
+        fails maps to the error resolve would raise for it, and the other
+        names are still resolved and cached.
+        """
+        keys = {name: normalize_ens_name(name) for name in names}
+        resolved = {}
+        pending = []
+        for key in dict.fromkeys(keys.values()):
+            found, address = self._get(key)
+            if found:
+                resolved[key] = address
+            else:
+                pending.append(key)
+
+        if pending:
+            workers = min(self.max_workers, len(pending))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                addresses = list(executor.map(self._lookup, pending))
+            for key, address in zip(pending, addresses):
+                if not isinstance(address, Exception):
+                    self._put(key, address)
+                resolved[key] = address
+
+        return {name: resolved[key] for name, key in keys.items()}
 
+    def _lookup(self, key: str) -> str | Exception | None:
+        # Errors are returned, so one failing name doesn't fail the others
+        try:
+            return self.ns.address(key)
+        except Exception as e:
+            return e
 
-def resolve_ens(domain):
-    api_key = os.getenv("INFURA_API_KEY")
-    url = "https://mainnet.infura.io/v3/{infura_api_key}".format(infura_api_key=api_key)
-    provider = Web3.HTTPProvider(url)
-    w3 = Web3(provider)
-    ns = ENS.from_web3(w3)
-    return ns.address(domain)
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM ens")
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _get(self, key: str) -> tuple[bool, str | None]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                entry = self._read_disk(key)
+                if entry is not None:
+                    self._memory[key] = entry
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return True, entry[0]
+            self.misses += 1
+            return False, None
+
+    def _put(self, key: str, address: str | None):
+        ttl = self.ttl if address is not None else self.negative_ttl
+        entry = (address, time.time() + ttl)
+        with self._lock:
+            self._memory[key] = entry
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ens (name, address, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, *entry),
+                )
+                self._db.commit()
+
+    def _read_disk(self, key: str) -> tuple[str | None, float] | None:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT address, expires_at FROM ens WHERE name = ?", (key,)
+        ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS ens (
+                name TEXT PRIMARY KEY,
+                address TEXT,
+                expires_at REAL NOT NULL
+            )
+            """)
+        db.commit()
+        return db
+
+
+_default_resolver: EnsResolver | None = None
+_default_resolver_lock = threading.Lock()
+
+
+def get_default_resolver() -> EnsResolver:
+    global _default_resolver
+    with _default_resolver_lock:
+        if _default_resolver is None:
+            _default_resolver = EnsResolver()
+        return _default_resolver
+
+
+def resolve_ens(domain: str) -> str | None:
+    """
+    Resolve an ENS name through the default process-wide resolver
+    """
+    return get_default_resolver().resolve(domain)
@@ -0,0 +1,67 @@
+from eth_utils import is_address, is_checksum_address
+
+# keccak("transfer(address,uint256)")[:4] and keccak("approve(address,uint256)")[:4]
+TRANSFER_SELECTOR = "0xa9059cbb"
+APPROVE_SELECTOR = "0x095ea7b3"
+MAX_UINT256 = 2**256 - 1
+
+
+def encode_transfer(recipient: str, amount: int) -> str:
+    """
+    Encode the calldata of an ERC20 transfer
+    """
+    return _encode(TRANSFER_SELECTOR, "recipient", recipient, amount)
+
+
+def encode_approve(spender: str, amount: int) -> str:
+    """
+    Encode the calldata of an ERC20 approve
+    """
+    return _encode(APPROVE_SELECTOR, "spender", spender, amount)
+
+
+def encode_transfers(transfers: list[tuple[str, int]]) -> list[str]:
+    """
+    Encode the calldata of many ERC20 transfers given as (recipient, amount) pairs
+    """
+    return _encode_many(TRANSFER_SELECTOR, "recipient", transfers)
+
+
+def encode_approves(approvals: list[tuple[str, int]]) -> list[str]:
+    """
+    Encode the calldata of many ERC20 approves given as (spender, amount) pairs
+    """
+    return _encode_many(APPROVE_SELECTOR, "spender", approvals)
+
+
+def _encode_many(selector: str, role: str, items: list[tuple[str, int]]) -> list[str]:
+    # Addresses repeat in bulk requests, so each one is validated once
+    words: dict[str, str] = {}
+    result = []
+    for address, amount in items:
+        word = words.get(address)
+        if word is None:
+            word = words[address] = _address_word(role, address)
+        result.append(selector + word + _amount_word(amount))
+    return result
+
+
+def _encode(selector: str, role: str, address: str, amount: int) -> str:
+    return selector + _address_word(role, address) + _amount_word(amount)
+
+
+def _address_word(role: str, address: str) -> str:
+    if not is_address(address):
+        raise ValueError(f"Invalid {role} address: {address}")
+    # Same as the contract ABI encoding, which only accepts checksum addresses
+    if not is_checksum_address(address):
+        raise ValueError(f"Not a checksum {role} address: {address}")
+    return address[2:].lower().rjust(64, "0")
+
+
+def _amount_word(amount: int) -> str:
+    if not isinstance(amount, int) or isinstance(amount, bool):
+        raise ValueError(f"Invalid amount: {amount}")
+    if amount < 0 or amount > MAX_UINT256:
+        raise ValueError(f"Amount out of the uint256 range: {amount}")
+    return format(amount, "064x")
@@ -1,10 +1,12 @@
-import os
 from dotenv import load_dotenv
 from eth_typing import ChecksumAddress
-from web3 import Web3
 
 from model.erc20_token import Erc20Token
 from utils import data_utils
+from . import erc20_encoder
+from .abi_registry import get_abi_registry
+from .multicall import ContractCall, Multicall
+from .provider_pool import get_provider_pool
 
 ERC20 = "erc20"
 
@@ -17,20 +19,18 @@ class ERC20Utils:
         network = self.data_utils.get_network_info_by_id(chain_id)
         if network is None:
             raise ValueError(f"Unsupported chain id: {chain_id}")
-        api_key = os.getenv("INFURA_API_KEY")
-        provider = Web3.HTTPProvider(network.rpc_url.format(infura_api_key=api_key))
-        self.provider = provider
-        self.w3 = Web3(provider)
+        self.chain_id = chain_id
+        # Providers are shared per chain, so no connection is opened here
+        self.w3 = get_provider_pool().get_web3(chain_id)
+        self.provider = self.w3.provider
 
     def __get_contract_instance(self, contract_name: str, contract_address: str):
         """
         Get contract instance
         """
-        file_path = f"data/abi/{contract_name}.json"
-        with open(file_path, "r") as file:
-            abi = file.read()
-        contract_address = self.w3.to_checksum_address(contract_address)
-        return self.w3.eth.contract(address=contract_address, abi=abi)
+        return get_abi_registry().get_contract(
+            self.chain_id, contract_address, contract_name
+        )
 
     def get_token_info(self, token: str) -> Erc20Token:
         """
@@ -44,6 +44,27 @@ class ERC20Utils:
             contract_addr=token, name=name, symbol=symbol, decimals=decimals
         )
 
+    def get_token_info_many(self, tokens: list[str]) -> list[Erc20Token]:
+        """
+        Get token information of many tokens with Multicall3.
+        Fields the token doesn't implement are None.
+        """
+        calls = []
+        for token in tokens:
+            calls.append(ContractCall(token, "name()", output_types=["string"]))
+            calls.append(ContractCall(token, "symbol()", output_types=["string"]))
+            calls.append(ContractCall(token, "decimals()", output_types=["uint8"]))
+        results = Multicall(self.w3, chain_id=self.chain_id).aggregate(calls)
+        return [
+            Erc20Token(
+                contract_addr=token,
+                name=results[3 * i],
+                symbol=results[3 * i + 1],
+                decimals=results[3 * i + 2],
+            )
+            for i, token in enumerate(tokens)
+        ]
+
     def encode_erc20_transfer(
         self, contract_addr: str, recipient: str | ChecksumAddress, amount: int
     ) -> str:
@@ -52,11 +73,7 @@ class ERC20Utils:
         """
         if not self.w3.is_address(contract_addr):
             raise ValueError(f"Invalid contract address: {contract_addr}")
-        if not self.w3.is_address(recipient):
-            raise ValueError(f"Invalid recipient address: {recipient}")
-
-        contract = self.__get_contract_instance(ERC20, contract_addr)
-        return contract.encode_abi(fn_name="transfer", args=[recipient, amount])
+        return erc20_encoder.encode_transfer(recipient, amount)
 
     def encode_erc20_approve(
         self, contract_addr: str, spender: str | ChecksumAddress, amount: int
@@ -66,8 +83,4 @@ class ERC20Utils:
         """
         if not self.w3.is_address(contract_addr):
             raise ValueError(f"Invalid contract address: {contract_addr}")
-        if not self.w3.is_address(spender):
-            raise ValueError(f"Invalid spender address: {spender}")
-
-        contract = self.__get_contract_instance(ERC20, contract_addr)
-        return contract.encode_abi(fn_name="approve", args=[spender, amount])
+        return erc20_encoder.encode_approve(spender, amount)
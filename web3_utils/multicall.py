@@ -0,0 +1,106 @@
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+from web3 import Web3
+
+# Multicall3 is deployed at the same address on most chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ADDRESSES = {
+    324: "0xF9cda624FBC7e059355ce98a31693d299FACd963",  # zksync era
+}
+AGGREGATE3 = "aggregate3((address,bool,bytes)[])"
+# Calls packed into one eth_call
+DEFAULT_CHUNK_SIZE = 500
+
+
+def get_multicall_address(chain_id: int) -> str:
+    return MULTICALL3_ADDRESSES.get(chain_id, MULTICALL3_ADDRESS)
+
+
+class ContractCall:
+    """
+    A read-only contract function call, e.g.
+    ContractCall(token, "decimals()", output_types=["uint8"])
+    """
+
+    def __init__(
+        self,
+        target: str,
+        signature: str,
+        args: list | tuple = (),
+        output_types: list[str] | tuple[str, ...] = (),
+    ):
+        self.target = to_checksum_address(target)
+        self.signature = signature
+        self.args = tuple(args)
+        self.output_types = tuple(output_types)
+
+    @property
+    def calldata(self) -> bytes:
+        selector = function_signature_to_4byte_selector(self.signature)
+        input_types = self.signature[self.signature.index("(") + 1 : -1]
+        if not input_types:
+            return selector
+        return selector + encode(input_types.split(","), self.args)
+
+    def decode(self, data: bytes):
+        """
+        Decode the returned data; a single output is returned unwrapped
+        """
+        values = decode(self.output_types, data)
+        return values[0] if len(values) == 1 else values
+
+
+class Multicall:
+    """
+    Packs read-only calls into Multicall3 aggregate3 calls.
+    Every call is allowed to fail on its own: a reverted call, or one whose
+    result can't be decoded, gives None instead of failing the whole batch.
+    """
+
+    def __init__(
+        self,
+        w3: Web3,
+        chain_id: int | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        address: str | None = None,
+    ):
+        self.w3 = w3
+        self.chunk_size = chunk_size
+        self._chain_id = chain_id
+        self._address = address
+
+    @property
+    def address(self) -> str:
+        if self._address is None:
+            chain_id = self._chain_id or self.w3.eth.chain_id
+            self._address = get_multicall_address(chain_id)
+        return self._address
+
+    def aggregate(self, calls: list[ContractCall]) -> list:
+        """
+        Get the decoded results of the calls, in order, with one eth_call per chunk
+        """
+        results = []
+        for i in range(0, len(calls), self.chunk_size):
+            results.extend(self._aggregate_chunk(calls[i : i + self.chunk_size]))
+        return results
+
+    def _aggregate_chunk(self, calls: list[ContractCall]) -> list:
+        data = function_signature_to_4byte_selector(AGGREGATE3) + encode(
+            ["(address,bool,bytes)[]"],
+            [[(call.target, True, call.calldata) for call in calls]],
+        )
+        raw = self.w3.eth.call({"to": self.address, "data": data})
+        (responses,) = decode(["(bool,bytes)[]"], raw)
+
+        results = []
+        for call, (success, return_data) in zip(calls, responses):
+            result = None
+            if success and return_data:
+                try:
+                    result = call.decode(return_data)
+                except Exception:
+                    # e.g. tokens returning bytes32 instead of a string
+                    pass
+            results.append(result)
+        return results
@@ -0,0 +1,134 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from web3.types import RPCEndpoint, RPCResponse
+
+from utils.data_utils import NetworkRegistry, get_network_registry
+
+# Seconds to wait for an RPC response
+DEFAULT_TIMEOUT = 10.0
+# Kept-alive connections per endpoint; requests beyond it wait for a free one
+DEFAULT_POOL_SIZE = 10
+
+
+class PooledHTTPProvider(Web3.HTTPProvider):
+    """
+    An HTTPProvider posting through a given session, so that every thread
+    shares the session's kept-alive connections.
+    """
+
+    def __init__(self, endpoint_uri: str, session: requests.Session, timeout: float):
+        super().__init__(endpoint_uri, request_kwargs={"timeout": timeout})
+        self.session = session
+
+    def make_request(self, method: RPCEndpoint, params) -> RPCResponse:
+        request_data = self.encode_rpc_request(method, params)
+        response = self.session.post(
+            self.endpoint_uri, data=request_data, **self.get_request_kwargs()
+        )
+        response.raise_for_status()
+        return self.decode_rpc_response(response.content)
+
+
+class ProviderPool:
+    """
+    One Web3 instance per chain (or RPC url), each posting through a pooled
+    keep-alive session, so RPC calls reuse open connections instead of
+    connecting and handshaking again.
+    """
+
+    def __init__(
+        self,
+        network_registry: NetworkRegistry | None = None,
+        rpc_urls: dict[int, str] | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        pool_size: int = DEFAULT_POOL_SIZE,
+    ):
+        self.network_registry = network_registry or get_network_registry()
+        # Chain id -> RPC url, overriding the urls of the network file
+        self.rpc_urls = rpc_urls or {}
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._sessions: dict[str, requests.Session] = {}
+        self._web3: dict[str, Web3] = {}
+
+    def get_web3(self, chain_id: int) -> Web3:
+        """
+        Get the shared Web3 instance of a chain
+        """
+        return self.get_web3_for_url(self.get_rpc_url(chain_id))
+
+    def get_web3_for_url(self, rpc_url: str) -> Web3:
+        """
+        Get the shared Web3 instance of an RPC url
+        """
+        w3 = self._web3.get(rpc_url)
+        if w3 is None:
+            with self._lock:
+                w3 = self._web3.get(rpc_url)
+                if w3 is None:
+                    provider = PooledHTTPProvider(
+                        rpc_url, self._get_session(rpc_url), self.timeout
+                    )
+                    w3 = Web3(provider)
+                    self._web3[rpc_url] = w3
+        return w3
+
+    def get_rpc_url(self, chain_id: int) -> str:
+        if chain_id in self.rpc_urls:
+            return self.rpc_urls[chain_id]
+        network = self.network_registry.get_by_id(chain_id)
+        if network is None:
+            raise ValueError(f"Unsupported chain id: {chain_id}")
+        return network.rpc_url.format(infura_api_key=os.getenv("INFURA_API_KEY"))
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._web3.clear()
+
+    def _get_session(self, rpc_url: str) -> requests.Session:
+        session = self._sessions.get(rpc_url)
+        if session is None:
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=self.pool_size, pool_block=True
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._sessions[rpc_url] = session
+        return session
+
+
+_default_pool: ProviderPool | None = None
+_default_pool_lock = threading.Lock()
+
+
+def get_provider_pool() -> ProviderPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ProviderPool()
+        return _default_pool
+
+
+def set_provider_pool(pool: ProviderPool | None):
+    """
+    Replace the process-wide pool, e.g. with one whose RPC urls point at local
+    endpoints. None creates the default pool again on next use.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        _default_pool = pool
+
+
+def get_web3(chain_id: int) -> Web3:
+    """
+    Get the process-wide Web3 instance of a chain
+    """
+    return get_provider_pool().get_web3(chain_id)